@@ -12,7 +12,7 @@ echo "Seeding database..."
 flask seed-db
 
 # 2. Execute the command passed to the container
-# In Prod: This will be "gunicorn ..."
-# In Dev:  This will be "flask run ..."
+# In Prod: This will be "uvicorn ..."
+# In Dev:  This will be "uvicorn --reload ..."
 echo "Starting application..."
 exec "$@"
\ No newline at end of file
@@ -5,8 +5,26 @@ from flask_cors import CORS
 from flaskr.api.users_routes import users_bp
 from flaskr.api.areas_routes import areas_bp
 from flaskr.api.events_routes import events_bp
-from flaskr.commands import seed_db_command
+from flaskr.api.metrics_routes import metrics_bp
+from flaskr.api.tiles_routes import tiles_bp
+from flaskr.api.sessions_routes import sessions_bp
+from flaskr.commands import seed_db_command, check_capacity_summary_command, refresh_occupancy_command
+from flaskr.commands import create_event_partitions_command, import_areas_command, import_events_command
+from flaskr.commands import export_events_command, rebuild_simplified_areas_command
+from flaskr.bench.commands import bench_nearest_command, bench_generate_city_command, bench_endpoints_command, bench_compare_command
+from flaskr.bench.commands import bench_replay_command, bench_ingest_command, bench_area_stats_command
+from flaskr.bench.commands import bench_import_command
+from flaskr.services.spatial_index import area_index
+from flaskr.services.capacity_feed import capacity_feed
+from flaskr.services.metrics import metrics
+from flaskr.services.event_buffer import event_buffer
+from flaskr.services.tile_cache import tile_cache
+from flaskr.services.user_cache import user_cache
+from flaskr.services.sessions import open_sessions
+from flaskr.services.area_stats import area_stats
+from flaskr.services.occupancy import occupancy_refresher
 from flaskr.models import parking_areas as areas_model, users as users_model, events as events_model
+from flaskr.models import capacity_summary as capacity_summary_model, occupancy as occupancy_model
 
 
 # Initialize Flask app
@@ -18,6 +36,9 @@ CORS(app)
 app.register_blueprint(areas_bp)
 app.register_blueprint(users_bp)
 app.register_blueprint(events_bp)
+app.register_blueprint(metrics_bp)
+app.register_blueprint(tiles_bp)
+app.register_blueprint(sessions_bp)
 
 
 app.config.from_object(Config)
@@ -25,9 +46,34 @@ app.config["SQLALCHEMY_DATABASE_URI"] = app.config.get("DB_URL")
 app.config['SQLALCHEMY_ECHO'] = False
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# Before db.init_app: instruments the connection pool of the engine
+metrics.init_app(app)
 db.init_app(app)
 migrate.init_app(app, db)
+area_index.init_app(app)
+capacity_feed.init_app(app)
+event_buffer.init_app(app)
+tile_cache.init_app(app)
+user_cache.init_app(app)
+open_sessions.init_app(app)
+area_stats.init_app(app)
+occupancy_refresher.init_app(app)
 app.cli.add_command(seed_db_command)
+app.cli.add_command(check_capacity_summary_command)
+app.cli.add_command(refresh_occupancy_command)
+app.cli.add_command(rebuild_simplified_areas_command)
+app.cli.add_command(create_event_partitions_command)
+app.cli.add_command(import_areas_command)
+app.cli.add_command(import_events_command)
+app.cli.add_command(export_events_command)
+app.cli.add_command(bench_nearest_command)
+app.cli.add_command(bench_generate_city_command)
+app.cli.add_command(bench_endpoints_command)
+app.cli.add_command(bench_compare_command)
+app.cli.add_command(bench_replay_command)
+app.cli.add_command(bench_ingest_command)
+app.cli.add_command(bench_area_stats_command)
+app.cli.add_command(bench_import_command)
 
 # with app.app_context():
 #     db.create_all()
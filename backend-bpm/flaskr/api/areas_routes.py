@@ -1,7 +1,14 @@
-from flask import Blueprint, jsonify, request
-from sqlalchemy import func
+from datetime import datetime, timedelta
+from flask import Blueprint, Response, jsonify, request
+from flaskr.api.caching import conditional_response
+from flaskr.api.viewport import get_viewport_args
 from flaskr.extensions import db
-from flaskr.models.parking_areas import ParkingArea
+from flaskr.models.capacity_summary import CapacitySummary
+from flaskr.models.events import parse_timestamp
+from flaskr.models.occupancy import OccupancyRollupState
+from flaskr.models.parking_areas import ParkingArea, ParkingAreasState
+from flaskr.services.area_stats import area_stats
+from flaskr.services.occupancy import get_occupancy_series
 
 areas_bp = Blueprint('areas', __name__, url_prefix='/areas')
 
@@ -14,11 +21,18 @@ def say_hello():
 #                           PARKING AREAS - BASIC CRUD
 # ----------------------------------------------------------------------
 
-# Get all parking areas
+# Get all parking areas (optionally within ?bbox=, simplified for ?zoom=)
 @areas_bp.route("/", methods=["GET"])
 def get_all_areas():
-    areas = ParkingArea.get_all()
-    return jsonify([area.to_dict() for area in areas])
+    try:
+        bbox, zoom = get_viewport_args()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if bbox is None and zoom is None:
+        build = lambda: jsonify([area.to_dict() for area in ParkingArea.get_all()])
+    else:
+        build = lambda: Response(ParkingArea.get_list_json(bbox, zoom), mimetype='application/json')
+    return conditional_response(ParkingArea.get_collection_etag(), build)
 
 
 # Get single parking area by ID
@@ -27,7 +41,7 @@ def get_area_by_id(area_id):
     area = ParkingArea.get_by_id(area_id)
     if area is None:
         return jsonify({"error": "Parking area not found"}), 404
-    return jsonify(area.to_dict())
+    return conditional_response(area.get_etag(), lambda: jsonify(area.to_dict()))
 
 
 # Get single parking area by name
@@ -39,14 +53,19 @@ def get_area_by_name(name):
     return jsonify(area.to_dict())
 
 
-# Get all parking areas as GeoJSON FeatureCollection
+# Get all parking areas as GeoJSON FeatureCollection (optionally within
+# ?bbox=, simplified for ?zoom=)
 @areas_bp.route("/geojson", methods=["GET"])
 def get_all_areas_geojson():
-    areas = ParkingArea.get_all()
-    return jsonify({
-        "type": "FeatureCollection",
-        "features": [area.to_geojson_feature() for area in areas]
-    })
+    try:
+        bbox, zoom = get_viewport_args()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    # Assembled by PostGIS and sent as is
+    return conditional_response(
+        ParkingArea.get_collection_etag(),
+        lambda: Response(ParkingArea.get_geojson_collection(bbox, zoom), mimetype='application/json')
+    )
 
 
 # Get single parking area as GeoJSON Feature
@@ -55,7 +74,94 @@ def get_area_geojson(area_id):
     area = ParkingArea.get_by_id(area_id)
     if area is None:
         return jsonify({"error": "Parking area not found"}), 404
-    return jsonify(area.to_geojson_feature())
+    return conditional_response(area.get_etag(), lambda: jsonify(area.to_geojson_feature()))
+
+
+# ----------------------------------------------------------------------
+#                           OCCUPANCY OVER TIME
+# ----------------------------------------------------------------------
+
+# Get the occupancy series of an area (served from the hourly rollups)
+# Query args: from, to (ISO 8601, default: the last 24 hours), bucket ("hour" or "day")
+@areas_bp.route("/<int:area_id>/occupancy", methods=["GET"])
+def get_area_occupancy(area_id):
+    area = ParkingArea.get_by_id(area_id)
+    if area is None:
+        return jsonify({"error": "Parking area not found"}), 404
+    
+    bucket = request.args.get('bucket', 'hour')
+    if bucket not in ('hour', 'day'):
+        return jsonify({"error": "Invalid bucket. Must be 'hour' or 'day'"}), 400
+    
+    now = datetime.utcnow()
+    try:
+        end = parse_timestamp(request.args['to']) if 'to' in request.args else now
+        start = parse_timestamp(request.args['from']) if 'from' in request.args else end - timedelta(days=1)
+    except ValueError:
+        return jsonify({"error": "Invalid from/to. Must be ISO 8601 timestamps"}), 400
+    if bucket == 'day':
+        start = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    if start >= end:
+        return jsonify({"error": "Invalid range. 'from' must be before 'to'"}), 400
+    if end - start > timedelta(days=366):
+        return jsonify({"error": "Invalid range. Must be at most 366 days"}), 400
+    
+    # The rollups are refreshed in the background (OccupancyRefresher)
+    refreshed_at = OccupancyRollupState.get().refreshed_at
+    
+    return jsonify({
+        "parking_area_id": area.id,
+        "max_capacity": area.max_capacity,
+        "bucket": bucket,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "refreshed_at": refreshed_at.isoformat() if refreshed_at else None,
+        "series": get_occupancy_series(area.id, start, end, bucket)
+    })
+
+
+# Get the dwell time, turnover and arrival statistics of every area over the
+# last ?days= days (default 30), computed in bulk and cached for AREA_STATS_TTL
+@areas_bp.route("/stats", methods=["GET"])
+def get_areas_stats():
+    try:
+        days = int(request.args.get('days', 30))
+    except ValueError:
+        return jsonify({"error": "Invalid days. Must be an integer"}), 400
+    if not 1 <= days <= 366:
+        return jsonify({"error": "Invalid days. Must be between 1 and 366"}), 400
+    
+    return jsonify(area_stats.get(days))
+
+
+# ----------------------------------------------------------------------
+#                           STATIC GEOMETRY / DYNAMIC CAPACITY
+# ----------------------------------------------------------------------
+# Map clients fetch the (effectively static) polygons once and revalidate
+# them with If-None-Match against the geometry version, and poll only the
+# lightweight capacity payload.
+
+# Get the static part of all parking areas as GeoJSON FeatureCollection
+@areas_bp.route("/geometry", methods=["GET"])
+def get_areas_geometry():
+    return conditional_response(
+        f"g{ParkingAreasState.get_geometry_version()}",
+        lambda: Response(ParkingArea.get_geometry_collection(), mimetype='application/json')
+    )
+
+
+# Get the capacity of all parking areas (no geometry)
+@areas_bp.route("/capacity", methods=["GET"])
+def get_areas_capacity():
+    return jsonify(ParkingArea.get_capacities())
+
+
+# Server-sent events of the capacity changes: served by the ASGI app
+# (flaskr.asgi), where an open stream holds no thread. Reaching this route
+# means the app runs under a WSGI server.
+@areas_bp.route("/capacity/stream", methods=["GET"])
+def stream_areas_capacity():
+    return jsonify({"error": "Capacity stream requires the ASGI server (uvicorn flaskr.asgi:application)"}), 501
 
 
 # ----------------------------------------------------------------------
@@ -65,31 +171,37 @@ def get_area_geojson(area_id):
 # Park a bicycle in an area
 @areas_bp.route("/<int:area_id>/park", methods=["POST"])
 def park_bicycle(area_id):
-    area = ParkingArea.get_by_id(area_id)
+    area = ParkingArea.park_bicycle(area_id)
     if area is None:
-        return jsonify({"error": "Parking area not found"}), 404
+        db.session.rollback()
+        if ParkingArea.get_by_id(area_id) is None:
+            return jsonify({"error": "Parking area not found"}), 404
+        return jsonify({"error": "Parking area is full"}), 400
     
-    if area.park_bicycle():
-        return jsonify({
-            "message": "Bicycle parked successfully",
-            "area": area.to_dict()
-        })
-    return jsonify({"error": "Parking area is full"}), 400
+    response = {
+        "message": "Bicycle parked successfully",
+        "area": area.to_dict()
+    }
+    db.session.commit()
+    return jsonify(response)
 
 
 # Remove a bicycle from an area
 @areas_bp.route("/<int:area_id>/leave", methods=["POST"])
 def leave_parking(area_id):
-    area = ParkingArea.get_by_id(area_id)
+    area = ParkingArea.leave_parking(area_id)
     if area is None:
-        return jsonify({"error": "Parking area not found"}), 404
+        db.session.rollback()
+        if ParkingArea.get_by_id(area_id) is None:
+            return jsonify({"error": "Parking area not found"}), 404
+        return jsonify({"error": "Parking area is already empty"}), 400
     
-    if area.leave_parking():
-        return jsonify({
-            "message": "Bicycle removed successfully",
-            "area": area.to_dict()
-        })
-    return jsonify({"error": "Parking area is already empty"}), 400
+    response = {
+        "message": "Bicycle removed successfully",
+        "area": area.to_dict()
+    }
+    db.session.commit()
+    return jsonify(response)
 
 
 # ----------------------------------------------------------------------
@@ -110,17 +222,47 @@ def get_full_areas():
     return jsonify([area.to_dict() for area in areas])
 
 
+# Get the nearest areas with free spots
+# Query args: lon, lat (required), k (default 5, max 100), min_free (default 1)
+@areas_bp.route("/nearest", methods=["GET"])
+def get_nearest_areas():
+    longitude = request.args.get('lon', type=float)
+    latitude = request.args.get('lat', type=float)
+    if longitude is None or latitude is None:
+        return jsonify({"error": "Query parameters 'lon' and 'lat' are required numbers"}), 400
+    if not (-180 <= longitude <= 180 and -90 <= latitude <= 90):
+        return jsonify({"error": "Coordinates out of range"}), 400
+    
+    k = request.args.get('k', 5, type=int)
+    min_free = request.args.get('min_free', 1, type=int)
+    if not 1 <= k <= 100:
+        return jsonify({"error": "Invalid k. Must be between 1 and 100"}), 400
+    if min_free < 0:
+        return jsonify({"error": "Invalid min_free. Must be zero or more"}), 400
+    
+    return jsonify(ParkingArea.get_nearest(longitude, latitude, k, min_free))
+
+
 # Get capacity summary
+# Reads the trigger-maintained aggregate (constant time);
+# ?include=areas adds the occupancy of every area.
 @areas_bp.route("/summary", methods=["GET"])
 def get_capacity_summary():
-    total_max = db.session.query(func.sum(ParkingArea.max_capacity)).scalar() or 0
-    total_residual = db.session.query(func.sum(ParkingArea.residual_capacity)).scalar() or 0
-    total_areas = ParkingArea.query.count()
+    totals = CapacitySummary.get_totals()
+    total_max = totals["total_max_capacity"]
+    total_residual = totals["total_residual_capacity"]
     
-    return jsonify({
-        "total_areas": total_areas,
+    summary = {
+        "total_areas": totals["total_areas"],
         "total_max_capacity": total_max,
         "total_residual_capacity": total_residual,
         "total_occupied": total_max - total_residual,
-        "overall_occupancy_percentage": ((total_max - total_residual) / total_max * 100) if total_max > 0 else 0
-    })
+        "overall_occupancy_percentage": ((total_max - total_residual) / total_max * 100) if total_max > 0 else 0,
+        "areas_full": totals["areas_full"]
+    }
+    if request.args.get('include') == 'areas':
+        summary["areas"] = [
+            {"id": area["id"], "occupancy_percentage": area["occupancy_percentage"]}
+            for area in ParkingArea.get_capacities()
+        ]
+    return jsonify(summary)
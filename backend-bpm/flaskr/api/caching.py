@@ -0,0 +1,23 @@
+from flask import make_response, request
+
+
+# ----------------------------------------------------------------------
+#                           CONDITIONAL GET
+# ----------------------------------------------------------------------
+# Routes compute a cheap ETag value first (versions, digests) and only build
+# the payload when the client copy is outdated; otherwise they answer
+# 304 Not Modified with an empty body.
+
+def conditional_response(etag, build):
+    """Returns 304 if the request If-None-Match matches `etag`, otherwise the
+    response returned by `build()`, tagged with the strong `etag`.
+
+    Clients must revalidate on every use (no-cache), as capacities change.
+    """
+    if request.if_none_match.contains(etag):
+        response = make_response("", 304)
+    else:
+        response = make_response(build())
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
@@ -1,87 +1,425 @@
-from flask import Blueprint, jsonify, request
+import json
+from datetime import datetime
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
 from geoalchemy2 import WKTElement
-from geoalchemy2 import functions as geo_func
+from psycopg.errors import ForeignKeyViolation
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from flaskr.api.pagination import (
+    decode_sync_cursor, encode_cursor, encode_sync_cursor, get_page_args, parse_limit, stream_json_array,
+    stream_ndjson
+)
+from flaskr.api.viewport import get_viewport_args
 from flaskr.extensions import db
-from flaskr.models.events import ParkingEvent, EventType
+from flaskr.models.events import ParkingEvent, EventType, parse_timestamp
 from flaskr.models.parking_areas import ParkingArea
+from flaskr.services.columnar_export import FORMATS as EXPORT_FORMATS, stream_events
+from flaskr.services.event_buffer import event_buffer
+from flaskr.services.sessions import close_session, close_sessions, open_sessions
+from flaskr.services.spatial_index import area_index
+from flaskr.services.user_cache import user_cache
 
 events_bp = Blueprint('events', __name__, url_prefix='/events')
 
+# Largest value of the INTEGER id columns
+MAX_ID = 2 ** 31 - 1
+
 
 # ----------------------------------------------------------------------
 #                           PARKING EVENTS - CREATE
 # ----------------------------------------------------------------------
-# Signal a 'parking event' (from the App)
-# Incoming request payload must contain:
-#  - user_id
-#  - longitude, latitude (gps coordinates)
-#  - type ("park" or "leave")
-#  - timestamp (optional)
-@events_bp.route("/parking", methods=["POST"])
-def parking_event():
-    data = request.get_json()
+def parse_event_payload(data):
+    """Validates an incoming parking event payload.
+
+    Returns (fields, None) on success, or (None, error message) otherwise.
+    """
+    if not isinstance(data, dict):
+        return None, "Invalid event payload"
     
     # Validate required fields
     required_fields = ['user_id', 'longitude', 'latitude', 'type']
     for field in required_fields:
         if field not in data:
-            return jsonify({"error": f"Missing required field: {field}"}), 400
+            return None, f"Missing required field: {field}"
     
     # Validate event type
     try:
         event_type = EventType(data['type'])
     except ValueError:
-        return jsonify({"error": "Invalid event type. Must be 'park' or 'leave'"}), 400
+        return None, "Invalid event type. Must be 'park' or 'leave'"
+    
+    # Validate user id
+    if isinstance(data['user_id'], bool) or not isinstance(data['user_id'], int):
+        return None, "Invalid user_id. Must be an integer"
+    if not 1 <= data['user_id'] <= MAX_ID:
+        return None, f"Invalid user_id. Must be between 1 and {MAX_ID}"
+    
+    # Validate gps coordinates (NaN fails the range check too)
+    try:
+        longitude = float(data['longitude'])
+        latitude = float(data['latitude'])
+    except (TypeError, ValueError):
+        return None, "Invalid coordinates. Longitude and latitude must be numbers"
+    if not (-180 <= longitude <= 180 and -90 <= latitude <= 90):
+        return None, "Coordinates out of range"
+    
+    # Optional start time (ISO 8601), defaults to now
+    start_time = None
+    if data.get('start_time'):
+        try:
+            start_time = parse_timestamp(data['start_time'])
+        except ValueError:
+            return None, "Invalid start_time. Must be an ISO 8601 timestamp"
+    
+    return {
+        "type": event_type,
+        "user_id": data['user_id'],
+        "longitude": longitude,
+        "latitude": latitude,
+        "start_time": start_time
+    }, None
+
+
+# Signal a 'parking event' (from the App)
+# Incoming request payload must contain:
+#  - user_id
+#  - longitude, latitude (gps coordinates)
+#  - type ("park" or "leave")
+#  - start_time (optional)
+@events_bp.route("/parking", methods=["POST"])
+def parking_event():
+    fields, error = parse_event_payload(request.get_json())
+    if error:
+        return jsonify({"error": error}), 400
+    
+    if event_buffer.enabled:
+        return _parking_event_write_behind(fields)
+    
+    event_type = fields['type']
+    longitude = fields['longitude']
+    latitude = fields['latitude']
     
     # Create point geometry from coordinates
-    longitude = data['longitude']
-    latitude = data['latitude']
     location_point = WKTElement(f'POINT({longitude} {latitude})', srid=4326)
     
-    # Find the parking area that contains this point
-    parking_area = ParkingArea.query.filter(
-        geo_func.ST_Contains(ParkingArea.location_area, location_point)
-    ).first()
+    # Find the parking area that contains this point (in-memory index,
+    # falls back to the database while the index is stale)
+    area_id = area_index.lookup(longitude, latitude, location_point)
     
-    if parking_area is None:
+    if area_id is None:
         return jsonify({"error": "Location is not within any parking area"}), 400
     
-    # Update parking area capacity based on event type
-    if event_type == EventType.PARK:
-        if not parking_area.park_bicycle():
-            return jsonify({"error": "Parking area is full"}), 400
-    else:  # LEAVE
-        if not parking_area.leave_parking():
-            return jsonify({"error": "Parking area is already empty"}), 400
+    # Known users are validated without a query (the foreign key still
+    # catches any user deleted meanwhile)
+    if not user_cache.exists(fields['user_id']):
+        return jsonify({"error": "User not found"}), 400
+    
+    # Update parking area capacity based on event type: a single conditional
+    # UPDATE, committed in the same transaction as the event insert
+    parking_area, error = _reserve_capacity(event_type, area_id)
+    if error:
+        return jsonify({"error": error}), 400
     
     # Create the event
     event = ParkingEvent(
         type=event_type,
         location_point=location_point,
-        user_id=data['user_id'],
+        user_id=fields['user_id'],
         parking_area_id=parking_area.id,
-        start_time=data.get('start_time')  # Optional, defaults to now
+        start_time=fields['start_time']
     )
     
     db.session.add(event)
-    db.session.commit()
+    try:
+        db.session.flush()
+    except IntegrityError as e:
+        db.session.rollback()
+        if isinstance(e.orig, ForeignKeyViolation):
+            return jsonify({"error": "User not found"}), 400
+        return jsonify({"error": "Event already recorded"}), 409
     
-    return jsonify({
+    # A leave closes the session opened by the park, in the same transaction
+    if event_type == EventType.LEAVE:
+        close_session(event.user_id, event.parking_area_id, event.start_time)
+    
+    # Serialize before committing so the expired objects are not reloaded
+    response = {
         "message": f"Bicycle {event_type.value} event recorded successfully",
         "event": event.to_dict(),
         "parking_area": parking_area.to_dict()
-    }), 201
+    }
+    session = (event.user_id, event.parking_area_id, event.id, event.start_time)
+    db.session.commit()
+    
+    if event_type == EventType.PARK:
+        open_sessions.add(*session)
+    
+    return jsonify(response), 201
+
+
+def _reserve_capacity(event_type, area_id):
+    """Applies the capacity change of an event; returns (area, None), or
+    (None, error message) after rolling back."""
+    if event_type == EventType.PARK:
+        parking_area = ParkingArea.park_bicycle(area_id)
+        error = "Parking area is full"
+    else:  # LEAVE
+        parking_area = ParkingArea.leave_parking(area_id)
+        error = "Parking area is already empty"
+    if parking_area is None:
+        db.session.rollback()
+        return None, error
+    return parking_area, None
+
+
+# Write-behind mode (EVENTS_WRITE_BEHIND): only the capacity reservation is
+# committed by the request; the event row is queued and inserted in a batch
+# by the event buffer. Answers 202 (the event has no id yet), or 429 while
+# the buffer is saturated.
+def _parking_event_write_behind(fields):
+    if not event_buffer.acquire_slot():
+        return jsonify({"error": "Too many pending events, retry later"}), 429, {"Retry-After": "1"}
+    
+    queued = False
+    try:
+        event_type = fields['type']
+        longitude = fields['longitude']
+        latitude = fields['latitude']
+        location_point = WKTElement(f'POINT({longitude} {latitude})', srid=4326)
+        
+        area_id = area_index.lookup(longitude, latitude, location_point)
+        if area_id is None:
+            return jsonify({"error": "Location is not within any parking area"}), 400
+        
+        # Checked now: the insert happens after the response
+        if not user_cache.exists(fields['user_id']):
+            return jsonify({"error": "User not found"}), 400
+        
+        parking_area, error = _reserve_capacity(event_type, area_id)
+        if error:
+            return jsonify({"error": error}), 400
+        
+        row = {
+            "type": event_type,
+            "location_point": location_point,
+            "user_id": fields['user_id'],
+            "parking_area_id": parking_area.id,
+            "start_time": fields['start_time'] or datetime.utcnow(),
+            "end_time": None
+        }
+        response = {
+            "message": f"Bicycle {event_type.value} event accepted",
+            "event": {
+                "id": None,
+                "start_time": row['start_time'].isoformat(),
+                "end_time": None,
+                "type": event_type.value,
+                "location_point": {"type": "Point", "coordinates": [longitude, latitude]},
+                "user_id": fields['user_id'],
+                "parking_area_id": parking_area.id
+            },
+            "parking_area": parking_area.to_dict()
+        }
+        # Like the buffered event, the reservation may be lost if the
+        # database crashes right after: no need to wait for its WAL flush
+        db.session.execute(text("SET LOCAL synchronous_commit TO OFF"))
+        db.session.commit()
+        
+        event_buffer.put(row)
+        queued = True
+        return jsonify(response), 202
+    finally:
+        if not queued:
+            event_buffer.release_slot()
+
+
+# Signal a batch of 'parking events' (buffered by the App or gate sensors)
+# Incoming request payload is a list of parking event payloads (as above),
+# either bare or wrapped as {"events": [...]}. Events are applied in order
+# and the response holds one result per item.
+@events_bp.route("/parking/batch", methods=["POST"])
+def parking_events_batch():
+    data = request.get_json()
+    items = data.get('events') if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "Payload must be a non-empty list of events"}), 400
+    
+    max_size = current_app.config["EVENTS_BATCH_MAX_SIZE"]
+    if len(items) > max_size:
+        return jsonify({"error": f"Too many events in batch (max {max_size})"}), 413
+    
+    results = [None] * len(items)
+    
+    def reject(index, error):
+        results[index] = {"index": index, "status": 400, "error": error}
+    
+    # Validate payloads
+    parsed = []
+    for index, item in enumerate(items):
+        fields, error = parse_event_payload(item)
+        if error:
+            reject(index, error)
+        else:
+            parsed.append((index, fields))
+    
+    # Resolve all points to areas and check all users at once
+    area_ids = area_index.lookup_many([(f['longitude'], f['latitude']) for _, f in parsed])
+    known_users = user_cache.existing_ids({f['user_id'] for _, f in parsed})
+    
+    candidates = []
+    for (index, fields), area_id in zip(parsed, area_ids):
+        if area_id is None:
+            reject(index, "Location is not within any parking area")
+        elif fields['user_id'] not in known_users:
+            reject(index, "User not found")
+        else:
+            candidates.append((index, fields, area_id))
+    
+    # Apply the capacity changes of all events, aggregated per area
+    accepted, residual = ParkingArea.apply_capacity_changes([
+        (area_id, -1 if fields['type'] == EventType.PARK else 1)
+        for _, fields, area_id in candidates
+    ])
+    
+    rows = []
+    for (index, fields, area_id), ok in zip(candidates, accepted):
+        if not ok:
+            reject(index, "Parking area is full" if fields['type'] == EventType.PARK
+                   else "Parking area is already empty")
+            continue
+        rows.append((index, {
+            "type": fields['type'],
+            "location_point": WKTElement(f"POINT({fields['longitude']} {fields['latitude']})", srid=4326),
+            "user_id": fields['user_id'],
+            "parking_area_id": area_id,
+            "start_time": fields['start_time'] or datetime.utcnow(),
+            "end_time": None
+        }))
+    
+    # Insert all accepted events at once, in the same transaction. Events
+    # already recorded (a resent batch) are skipped and give their capacity back
+    inserted = []
+    if rows:
+        try:
+            event_ids = ParkingEvent.bulk_insert([row for _, row in rows])
+        except IntegrityError as e:
+            db.session.rollback()
+            if isinstance(e.orig, ForeignKeyViolation):
+                # A user deleted since the check: nothing is applied
+                return jsonify({"error": "User not found"}), 400
+            raise
+        duplicates = []
+        for (index, row), event_id in zip(rows, event_ids):
+            if event_id is None:
+                results[index] = {"index": index, "status": 409, "error": "Event already recorded"}
+                duplicates.append(row)
+                continue
+            inserted.append((index, row))
+            results[index] = {
+                "index": index,
+                "status": 201,
+                "event_id": event_id,
+                "type": row['type'].value,
+                "parking_area_id": row['parking_area_id']
+            }
+        if duplicates:
+            _, restored = ParkingArea.apply_capacity_changes([
+                (row['parking_area_id'], 1 if row['type'] == EventType.PARK else -1) for row in duplicates
+            ])
+            residual.update(restored)
+        close_sessions([row for _, row in inserted if row['type'] == EventType.LEAVE])
+    db.session.commit()
+    
+    for index, row in inserted:
+        if row['type'] == EventType.PARK:
+            open_sessions.add(row['user_id'], row['parking_area_id'], results[index]['event_id'],
+                              row['start_time'])
+    
+    return jsonify({
+        "accepted": len(inserted),
+        "rejected": len(items) - len(inserted),
+        "results": results,
+        "parking_areas": [
+            {"id": area_id, "residual_capacity": value}
+            for area_id, value in sorted(residual.items())
+        ]
+    })
 
 
 # ----------------------------------------------------------------------
 #                           PARKING EVENTS - READ
 # ----------------------------------------------------------------------
+# Listings of unbounded size support:
+#  - ?limit=&cursor= : keyset pagination on (start_time, id), the response
+#                      carries the `next_cursor` of the following page
+#  - ?format=ndjson  : one JSON document per line
+#  - default         : the full listing, streamed from a server-side cursor
+# and ?from=&to= bounds on start_time, which restrict the monthly partitions
+# scanned, and ?bbox= (see flaskr.api.viewport; points are never simplified,
+# so ?zoom= is accepted but has no effect).
+def _get_time_range():
+    start = request.args.get('from')
+    end = request.args.get('to')
+    try:
+        start = parse_timestamp(start) if start else None
+    except ValueError:
+        raise ValueError("Invalid 'from' timestamp")
+    try:
+        end = parse_timestamp(end) if end else None
+    except ValueError:
+        raise ValueError("Invalid 'to' timestamp")
+    return start, end
+
+
+def _events_listing(geojson=False, **filters):
+    try:
+        limit, after = get_page_args()
+        start, end = _get_time_range()
+        bbox, _ = get_viewport_args()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    query = ParkingEvent.filter_query(start=start, end=end, bbox=bbox, **filters)
+    
+    if geojson:
+        # Features are built by PostGIS, rows only carry the keyset and the JSON text
+        query = query.with_entities(
+            ParkingEvent.start_time, ParkingEvent.id, ParkingEvent.geojson_feature_sql().label('feature')
+        )
+        dumps = lambda row: row.feature
+    else:
+        dumps = lambda event: json.dumps(event.to_dict())
+    
+    # Keyset page
+    if limit is not None:
+        rows = ParkingEvent.get_page(query, limit, after)
+        next_cursor = None
+        if len(rows) == limit:
+            next_cursor = encode_cursor(rows[-1].start_time, rows[-1].id)
+        items = "[" + ",".join(dumps(row) for row in rows) + "]"
+        if geojson:
+            body = f'{{"type": "FeatureCollection", "features": {items}, "next_cursor": {json.dumps(next_cursor)}}}'
+        else:
+            body = f'{{"events": {items}, "next_cursor": {json.dumps(next_cursor)}}}'
+        return Response(body, mimetype='application/json')
+    
+    # Streamed listing
+    rows = ParkingEvent.iter_all(query, current_app.config["STREAM_CHUNK_SIZE"])
+    if request.args.get('format') == 'ndjson':
+        return Response(stream_with_context(stream_ndjson(rows, dumps)),
+                        mimetype='application/x-ndjson')
+    if geojson:
+        chunks = stream_json_array(rows, dumps,
+                                   prefix='{"type": "FeatureCollection", "features": [',
+                                   suffix=']}')
+    else:
+        chunks = stream_json_array(rows, dumps)
+    return Response(stream_with_context(chunks), mimetype='application/json')
+
 
 # Get all parking events
 @events_bp.route("/", methods=["GET"])
 def get_all_events():
-    events = ParkingEvent.get_all()
-    return jsonify([event.to_dict() for event in events])
+    return _events_listing()
 
 
 # Get single event by ID
@@ -94,17 +432,45 @@ def get_event_by_id(event_id):
 
 
 # Get all user 'parking events' (from the App)
+# With ?since=<cursor> (empty for the first sync), only the events inserted or
+# updated since the sync which returned the cursor, in pages of ?limit=:
+#   {"events": [...], "cursor": <next since>, "has_more": <another page?>}
+# Events may be returned again by a later sync: clients upsert them by id.
 @events_bp.route("/user/<int:user_id>", methods=["GET"])
 def get_user_parking_events(user_id):
-    events = ParkingEvent.get_by_user(user_id)
-    return jsonify([event.to_dict() for event in events])
+    since = request.args.get('since')
+    if since is None:
+        events = ParkingEvent.get_by_user(user_id)
+        return jsonify([event.to_dict() for event in events])
+    
+    try:
+        horizon, next_horizon, after = decode_sync_cursor(since)
+        limit = parse_limit(request.args.get('limit'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    # First page: the next sync resumes from the horizon taken before reading
+    if next_horizon is None:
+        next_horizon = ParkingEvent.change_horizon()
+    events = ParkingEvent.get_changes(user_id, horizon, after, limit + 1)
+    has_more = len(events) > limit
+    events = events[:limit]
+    if has_more:
+        cursor = encode_sync_cursor(horizon, next_horizon, (events[-1].change_xid or 0, events[-1].id))
+    else:
+        cursor = encode_sync_cursor(next_horizon)
+    
+    return jsonify({
+        "events": [event.to_dict() for event in events],
+        "cursor": cursor,
+        "has_more": has_more
+    })
 
 
 # Get all events for a specific parking area
 @events_bp.route("/area/<int:area_id>", methods=["GET"])
 def get_area_events(area_id):
-    events = ParkingEvent.get_by_parking_area(area_id)
-    return jsonify([event.to_dict() for event in events])
+    return _events_listing(parking_area_id=area_id)
 
 
 # Get events by type (park/leave)
@@ -115,8 +481,7 @@ def get_events_by_type(event_type):
     except ValueError:
         return jsonify({"error": "Invalid event type. Must be 'park' or 'leave'"}), 400
     
-    events = ParkingEvent.get_by_type(ev_type)
-    return jsonify([event.to_dict() for event in events])
+    return _events_listing(event_type=ev_type)
 
 
 # Get recent events
@@ -134,18 +499,84 @@ def get_recent_events():
 # Get all events as GeoJSON FeatureCollection
 @events_bp.route("/geojson", methods=["GET"])
 def get_all_events_geojson():
-    events = ParkingEvent.get_all()
-    return jsonify({
-        "type": "FeatureCollection",
-        "features": [event.to_geojson_feature() for event in events]
-    })
+    return _events_listing(geojson=True)
 
 
 # Get user events as GeoJSON FeatureCollection
 @events_bp.route("/user/<int:user_id>/geojson", methods=["GET"])
 def get_user_events_geojson(user_id):
-    events = ParkingEvent.get_by_user(user_id)
-    return jsonify({
-        "type": "FeatureCollection",
-        "features": [event.to_geojson_feature() for event in events]
-    })
\ No newline at end of file
+    return _events_listing(geojson=True, user_id=user_id)
+
+
+# ----------------------------------------------------------------------
+#                           PARKING EVENTS - HEATMAP
+# ----------------------------------------------------------------------
+HEATMAP_SHAPES = ("square", "hex")
+
+# Cell size bounds (web mercator meters)
+HEATMAP_MIN_CELL_SIZE = 10
+HEATMAP_MAX_CELL_SIZE = 100000
+
+
+# Event density: number of events per grid cell, binned by PostGIS.
+#  - ?shape=square|hex (default hex) and ?size= (meters, default 250)
+#  - ?from=&to=, ?type=park|leave, ?bbox= filters
+# Returns a GeoJSON FeatureCollection of the non-empty cells {i, j, count}.
+@events_bp.route("/heatmap", methods=["GET"])
+def get_events_heatmap():
+    shape = request.args.get('shape', 'hex')
+    if shape not in HEATMAP_SHAPES:
+        return jsonify({"error": "Invalid shape. Must be 'square' or 'hex'"}), 400
+    try:
+        size = float(request.args.get('size', 250))
+    except ValueError:
+        size = None
+    if size is None or not HEATMAP_MIN_CELL_SIZE <= size <= HEATMAP_MAX_CELL_SIZE:
+        return jsonify({"error": f"Invalid size. Must be between {HEATMAP_MIN_CELL_SIZE} "
+                                 f"and {HEATMAP_MAX_CELL_SIZE} meters"}), 400
+    event_type = None
+    if request.args.get('type'):
+        try:
+            event_type = EventType(request.args['type'])
+        except ValueError:
+            return jsonify({"error": "Invalid event type. Must be 'park' or 'leave'"}), 400
+    try:
+        start, end = _get_time_range()
+        bbox, _ = get_viewport_args()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    cells = ParkingEvent.get_grid_counts(shape, size, start, end, event_type, bbox)
+    return Response(cells, mimetype='application/json')
+
+
+# ----------------------------------------------------------------------
+#                           PARKING EVENTS - COLUMNAR EXPORT
+# ----------------------------------------------------------------------
+EXPORT_MIMETYPES = {
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream"
+}
+
+EXPORT_EXTENSIONS = {"parquet": "parquet", "arrow": "arrows"}
+
+
+# Export the events (optionally started within ?from=&to=) as Parquet or as
+# an Arrow IPC stream (?format=), written batch by batch from a server-side
+# cursor. Locations are exported as longitude/latitude columns.
+@events_bp.route("/export", methods=["GET"])
+def export_events():
+    fmt = request.args.get('format', 'parquet')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": f"Invalid format. Must be one of: {', '.join(EXPORT_FORMATS)}"}), 400
+    try:
+        start, end = _get_time_range()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    chunks = stream_events(fmt, start, end, current_app.config["EXPORT_BATCH_SIZE"])
+    return Response(
+        stream_with_context(chunks),
+        mimetype=EXPORT_MIMETYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="parking-events.{EXPORT_EXTENSIONS[fmt]}"'}
+    )
@@ -0,0 +1,11 @@
+from flask import Blueprint, Response
+from flaskr.extensions import db
+from flaskr.services.metrics import metrics
+
+metrics_bp = Blueprint('metrics', __name__)
+
+
+# Prometheus scrape endpoint (metrics of this worker process)
+@metrics_bp.route("/metrics", methods=["GET"])
+def get_metrics():
+    return Response(metrics.render(db.engine.pool), mimetype="text/plain; version=0.0.4")
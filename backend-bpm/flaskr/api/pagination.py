@@ -0,0 +1,133 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+from flask import current_app, request
+
+
+# ----------------------------------------------------------------------
+#                           KEYSET CURSORS
+# ----------------------------------------------------------------------
+# Cursors are opaque to clients: url-safe base64 of "<start_time>|<id>",
+# the (start_time, id) key of the last row of the previous page.
+
+def encode_cursor(start_time, row_id):
+    raw = f"{start_time.isoformat()}|{row_id}".encode()
+    return urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Returns the (start_time, id) key encoded in the cursor.
+
+    Raises ValueError if the cursor is malformed.
+    """
+    try:
+        raw = urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        start_time, row_id = raw.split("|")
+        return datetime.fromisoformat(start_time), int(row_id)
+    except (UnicodeDecodeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+# Listings keyed by id only (users) use the url-safe base64 of "<id>".
+
+def encode_id_cursor(row_id):
+    return urlsafe_b64encode(str(row_id).encode()).decode().rstrip("=")
+
+
+def decode_id_cursor(cursor):
+    """Returns the id encoded in the cursor.
+
+    Raises ValueError if the cursor is malformed.
+    """
+    try:
+        return int(urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode())
+    except (UnicodeDecodeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def get_page_args(decode=decode_cursor):
+    """Reads the ?limit= and ?cursor= pagination arguments of the request.
+
+    Returns (limit, after) where limit is None when the request is not
+    paginated and after is the cursor decoded by `decode` (or None for the
+    first page). Raises ValueError on invalid arguments.
+    """
+    limit = request.args.get('limit')
+    cursor = request.args.get('cursor')
+    if limit is None and cursor is None:
+        return None, None
+
+    return parse_limit(limit), decode(cursor) if cursor else None
+
+
+def parse_limit(limit):
+    """Validates a ?limit= argument, PAGE_MAX_LIMIT when missing.
+
+    Raises ValueError if the limit is invalid.
+    """
+    max_limit = current_app.config["PAGE_MAX_LIMIT"]
+    try:
+        limit = int(limit) if limit is not None else max_limit
+    except ValueError:
+        raise ValueError("Invalid limit. Must be an integer")
+    if not 1 <= limit <= max_limit:
+        raise ValueError(f"Invalid limit. Must be between 1 and {max_limit}")
+    return limit
+
+
+# ----------------------------------------------------------------------
+#                           SYNC CURSORS
+# ----------------------------------------------------------------------
+# Delta sync cursors are opaque too: url-safe base64 of "<horizon>" between
+# two syncs, or of "<horizon>|<next horizon>|<change_xid>|<id>" while a sync
+# is paged (see ParkingEvent.change_horizon). The horizon only moves forward
+# once every page of a sync has been read.
+
+def encode_sync_cursor(horizon, next_horizon=None, after=None):
+    parts = [horizon] if next_horizon is None else [horizon, next_horizon, *after]
+    raw = "|".join(str(part) for part in parts).encode()
+    return urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_sync_cursor(cursor):
+    """Returns the (horizon, next horizon, after key) encoded in the cursor,
+    the last two being None between two syncs. An empty cursor (or "0")
+    starts a full sync.
+
+    Raises ValueError if the cursor is malformed.
+    """
+    if cursor in ("", "0"):
+        return 0, None, None
+    try:
+        raw = urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        parts = [int(part) for part in raw.split("|")]
+    except (UnicodeDecodeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+    if len(parts) == 1:
+        return parts[0], None, None
+    if len(parts) == 4:
+        return parts[0], parts[1], (parts[2], parts[3])
+    raise ValueError("Invalid cursor")
+
+
+# ----------------------------------------------------------------------
+#                           STREAMING
+# ----------------------------------------------------------------------
+# Generators for flask Responses: rows are encoded one by one, so the
+# worker memory stays flat whatever the size of the result. `dumps(row)`
+# returns the JSON text of a row (encoded in Python or already by the DB).
+
+def stream_json_array(rows, dumps, prefix="[", suffix="]"):
+    """Yields a JSON array (optionally wrapped by prefix/suffix) chunk by chunk."""
+    yield prefix
+    separator = ""
+    for row in rows:
+        yield separator + dumps(row)
+        separator = ","
+    yield suffix
+
+
+def stream_ndjson(rows, dumps):
+    """Yields one JSON document per line (NDJSON)."""
+    for row in rows:
+        yield dumps(row) + "\n"
@@ -0,0 +1,52 @@
+import json
+from datetime import datetime
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
+from flaskr.api.pagination import encode_cursor, get_page_args, stream_json_array
+from flaskr.models.events import ParkingEvent
+from flaskr.services.sessions import open_sessions_query
+
+sessions_bp = Blueprint('sessions', __name__, url_prefix='/sessions')
+
+# ----------------------------------------------------------------------
+#                           PARKING SESSIONS
+# ----------------------------------------------------------------------
+# The bicycles parked right now: the PARK events not closed by a LEAVE,
+# read from the partial index of the open sessions, oldest first. Optional
+# ?user_id= and ?parking_area_id= filters. With ?limit= (and ?cursor=) a
+# keyset page on (start_time, id) with its next_cursor, else streamed.
+@sessions_bp.route("/open", methods=["GET"])
+def get_open_parking_sessions():
+    filters = {}
+    for name in ('user_id', 'parking_area_id'):
+        value = request.args.get(name)
+        if value is None:
+            continue
+        try:
+            filters[name] = int(value)
+        except ValueError:
+            return jsonify({"error": f"Invalid {name}. Must be an integer"}), 400
+    try:
+        limit, after = get_page_args()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    query = open_sessions_query(**filters)
+    now = datetime.utcnow()
+    dumps = lambda event: json.dumps(
+        {**event.to_dict(), "parked_seconds": max((now - event.start_time).total_seconds(), 0)}
+    )
+
+    # Keyset page
+    if limit is not None:
+        rows = ParkingEvent.get_page(query, limit, after)
+        next_cursor = None
+        if len(rows) == limit:
+            next_cursor = encode_cursor(rows[-1].start_time, rows[-1].id)
+        items = "[" + ",".join(dumps(row) for row in rows) + "]"
+        return Response(f'{{"sessions": {items}, "next_cursor": {json.dumps(next_cursor)}}}',
+                        mimetype='application/json')
+
+    # Streamed listing
+    rows = ParkingEvent.iter_all(query, current_app.config["STREAM_CHUNK_SIZE"])
+    return Response(stream_with_context(stream_json_array(rows, dumps, prefix='{"sessions": [', suffix=']}')),
+                    mimetype='application/json')
@@ -0,0 +1,66 @@
+import time
+from flask import Blueprint, Response, current_app, jsonify, request
+from flaskr.api.caching import conditional_response
+from flaskr.models.events import ParkingEvent, parse_timestamp
+from flaskr.models.parking_areas import ParkingArea
+from flaskr.services.tile_cache import tile_cache
+
+tiles_bp = Blueprint('tiles', __name__, url_prefix='/tiles')
+
+MVT_MIMETYPE = 'application/vnd.mapbox-vector-tile'
+
+MAX_ZOOM = 24
+
+
+# ----------------------------------------------------------------------
+#                           VECTOR TILES
+# ----------------------------------------------------------------------
+# Mapbox Vector Tiles in the XYZ (web mercator) scheme, built by PostGIS
+# (ST_AsMVT) and kept in the per-worker tile cache, so that maps only load
+# the features of their viewport.
+
+def _valid_tile(z, x, y):
+    return z <= MAX_ZOOM and x < 2 ** z and y < 2 ** z
+
+
+# Areas with their capacity and occupancy (layer `areas`)
+@tiles_bp.route("/areas/<int:z>/<int:x>/<int:y>.mvt", methods=["GET"])
+def get_areas_tile(z, x, y):
+    if not _valid_tile(z, x, y):
+        return jsonify({"error": "Invalid tile coordinates"}), 400
+    
+    # Changes with the areas geometry and the capacities within the tile,
+    # only recomputed when some area changed
+    tag = tile_cache.tag(("areas", z, x, y), ParkingArea.get_collection_etag(),
+                         lambda: ParkingArea.get_tile_tag(z, x, y))
+    return conditional_response(
+        tag,
+        lambda: Response(tile_cache.get(("areas", z, x, y), tag, lambda: ParkingArea.get_tile(z, x, y)),
+                         mimetype=MVT_MIMETYPE)
+    )
+
+
+# Parking events (layer `events`), optionally started within ?from=&to=
+@tiles_bp.route("/events/<int:z>/<int:x>/<int:y>.mvt", methods=["GET"])
+def get_events_tile(z, x, y):
+    if not _valid_tile(z, x, y):
+        return jsonify({"error": "Invalid tile coordinates"}), 400
+    try:
+        start = parse_timestamp(request.args['from']) if request.args.get('from') else None
+        end = parse_timestamp(request.args['to']) if request.args.get('to') else None
+    except ValueError:
+        return jsonify({"error": "Invalid 'from' or 'to' timestamp"}), 400
+    
+    ttl = current_app.config["TILES_EVENTS_TTL"]
+    headers = {"Cache-Control": f"max-age={int(ttl)}"}
+    # Too many events to draw at the lower zooms
+    if z < current_app.config["TILES_EVENTS_MIN_ZOOM"]:
+        return Response(b"", mimetype=MVT_MIMETYPE, headers=headers)
+    
+    # Events change all the time: tiles are only cached for the TTL
+    tag = int(time.time() // ttl) if ttl > 0 else time.time()
+    tile = tile_cache.get(
+        ("events", z, x, y, start, end), tag,
+        lambda: ParkingEvent.get_tile(z, x, y, start, end, current_app.config["TILES_EVENTS_MAX_FEATURES"])
+    )
+    return Response(tile, mimetype=MVT_MIMETYPE, headers=headers)
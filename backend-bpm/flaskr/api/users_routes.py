@@ -1,19 +1,35 @@
-from flask import Blueprint, request, jsonify
+import json
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
+from flaskr.api.pagination import decode_id_cursor, encode_id_cursor, get_page_args, stream_json_array
 from flaskr.extensions import db
 from flaskr.models.users import User
+from flaskr.services.user_cache import user_cache
 from datetime import date
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy.exc import SQLAlchemyError
 
 users_bp = Blueprint('users', __name__, url_prefix='/users')
 
 # ----------------------------------------------------------------------
 #                               USERS
 # ----------------------------------------------------------------------
+# Keyset pagination on id with ?limit=&cursor= (the response carries the
+# `next_cursor` of the following page), otherwise the full listing streamed
+# from a server-side cursor.
 @users_bp.route("/", methods=["GET"])
 def get_all_users():
-    users = User.query.all()
-    # Convert list of objects to list of dictionaries
-    return jsonify({"users": [user.to_dict() for user in users]})
+    try:
+        limit, after_id = get_page_args(decode_id_cursor)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    if limit is not None:
+        users = User.get_page(limit, after_id)
+        next_cursor = encode_id_cursor(users[-1].id) if len(users) == limit else None
+        return jsonify({"users": [user.to_dict() for user in users], "next_cursor": next_cursor})
+    
+    users = User.iter_all(current_app.config["STREAM_CHUNK_SIZE"])
+    chunks = stream_json_array(users, lambda user: json.dumps(user.to_dict()), prefix='{"users": [', suffix=']}')
+    return Response(stream_with_context(chunks), mimetype='application/json')
 
 @users_bp.route("/signup", methods=["POST"])
 def user_signup():
@@ -25,21 +41,23 @@ def user_signup():
         
     username = data["username"]
     
-    # Check if user already exists
-    if User.query.filter_by(username=username).first():
-        return jsonify({"error": "User already exists"}), 409
-
-    # Create new user
-    new_user = User(username=username, created_at=date.today())
-    
+    # Create the user unless the username is taken (one statement)
     try:
-        db.session.add(new_user)
+        user = User.register(username, date.today())
         db.session.commit()
-        return jsonify(new_user.to_dict()), 201
-    except Exception as e:
+    except SQLAlchemyError as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
+    if user is None:
+        return jsonify({"error": "User already exists"}), 409
+    
+    user_cache.add(user.id, user.username)
+    return jsonify({
+        "id": user.id,
+        "username": user.username,
+        "created_at": user.created_at.isoformat()
+    }), 201
 
 @users_bp.route("/signin", methods=["POST"])
 def user_signin():
-    return {"user": []}
\ No newline at end of file
+    return {"user": []}
@@ -0,0 +1,41 @@
+from flask import request
+
+MAX_ZOOM = 24
+
+
+# ----------------------------------------------------------------------
+#                           VIEWPORT ARGUMENTS
+# ----------------------------------------------------------------------
+# Map listings accept ?bbox=minx,miny,maxx,maxy (WGS84 longitudes and
+# latitudes) to return the features of the viewport only, and ?zoom= to get
+# polygons simplified for the zoom level.
+
+def get_viewport_args():
+    """Reads the ?bbox= and ?zoom= arguments of the request.
+
+    Returns (bbox, zoom), each None when missing, bbox being a
+    (minx, miny, maxx, maxy) tuple. Raises ValueError on invalid arguments.
+    """
+    bbox = request.args.get('bbox')
+    zoom = request.args.get('zoom')
+
+    if bbox is not None:
+        try:
+            bbox = tuple(float(value) for value in bbox.split(","))
+        except ValueError:
+            raise ValueError("Invalid bbox. Must be minx,miny,maxx,maxy")
+        if len(bbox) != 4:
+            raise ValueError("Invalid bbox. Must be minx,miny,maxx,maxy")
+        minx, miny, maxx, maxy = bbox
+        if not (-180 <= minx <= maxx <= 180 and -90 <= miny <= maxy <= 90):
+            raise ValueError("Invalid bbox. Must be minx,miny,maxx,maxy within [-180, 180] x [-90, 90]")
+
+    if zoom is not None:
+        try:
+            zoom = int(zoom)
+        except ValueError:
+            raise ValueError("Invalid zoom. Must be an integer")
+        if not 0 <= zoom <= MAX_ZOOM:
+            raise ValueError(f"Invalid zoom. Must be between 0 and {MAX_ZOOM}")
+
+    return bbox, zoom
@@ -0,0 +1,143 @@
+"""ASGI entry point: `uvicorn flaskr.asgi:application`.
+
+POST /events/parking, the ingestion hot path, is served by asyncio over an
+async connection pool, so a worker keeps accepting events while they wait
+on the database (with EVENTS_WRITE_BEHIND, the Flask route, which answers
+as soon as the event is buffered, serves it instead). GET /areas/capacity/stream (server-sent events) is served
+by asyncio too: an open stream is a queue on the event loop, not a thread.
+Every other route is the Flask app, run in threads.
+"""
+import asyncio
+import json
+import time
+from asgiref.wsgi import WsgiToAsgi
+from flaskr import app
+from flaskr.api.events_routes import parse_event_payload
+from flaskr.services.capacity_feed import capacity_feed
+from flaskr.services.event_buffer import event_buffer
+from flaskr.services.ingestion import async_ingestion
+from flaskr.services.metrics import metrics
+
+PARKING_EVENT_PATH = "/events/parking"
+CAPACITY_STREAM_PATH = "/areas/capacity/stream"
+
+# Same policy as flask_cors on the Flask routes
+CORS_HEADER = (b"access-control-allow-origin", b"*")
+
+# Largest accepted event payload
+MAX_BODY_SIZE = 64 * 1024
+
+
+class Application:
+
+    def __init__(self, flask_app):
+        self.wsgi = WsgiToAsgi(flask_app)
+        async_ingestion.init_app(flask_app)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif (scope["type"] == "http" and scope["method"] == "POST" and scope["path"] == PARKING_EVENT_PATH
+              and not event_buffer.enabled):
+            await self._parking_event(receive, send)
+        elif scope["type"] == "http" and scope["method"] == "GET" and scope["path"] == CAPACITY_STREAM_PATH:
+            await self._capacity_stream(receive, send)
+        else:
+            await self.wsgi(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    await async_ingestion.open()
+                except Exception as e:
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await async_ingestion.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _parking_event(self, receive, send):
+        start = time.perf_counter()
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if len(body) > MAX_BODY_SIZE:
+                status, payload = 413, {"error": "Payload too large"}
+                break
+            if not message.get("more_body"):
+                status, payload = await self._handle(body)
+                break
+
+        total = time.perf_counter() - start
+        metrics.requests.inc("events.parking_event", "POST", status)
+        metrics.latency.observe(total, "events.parking_event", "POST")
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                CORS_HEADER,
+                (b"server-timing", f"total;dur={total * 1000:.2f}".encode())
+            ]
+        })
+        await send({"type": "http.response.body", "body": json.dumps(payload).encode()})
+
+    async def _capacity_stream(self, receive, send):
+        # Server-sent events: a `snapshot` of all capacities, then one
+        # `capacity` event {id, residual_capacity, max_capacity, delta} per
+        # change. Subscribed (and LISTENing) before the snapshot is read so
+        # that no change is missed in between
+        try:
+            subscription = await capacity_feed.subscribe()
+        except TimeoutError as e:
+            await send({"type": "http.response.start", "status": 503,
+                        "headers": [(b"content-type", b"application/json"), CORS_HEADER]})
+            await send({"type": "http.response.body", "body": json.dumps({"error": str(e)}).encode()})
+            return
+        try:
+            snapshot = await async_ingestion.get_capacities()
+        except Exception:
+            capacity_feed.unsubscribe(subscription)
+            raise
+
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/event-stream"),
+                (b"cache-control", b"no-cache"),
+                (b"x-accel-buffering", b"no"),
+                CORS_HEADER
+            ]
+        })
+        disconnect = asyncio.create_task(self._unsubscribe_on_disconnect(receive, subscription))
+        try:
+            async for chunk in capacity_feed.stream(subscription, snapshot):
+                await send({"type": "http.response.body", "body": chunk.encode(), "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            disconnect.cancel()
+
+    @staticmethod
+    async def _unsubscribe_on_disconnect(receive, subscription):
+        while (await receive())["type"] != "http.disconnect":
+            pass
+        capacity_feed.unsubscribe(subscription)
+
+    async def _handle(self, body):
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return 400, {"error": "Invalid JSON payload"}
+        fields, error = parse_event_payload(data)
+        if error:
+            return 400, {"error": error}
+        return await async_ingestion.record_parking_event(fields)
+
+
+application = Application(app)
@@ -0,0 +1,371 @@
+import click
+import json
+import os
+import random
+import tempfile
+import time
+import numpy as np
+from datetime import datetime, timedelta
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import text
+from flaskr.extensions import db
+from flaskr.models.parking_areas import ParkingArea
+from flaskr.bench.endpoints import bench_endpoints
+from flaskr.bench import replay as load_replay
+from flaskr.bench.results import compare_results, load_results, save_results
+from flaskr.bench.synthetic import delete_city, generate_areas, generate_events, generate_users, random_points
+from flaskr.bench.synthetic import write_events_geojson
+from flaskr.bench.timing import summarize, timed
+from flaskr.services.area_stats import area_stats, compute_area_stats
+from flaskr.services.bulk_import import import_parking_events
+from flaskr.services.partitions import ensure_event_partitions
+
+
+@click.command("bench-nearest")
+@click.option("--areas", default=10000, show_default=True, help="Synthetic parking areas to generate.")
+@click.option("--queries", default=1000, show_default=True, help="Number of nearest-area queries.")
+@click.option("--k", default=5, show_default=True)
+@click.option("--min-free", default=1, show_default=True)
+@click.option("--target-ms", default=10.0, show_default=True, help="Expected p99 latency.")
+@with_appcontext
+def bench_nearest_command(areas, queries, k, min_free, target_ms):
+    """Benchmarks the nearest-available-area KNN query.
+
+    The synthetic areas live in a transaction that is rolled back at the end,
+    so the command can run against a development database.
+    """
+    rng = random.Random(42)
+    try:
+        print(f"🌱 Generating {areas} synthetic parking areas...")
+        generate_areas(areas)
+
+        # Warm up the caches and the query plan
+        for lon, lat in random_points(50, rng):
+            ParkingArea.get_nearest(lon, lat, k, min_free)
+
+        latencies = []
+        for lon, lat in random_points(queries, rng):
+            _, elapsed_ms = timed(ParkingArea.get_nearest, lon, lat, k, min_free)
+            latencies.append(elapsed_ms)
+    finally:
+        db.session.rollback()
+
+    summary = summarize(latencies)
+    print(json.dumps(summary, indent=2))
+    if summary["p99_ms"] <= target_ms:
+        print(f"✅ p99 {summary['p99_ms']:.2f} ms <= {target_ms} ms")
+    else:
+        print(f"❌ p99 {summary['p99_ms']:.2f} ms > {target_ms} ms")
+        raise SystemExit(1)
+
+
+
+@click.command("bench-generate-city")
+@click.option("--areas", default=1000, show_default=True, help="Synthetic parking areas.")
+@click.option("--users", default=10000, show_default=True, help="Synthetic users.")
+@click.option("--events", default=100000, show_default=True, help="Synthetic parking events.")
+@click.option("--days", default=90, show_default=True, help="Days of history of the events.")
+@click.option("--seed", default=0.42, show_default=True, help="Seed of the generator, in [-1, 1].")
+@click.option("--reset", is_flag=True, help="Delete the previous synthetic city first.")
+@with_appcontext
+def bench_generate_city_command(areas, users, events, days, seed, reset):
+    """Generates a synthetic city (areas, users, events) for the benchmarks.
+
+    Synthetic rows are named `synthetic-area-*` / `synthetic-user-*` and kept
+    in the database; --reset removes them.
+    """
+    if reset:
+        delete_city()
+        print("🧹 Previous synthetic city deleted.")
+
+    def events_step():
+        now = datetime.utcnow()
+        ensure_event_partitions(now - timedelta(days=days), now)
+        generate_events(events, days, seed)
+
+    steps = [
+        ("areas", areas, lambda: generate_areas(areas, seed)),
+        ("users", users, lambda: generate_users(users)),
+        ("events", events, events_step)
+    ]
+    for label, count, generate in steps:
+        start = time.perf_counter()
+        generate()
+        db.session.commit()
+        elapsed = time.perf_counter() - start
+        print(f"🌱 {count} {label} generated in {elapsed:.1f}s ({count / elapsed:,.0f} rows/s)")
+
+
+@click.command("bench-endpoints")
+@click.option("--requests", "requests_count", default=200, show_default=True, help="Requests per route.")
+@click.option("--concurrency", default=1, show_default=True, help="Concurrent clients.")
+@click.option("--seed", default=42, show_default=True)
+@click.option("--read-only", is_flag=True, help="Only benchmark the GET routes.")
+@click.option("--only", multiple=True, help="Only benchmark the endpoints containing this text (repeatable).")
+@click.option("--output", "-o", default=None, help="JSON file for the results (default: bench-<timestamp>.json).")
+@with_appcontext
+def bench_endpoints_command(requests_count, concurrency, seed, read_only, only, output):
+    """Benchmarks every route of the areas, events and users blueprints
+    against the synthetic city, through the Flask test client."""
+    city = db.session.execute(text("""
+        SELECT (SELECT count(*) FROM parking_areas) AS areas,
+               (SELECT count(*) FROM users) AS users,
+               (SELECT count(*) FROM parking_events) AS events
+    """)).one()._asdict()
+    db.session.rollback()
+
+    def progress(name, summary):
+        print(f"  {name:<50} p50 {summary['p50_ms']:8.2f} ms   p99 {summary['p99_ms']:8.2f} ms   "
+              f"{summary['throughput_rps']:8.1f} req/s   {summary['statuses']}")
+
+    print(f"⏱️  Benchmarking routes ({requests_count} requests, concurrency {concurrency}, city {city})")
+    try:
+        results = bench_endpoints(current_app._get_current_object(), requests_count, concurrency, seed,
+                                  read_only, only, progress)
+    except ValueError as e:
+        print(f"❌ {e}")
+        raise SystemExit(1)
+
+    output = output or f"bench-{datetime.utcnow():%Y%m%dT%H%M%S}.json"
+    save_results(output, results, city=city, requests=requests_count, concurrency=concurrency,
+                 seed=seed, read_only=read_only)
+    print(f"✅ Results saved to {output}")
+
+
+@click.command("bench-compare")
+@click.argument("base", type=click.Path(exists=True, dir_okay=False))
+@click.argument("new", type=click.Path(exists=True, dir_okay=False))
+@click.option("--threshold", default=0.1, show_default=True, help="Tolerated relative regression.")
+def bench_compare_command(base, new, threshold):
+    """Compares two benchmark result files; fails on regressions."""
+    rows = compare_results(load_results(base), load_results(new), threshold)
+    regressions = 0
+    for name, p50_before, p50_after, p99_before, p99_after, rps_before, rps_after, regressed in rows:
+        regressions += regressed
+        mark = "❌" if regressed else "  "
+        rps = f"{rps_before or 0:8.1f} -> {rps_after or 0:8.1f} req/s"
+        print(f"{mark} {name:<50} p50 {p50_before:7.2f} -> {p50_after:7.2f} ms   "
+              f"p99 {p99_before:7.2f} -> {p99_after:7.2f} ms   {rps}")
+
+    if regressions:
+        print(f"❌ {regressions} regression(s) above {threshold:.0%}")
+        raise SystemExit(1)
+    print(f"✅ No regression above {threshold:.0%}")
+
+
+@click.command("bench-replay")
+@click.option("--url", default="http://localhost:5000", show_default=True, help="Base URL of the running app.")
+@click.option("--input", "input_path", default=None, type=click.Path(exists=True, dir_okay=False),
+              help="NDJSON stream of events to replay (default: generated over the synthetic city).")
+@click.option("--profile", type=click.Choice(["constant", "rush"]), default="rush", show_default=True,
+              help="Arrival rate over time (rush: gaussian peak in the middle of the run).")
+@click.option("--rate", default=100.0, show_default=True, help="Peak arrival rate (requests/s).")
+@click.option("--duration", default=60.0, show_default=True, help="Duration of the run (s).")
+@click.option("--parallelism", default=32, show_default=True, help="Concurrent connections.")
+@click.option("--park-ratio", default=0.6, show_default=True, help="Share of park events (generated stream).")
+@click.option("--seed", default=42, show_default=True)
+@click.option("--output", "-o", default=None, help="JSON file for the results.")
+@with_appcontext
+def bench_replay_command(url, input_path, profile, rate, duration, parallelism, park_ratio, seed, output):
+    """Replays park/leave events against a running app at a given arrival
+    rate, then checks every area's capacity against the event log.
+
+    The app must be the only writer of the database during the run.
+    """
+    offsets = load_replay.arrival_offsets(profile, rate, duration)
+    try:
+        if input_path:
+            payloads = load_replay.read_events(input_path)
+        else:
+            payloads = load_replay.generate_events(len(offsets), random.Random(seed), park_ratio)
+    except ValueError as e:
+        print(f"❌ {e}")
+        raise SystemExit(1)
+
+    before, last_event_id = load_replay.capacity_snapshot()
+    count = min(len(payloads), len(offsets))
+    print(f"⏱️  Replaying {count} events against {url} ({profile} profile, peak {rate} req/s, "
+          f"parallelism {parallelism})")
+    summary, accepted = load_replay.replay(url, payloads, offsets, parallelism)
+
+    print(json.dumps(summary, indent=2))
+    mismatches = load_replay.check_consistency(before, last_event_id, accepted)
+    summary["consistency_mismatches"] = mismatches
+    if output:
+        save_results(output, {"replay": summary}, url=url, profile=profile, rate=rate, duration=duration,
+                     parallelism=parallelism, seed=seed, input=input_path)
+        print(f"✅ Results saved to {output}")
+
+    if mismatches:
+        for mismatch in mismatches[:20]:
+            print(f"❌ {mismatch}")
+        print(f"❌ {len(mismatches)} capacity inconsistencies")
+        raise SystemExit(1)
+    print(f"✅ Capacities consistent with the event log ({len(before)} areas)")
+
+
+@click.command("bench-ingest")
+@click.option("--sync-url", default="http://localhost:4000", show_default=True,
+              help="App served by gunicorn (sync workers).")
+@click.option("--async-url", default="http://localhost:4001", show_default=True,
+              help="App served by uvicorn (flaskr.asgi:application).")
+@click.option("--rate", default=500.0, show_default=True, help="Arrival rate (requests/s).")
+@click.option("--duration", default=30.0, show_default=True, help="Duration of each run (s).")
+@click.option("--parallelism", default=64, show_default=True, help="Concurrent connections.")
+@click.option("--seed", default=42, show_default=True)
+@click.option("--output", "-o", default=None, help="JSON file for the results.")
+@with_appcontext
+def bench_ingest_command(sync_url, async_url, rate, duration, parallelism, seed, output):
+    """Compares the sync and async POST /events/parking paths side by side.
+
+    Both servers must run against the same database, with the same number
+    of workers (e.g. `gunicorn -w 1 -b :4000 flaskr:app` and
+    `uvicorn --workers 1 --port 4001 flaskr.asgi:application`). The same
+    event stream is replayed against each at a constant rate, and the
+    capacities are checked against the event log after each run.
+    """
+    offsets = load_replay.arrival_offsets("constant", rate, duration)
+    try:
+        payloads = load_replay.generate_events(len(offsets), random.Random(seed))
+    except ValueError as e:
+        print(f"❌ {e}")
+        raise SystemExit(1)
+
+    results = {}
+    inconsistent = False
+    for name, url in (("sync", sync_url), ("async", async_url)):
+        before, last_event_id = load_replay.capacity_snapshot()
+        print(f"⏱️  {name}: replaying {len(offsets)} events against {url} at {rate} req/s")
+        summary, accepted = load_replay.replay(url, payloads, offsets, parallelism)
+        mismatches = load_replay.check_consistency(before, last_event_id, accepted)
+        summary["consistency_mismatches"] = mismatches
+        inconsistent = inconsistent or bool(mismatches)
+        results[name] = summary
+
+    print(f"{'':>8} {'req/s':>10} {'p50 ms':>10} {'p99 ms':>10} {'service p99':>12}  statuses")
+    for name, summary in results.items():
+        print(f"{name:>8} {summary['throughput_rps']:10.1f} {summary['p50_ms']:10.2f} {summary['p99_ms']:10.2f} "
+              f"{summary['service']['p99_ms']:12.2f}  {summary['statuses']}")
+    if output:
+        save_results(output, results, sync_url=sync_url, async_url=async_url, rate=rate,
+                     duration=duration, parallelism=parallelism, seed=seed)
+        print(f"✅ Results saved to {output}")
+    if inconsistent:
+        print("❌ Capacity inconsistencies found")
+        raise SystemExit(1)
+
+
+@click.command("bench-area-stats")
+@click.option("--events", default=10_000_000, show_default=True, help="Synthetic parking sessions.")
+@click.option("--areas", default=1000, show_default=True, help="Synthetic parking areas.")
+@click.option("--days", default=90, show_default=True, help="Days of history of the sessions.")
+@click.option("--runs", default=5, show_default=True, help="Timed computations.")
+@click.option("--seed", default=42, show_default=True)
+@click.option("--database", is_flag=True, help="Also time the full computation (loading included) "
+                                              "over the events of the database.")
+@click.option("--target-ms", default=5000.0, show_default=True, help="Expected p50 of the in-memory computation.")
+@with_appcontext
+def bench_area_stats_command(events, areas, days, runs, seed, database, target_ms):
+    """Benchmarks the vectorized per-area statistics (/areas/stats).
+
+    The statistics of synthetic sessions held in memory are timed, and those
+    of a few areas checked against np.percentile/np.bincount computed area
+    by area.
+    """
+    rng = np.random.default_rng(seed)
+    area_ids = np.arange(1, areas + 1)
+    capacities = rng.integers(5, 100, areas)
+    # Skewed popularity, rush hour arrivals, log-normal dwell times, 5% still open
+    session_areas = rng.zipf(1.3, events) % areas + 1
+    starts = (rng.integers(0, days, events) * 86400 + rng.normal(9 * 3600, 3 * 3600, events) % 86400
+              + 1.7e9)
+    ends = starts + rng.lognormal(8, 1, events)
+    ends[rng.random(events) < 0.05] = np.nan
+
+    print(f"⏱️  Computing the statistics of {events:,} sessions over {areas} areas ({runs} runs)")
+    latencies = []
+    for _ in range(runs):
+        stats, elapsed_ms = timed(compute_area_stats, area_ids, capacities, session_areas, starts, ends, days)
+        latencies.append(elapsed_ms)
+    summary = {"in_memory": summarize(latencies)}
+
+    for row in stats[:3]:
+        area = session_areas == row["parking_area_id"]
+        closed = area & ~np.isnan(ends)
+        dwell = ends[closed] - starts[closed]
+        expected = (float(np.median(dwell)), float(np.percentile(dwell, 90)),
+                    int(np.bincount((starts[area] // 3600 % 24).astype(np.int64), minlength=24).argmax()))
+        actual = (row["dwell_median_seconds"], row["dwell_p90_seconds"], row["peak_arrival_hour"])
+        if not np.allclose(actual, expected):
+            print(f"❌ Area {row['parking_area_id']}: {actual} != {expected}")
+            raise SystemExit(1)
+
+    if database:
+        latencies = []
+        for _ in range(runs):
+            _, elapsed_ms = timed(area_stats.compute, days)
+            db.session.rollback()
+            latencies.append(elapsed_ms)
+        summary["database"] = summarize(latencies)
+
+    print(json.dumps(summary, indent=2))
+    p50 = summary["in_memory"]["p50_ms"]
+    if p50 <= target_ms:
+        print(f"✅ p50 {p50:.0f} ms <= {target_ms:.0f} ms")
+    else:
+        print(f"❌ p50 {p50:.0f} ms > {target_ms:.0f} ms")
+        raise SystemExit(1)
+
+
+@click.command("bench-import")
+@click.option("--events", default=1_000_000, show_default=True, help="Parking events in the generated file.")
+@click.option("--days", default=90, show_default=True, help="Days of history of the events.")
+@click.option("--duplicates", default=0.05, show_default=True, help="Share of features repeating an earlier one.")
+@click.option("--seed", default=42, show_default=True)
+@click.option("--target-s", default=60.0, show_default=True, help="Expected duration of the first import.")
+@with_appcontext
+def bench_import_command(events, days, duplicates, seed, target_s):
+    """Benchmarks `flask import-events` on a generated GeoJSON file.
+
+    The events reference the synthetic city (see bench-generate-city). The
+    file is imported once, then a second time to time the deduplication of
+    an already imported file, in the same transaction. Both imports are
+    rolled back at the end.
+    """
+    areas = db.session.execute(text("""
+        SELECT id, ST_X(p), ST_Y(p)
+        FROM (SELECT id, ST_PointOnSurface(location_area) AS p FROM parking_areas
+              WHERE name LIKE 'synthetic-area-%') s
+    """)).all()
+    user_ids = db.session.execute(text("SELECT id FROM users WHERE username LIKE 'synthetic-user-%'")).scalars().all()
+    db.session.rollback()
+    if not areas or not user_ids:
+        print("❌ No synthetic city: run `flask bench-generate-city` first")
+        raise SystemExit(1)
+
+    fd, path = tempfile.mkstemp(suffix=".geojson")
+    try:
+        with os.fdopen(fd, "w") as f:
+            write_events_geojson(f, events, [tuple(area) for area in areas], user_ids, datetime.utcnow(),
+                                 random.Random(seed), days, duplicates)
+        print(f"🌱 {events:,} events written to {path} ({os.path.getsize(path) / 2 ** 20:.0f} MiB)")
+
+        results = []
+        try:
+            for label in ("first import", "reimport"):
+                with open(path) as f:
+                    result = import_parking_events(f)
+                results.append(result)
+                print(f"⏱️  {label}: {result}")
+        finally:
+            db.session.rollback()
+    finally:
+        os.remove(path)
+
+    elapsed = results[0].elapsed
+    if elapsed <= target_s:
+        print(f"✅ {elapsed:.1f}s <= {target_s:.0f}s")
+    else:
+        print(f"❌ {elapsed:.1f}s > {target_s:.0f}s")
+        raise SystemExit(1)
@@ -0,0 +1,184 @@
+import math
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import url_for
+from sqlalchemy import text
+from flaskr.extensions import db
+from flaskr.bench.timing import summarize
+
+# Blueprints whose routes are benchmarked
+BLUEPRINTS = ("areas", "events", "users", "tiles", "sessions")
+
+# Endless responses (server-sent events) and full table exports
+SKIPPED_ENDPOINTS = {"areas.stream_areas_capacity", "events.export_events"}
+
+# Size of the listing pages requested from the events routes
+PAGE_LIMIT = 100
+
+BATCH_SIZE = 50
+
+# Zoom of the requested vector tiles (street level)
+TILE_ZOOM = 15
+
+
+class BenchContext:
+    """Sample of the synthetic city the request parameters are drawn from."""
+
+    def __init__(self, rng, area_prefix="synthetic-area", user_prefix="synthetic-user", sample_size=1000):
+        self.rng = rng
+        self.user_prefix = user_prefix
+        self.signups = 0
+        params = {"area_prefix": area_prefix, "user_prefix": user_prefix, "size": sample_size}
+        self.areas = db.session.execute(text("""
+            SELECT id, name, ST_X(ST_PointOnSurface(location_area)) AS lon,
+                   ST_Y(ST_PointOnSurface(location_area)) AS lat
+            FROM parking_areas WHERE name LIKE :area_prefix || '-%'
+            ORDER BY id LIMIT :size
+        """), params).all()
+        self.user_ids = db.session.execute(text("""
+            SELECT id FROM users WHERE username LIKE :user_prefix || '-%'
+            ORDER BY id LIMIT :size
+        """), params).scalars().all()
+        self.event_ids = db.session.execute(text("""
+            SELECT id FROM parking_events TABLESAMPLE SYSTEM (1) REPEATABLE (42) LIMIT :size
+        """), {"size": sample_size}).scalars().all() or [1]
+        db.session.rollback()
+        if not self.areas or not self.user_ids:
+            raise ValueError("No synthetic city found: run `flask bench-generate-city` first")
+
+    def url_values(self, arguments):
+        """Returns the values of the URL rule arguments."""
+        values = {}
+        if "z" in arguments:
+            # A tile over some area rather than unrelated z, x and y
+            area = self.rng.choice(self.areas)
+            values["z"] = TILE_ZOOM
+            values["x"], values["y"] = _tile_xy(area.lon, area.lat, TILE_ZOOM)
+        for argument in arguments:
+            if argument not in values:
+                values[argument] = self.pick(argument)
+        return values
+
+    def pick(self, argument):
+        """Returns a value for a URL rule argument."""
+        if argument == "area_id":
+            return self.rng.choice(self.areas).id
+        if argument == "name":
+            return self.rng.choice(self.areas).name
+        if argument == "user_id":
+            return self.rng.choice(self.user_ids)
+        if argument == "event_id":
+            return self.rng.choice(self.event_ids)
+        if argument == "event_type":
+            return self.rng.choice(["park", "leave"])
+        raise ValueError(f"No value for URL argument '{argument}'")
+
+    def event_payload(self):
+        area = self.rng.choice(self.areas)
+        return {
+            "user_id": self.rng.choice(self.user_ids),
+            "longitude": area.lon,
+            "latitude": area.lat,
+            "type": self.rng.choice(["park", "leave"])
+        }
+
+    def signup_payload(self):
+        self.signups += 1
+        return {"username": f"{self.user_prefix}-signup-{time.time_ns()}-{self.signups}"}
+
+
+def _tile_xy(longitude, latitude, zoom):
+    n = 2 ** zoom
+    lat = math.radians(latitude)
+    x = int((longitude + 180) / 360 * n)
+    y = int((1 - math.asinh(math.tan(lat)) / math.pi) / 2 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+# Request arguments (query string, JSON body) of the routes needing some
+def _request_kwargs(endpoint, method, ctx):
+    if endpoint == "areas.get_nearest_areas":
+        area = ctx.rng.choice(ctx.areas)
+        return {"query_string": {"lon": area.lon, "lat": area.lat}}
+    if endpoint == "events.parking_event":
+        return {"json": ctx.event_payload()}
+    if endpoint == "events.parking_events_batch":
+        return {"json": {"events": [ctx.event_payload() for _ in range(BATCH_SIZE)]}}
+    if endpoint == "users.user_signup":
+        return {"json": ctx.signup_payload()}
+    if endpoint.startswith("events.") and method == "GET":
+        return {"query_string": {"limit": PAGE_LIMIT}}
+    return {}
+
+
+def list_endpoints(app, read_only=False, only=None):
+    """Returns the (endpoint, method, rule) of the benchmarked routes."""
+    endpoints = []
+    for rule in sorted(app.url_map.iter_rules(), key=lambda r: r.endpoint):
+        if rule.endpoint.split(".")[0] not in BLUEPRINTS or rule.endpoint in SKIPPED_ENDPOINTS:
+            continue
+        if only and not any(pattern in rule.endpoint for pattern in only):
+            continue
+        for method in sorted(rule.methods - {"HEAD", "OPTIONS"}):
+            if read_only and method != "GET":
+                continue
+            endpoints.append((rule.endpoint, method, rule))
+    return endpoints
+
+
+def _send(client, method, path, kwargs):
+    start = time.perf_counter()
+    response = client.open(path, method=method, **kwargs)
+    # Consume streamed bodies
+    response.get_data()
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    response.close()
+    return response.status_code, elapsed_ms
+
+
+def bench_endpoint(app, ctx, endpoint, method, rule, requests, concurrency=1, warmup=5):
+    """Sends `requests` requests to a route through the test client, from
+    `concurrency` threads, and returns the latency/throughput summary with
+    the response status counts.
+
+    Requests are drawn upfront from the (seeded) context, so that runs are
+    reproducible.
+    """
+    prepared = []
+    with app.test_request_context():
+        for _ in range(warmup + requests):
+            path = url_for(endpoint, **ctx.url_values(rule.arguments))
+            prepared.append((path, _request_kwargs(endpoint, method, ctx)))
+
+    client = app.test_client()
+    for path, kwargs in prepared[:warmup]:
+        _send(client, method, path, kwargs)
+
+    measured = prepared[warmup:]
+    start = time.perf_counter()
+    if concurrency == 1:
+        results = [_send(client, method, path, kwargs) for path, kwargs in measured]
+    else:
+        with ThreadPoolExecutor(concurrency) as executor:
+            results = list(executor.map(lambda item: _send(client, method, *item), measured))
+    elapsed_s = time.perf_counter() - start
+
+    statuses = {}
+    for status, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    summary = summarize([elapsed_ms for _, elapsed_ms in results], elapsed_s)
+    summary.update({"method": method, "rule": rule.rule, "statuses": statuses})
+    return summary
+
+
+def bench_endpoints(app, requests=200, concurrency=1, seed=42, read_only=False, only=None, progress=None):
+    """Benchmarks every route of the blueprints; returns {name: summary}."""
+    ctx = BenchContext(random.Random(seed))
+    results = {}
+    for endpoint, method, rule in list_endpoints(app, read_only, only):
+        name = f"{method} {endpoint}"
+        results[name] = bench_endpoint(app, ctx, endpoint, method, rule, requests, concurrency)
+        if progress:
+            progress(name, results[name])
+    return results
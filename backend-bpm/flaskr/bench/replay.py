@@ -0,0 +1,210 @@
+import json
+import math
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import text
+from flaskr.extensions import db
+from flaskr.bench.timing import summarize
+
+
+# ----------------------------------------------------------------------
+#                           EVENT STREAMS
+# ----------------------------------------------------------------------
+def read_events(path):
+    """Reads a recorded stream of events: NDJSON lines either in the
+    POST /events/parking payload shape or as listed by
+    GET /events/?format=ndjson."""
+    payloads = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            event = json.loads(line)
+            if "location_point" in event:
+                longitude, latitude = event["location_point"]["coordinates"][:2]
+                event = {"user_id": event["user_id"], "longitude": longitude,
+                         "latitude": latitude, "type": event["type"]}
+            payloads.append(event)
+    return payloads
+
+
+def generate_events(count, rng, park_ratio=0.6, area_prefix="synthetic-area", user_prefix="synthetic-user"):
+    """Generates `count` park/leave payloads located in the synthetic areas."""
+    areas = db.session.execute(text("""
+        SELECT ST_X(ST_PointOnSurface(location_area)) AS lon, ST_Y(ST_PointOnSurface(location_area)) AS lat
+        FROM parking_areas WHERE name LIKE :prefix || '-%' ORDER BY id
+    """), {"prefix": area_prefix}).all()
+    user_ids = db.session.execute(text(
+        "SELECT id FROM users WHERE username LIKE :prefix || '-%' ORDER BY id"
+    ), {"prefix": user_prefix}).scalars().all()
+    db.session.rollback()
+    if not areas or not user_ids:
+        raise ValueError("No synthetic city found: run `flask bench-generate-city` first")
+
+    payloads = []
+    for _ in range(count):
+        area = rng.choice(areas)
+        payloads.append({
+            "user_id": rng.choice(user_ids),
+            "longitude": area.lon,
+            "latitude": area.lat,
+            "type": "park" if rng.random() < park_ratio else "leave"
+        })
+    return payloads
+
+
+# ----------------------------------------------------------------------
+#                           ARRIVAL SCHEDULES
+# ----------------------------------------------------------------------
+def arrival_offsets(profile, rate, duration, base_ratio=0.1):
+    """Returns the send times (seconds from the start) of the requests.
+
+    - "constant": `rate` requests per second during `duration` seconds;
+    - "rush": a morning rush, the rate rising from `base_ratio * rate` to a
+      peak of `rate` in the middle of the run and falling back (gaussian).
+    """
+    if profile == "constant":
+        return [i / rate for i in range(int(rate * duration))]
+    if profile != "rush":
+        raise ValueError(f"Unknown profile '{profile}'")
+
+    middle = duration / 2
+    width = duration / 6
+    offsets = []
+    t = 0.0
+    while t < duration:
+        offsets.append(t)
+        current = rate * (base_ratio + (1 - base_ratio) * math.exp(-((t - middle) / width) ** 2 / 2))
+        t += 1 / current
+    return offsets
+
+
+# ----------------------------------------------------------------------
+#                           REPLAY
+# ----------------------------------------------------------------------
+def _post(url, payload, timeout):
+    request = urllib.request.Request(url, data=json.dumps(payload).encode(), method="POST",
+                                     headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status, json.loads(response.read() or b"null")
+    except urllib.error.HTTPError as e:
+        return e.code, None
+    except (urllib.error.URLError, TimeoutError, ConnectionError):
+        return 0, None
+
+
+def replay(base_url, payloads, offsets, parallelism=16, timeout=10.0):
+    """Sends the payloads to POST /events/parking at the scheduled offsets
+    (open loop: late requests are not dropped nor rescheduled).
+
+    Latencies are measured from the scheduled send time, so that queueing
+    behind a saturated server counts; the service time is reported apart.
+    Returns the summary and the accepted events per area.
+    """
+    url = base_url.rstrip("/") + "/events/parking"
+    latencies = []
+    service_times = []
+    statuses = {}
+    accepted = {}
+    lock = threading.Lock()
+
+    def send(payload, scheduled):
+        sent = time.perf_counter()
+        status, body = _post(url, payload, timeout)
+        done = time.perf_counter()
+        with lock:
+            latencies.append((done - scheduled) * 1000)
+            service_times.append((done - sent) * 1000)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+            # 202: accepted by the write-behind buffer, inserted shortly after
+            if status in (201, 202):
+                area_id = body["event"]["parking_area_id"]
+                parks, leaves = accepted.get(area_id, (0, 0))
+                if payload["type"] == "park":
+                    accepted[area_id] = (parks + 1, leaves)
+                else:
+                    accepted[area_id] = (parks, leaves + 1)
+
+    max_lag = 0.0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(parallelism) as executor:
+        for payload, offset in zip(payloads, offsets):
+            scheduled = start + offset
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                max_lag = max(max_lag, -delay)
+            executor.submit(send, payload, scheduled)
+    elapsed = time.perf_counter() - start
+
+    summary = summarize(latencies, elapsed)
+    summary["service"] = summarize(service_times)
+    summary["statuses"] = statuses
+    sent = min(len(payloads), len(offsets))
+    summary["offered_rps"] = (sent - 1) / offsets[sent - 1] if sent > 1 else None
+    summary["max_dispatch_lag_ms"] = max_lag * 1000
+    return summary, accepted
+
+
+# ----------------------------------------------------------------------
+#                           CONSISTENCY
+# ----------------------------------------------------------------------
+def _wait_for_events(last_event_id, count, timeout):
+    deadline = time.monotonic() + timeout
+    while True:
+        logged = db.session.execute(text("SELECT count(*) FROM parking_events WHERE id > :last_event_id"),
+                                    {"last_event_id": last_event_id}).scalar()
+        db.session.rollback()
+        if logged >= count or time.monotonic() >= deadline:
+            return
+        time.sleep(0.1)
+
+
+def capacity_snapshot():
+    """Returns ({area id: residual capacity}, last event id) before a replay."""
+    residual = dict(db.session.execute(text("SELECT id, residual_capacity FROM parking_areas")).all())
+    last_event_id = db.session.execute(text("SELECT COALESCE(max(id), 0) FROM parking_events")).scalar()
+    db.session.rollback()
+    return residual, last_event_id
+
+
+def check_consistency(before, last_event_id, accepted, drain_timeout=30.0):
+    """Checks every area after a replay (the replay being the only writer).
+
+    The residual capacity must equal the initial one minus the park events
+    plus the leave events logged since the replay started, stay within
+    [0, max_capacity], and the logged events must match the ones the
+    clients saw accepted. Events accepted by the write-behind buffer are
+    waited for, up to drain_timeout seconds. Returns the list of mismatches.
+    """
+    _wait_for_events(last_event_id, sum(parks + leaves for parks, leaves in accepted.values()), drain_timeout)
+    rows = db.session.execute(text("""
+        SELECT a.id, a.residual_capacity, a.max_capacity,
+               count(e.id) FILTER (WHERE e.type = 'PARK') AS parks,
+               count(e.id) FILTER (WHERE e.type = 'LEAVE') AS leaves
+        FROM parking_areas a
+        LEFT JOIN parking_events e ON e.parking_area_id = a.id AND e.id > :last_event_id
+        GROUP BY a.id
+    """), {"last_event_id": last_event_id}).all()
+    db.session.rollback()
+
+    mismatches = []
+    for row in rows:
+        if row.id not in before:
+            continue
+        expected = before[row.id] - row.parks + row.leaves
+        if row.residual_capacity != expected:
+            mismatches.append({"area_id": row.id, "problem": "residual capacity differs from the event log",
+                               "residual_capacity": row.residual_capacity, "expected": expected})
+        if not 0 <= row.residual_capacity <= row.max_capacity:
+            mismatches.append({"area_id": row.id, "problem": "residual capacity out of bounds",
+                               "residual_capacity": row.residual_capacity, "max_capacity": row.max_capacity})
+        if (row.parks, row.leaves) != accepted.get(row.id, (0, 0)):
+            mismatches.append({"area_id": row.id, "problem": "logged events differ from the accepted ones",
+                               "logged": [row.parks, row.leaves], "accepted": list(accepted.get(row.id, (0, 0)))})
+    return mismatches
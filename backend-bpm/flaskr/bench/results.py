@@ -0,0 +1,57 @@
+import json
+import platform
+import subprocess
+from datetime import datetime, timezone
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(path, results, **meta):
+    """Writes a benchmark run (results and the conditions of the run) as JSON."""
+    document = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            **meta
+        },
+        "results": results
+    }
+    with open(path, "w") as f:
+        json.dump(document, f, indent=2)
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare_results(base, new, threshold=0.1):
+    """Compares two runs, benchmark by benchmark.
+
+    Returns rows of (name, base p50, new p50, base p99, new p99, base rps,
+    new rps, regressed). A benchmark regressed if its p99 latency grew, or
+    its throughput dropped, by more than `threshold` (relative).
+    """
+    rows = []
+    for name, before in base["results"].items():
+        after = new["results"].get(name)
+        if after is None:
+            continue
+        regressed = after["p99_ms"] > before["p99_ms"] * (1 + threshold)
+        if before.get("throughput_rps") and after.get("throughput_rps"):
+            regressed = regressed or after["throughput_rps"] < before["throughput_rps"] * (1 - threshold)
+        rows.append((
+            name,
+            before["p50_ms"], after["p50_ms"],
+            before["p99_ms"], after["p99_ms"],
+            before.get("throughput_rps"), after.get("throughput_rps"),
+            regressed
+        ))
+    return rows
@@ -0,0 +1,128 @@
+import json
+from datetime import timedelta
+from sqlalchemy import text
+from flaskr.extensions import db
+
+# Synthetic cities are laid out around this point (Bologna)
+CITY_CENTER = (11.3426, 44.4949)
+
+
+def generate_areas(count, seed=0.42, center=CITY_CENTER, span_deg=0.2, name_prefix="synthetic-area"):
+    """Inserts `count` small square parking areas scattered around `center`.
+
+    Rows are generated by PostGIS in one statement (random capacities and
+    occupancy, reproducible through `seed`). Does not commit.
+    """
+    db.session.execute(text("SELECT setseed(:seed)"), {"seed": seed})
+    db.session.execute(text("""
+        INSERT INTO parking_areas (name, location_area, max_capacity, residual_capacity)
+        SELECT :prefix || '-' || i,
+               ST_Expand(ST_SetSRID(ST_MakePoint(lon, lat), 4326), 0.0001),
+               capacity,
+               floor(random() * (capacity + 1))::int
+        FROM (
+            SELECT i,
+                   :lon + (random() - 0.5) * :span AS lon,
+                   :lat + (random() - 0.5) * :span AS lat,
+                   (10 + floor(random() * 40))::int AS capacity
+            FROM generate_series(1, :count) AS i
+        ) s
+    """), {"prefix": name_prefix, "lon": center[0], "lat": center[1], "span": span_deg, "count": count})
+    db.session.execute(text("ANALYZE parking_areas"))
+
+
+def random_points(count, rng, center=CITY_CENTER, span_deg=0.2):
+    """Returns `count` random (longitude, latitude) points around `center`."""
+    return [
+        (center[0] + (rng.random() - 0.5) * span_deg, center[1] + (rng.random() - 0.5) * span_deg)
+        for _ in range(count)
+    ]
+
+
+def generate_users(count, name_prefix="synthetic-user"):
+    """Inserts `count` users named `<prefix>-<i>` (existing ones are kept).
+    Does not commit."""
+    db.session.execute(text("""
+        INSERT INTO users (username, created_at)
+        SELECT :prefix || '-' || i, CURRENT_DATE
+        FROM generate_series(1, :count) AS i
+        ON CONFLICT (username) DO NOTHING
+    """), {"prefix": name_prefix, "count": count})
+    db.session.execute(text("ANALYZE users"))
+
+
+def generate_events(count, days=90, seed=0.42, area_prefix="synthetic-area", user_prefix="synthetic-user"):
+    """Inserts `count` parking events of the synthetic users in the synthetic
+    areas, over the last `days` days.
+
+    Parkings last from 10 minutes to 8 hours; about 2% of them are still open.
+    The monthly partitions of the range must exist. Does not commit.
+    """
+    db.session.execute(text("SELECT setseed(:seed)"), {"seed": seed})
+    db.session.execute(text("""
+        WITH areas AS (
+            SELECT array_agg(id ORDER BY id) AS ids FROM parking_areas WHERE name LIKE :area_prefix || '-%'
+        ), users AS (
+            SELECT array_agg(id ORDER BY id) AS ids FROM users WHERE username LIKE :user_prefix || '-%'
+        )
+        INSERT INTO parking_events (type, location_point, user_id, parking_area_id, start_time, end_time)
+        SELECT 'PARK', ST_PointOnSurface(pa.location_area), s.user_id, s.area_id, s.start_time,
+               CASE WHEN s.open THEN NULL
+                    ELSE s.start_time + interval '10 minutes' + s.duration * interval '470 minutes' END
+        FROM (
+            SELECT users.ids[1 + floor(random() * cardinality(users.ids))::int] AS user_id,
+                   areas.ids[1 + floor(random() * cardinality(areas.ids))::int] AS area_id,
+                   (now() AT TIME ZONE 'UTC') - random() * :days * interval '1 day' AS start_time,
+                   random() AS duration,
+                   random() < 0.02 AS open
+            FROM generate_series(1, :count), areas, users
+        ) s
+        JOIN parking_areas pa ON pa.id = s.area_id
+        ON CONFLICT (user_id, parking_area_id, type, start_time) DO NOTHING
+    """), {"area_prefix": area_prefix, "user_prefix": user_prefix, "days": days, "count": count})
+    db.session.execute(text("ANALYZE parking_events"))
+
+
+def write_events_geojson(fp, count, areas, user_ids, end, rng, days=90, duplicate_ratio=0.05):
+    """Writes `count` parking events as a GeoJSON FeatureCollection, in the
+    format read by `flask import-events`.
+
+    `areas` are (area id, longitude, latitude) tuples; the events start
+    within the `days` days before `end` and last from 10 minutes to 8 hours.
+    About `duplicate_ratio` of the features repeat an earlier one, as in a
+    file exported twice. One feature at a time is held in memory.
+    """
+    fp.write('{"type": "FeatureCollection", "features": [\n')
+    feature = None
+    for i in range(count):
+        if feature is None or rng.random() >= duplicate_ratio:
+            area_id, lon, lat = rng.choice(areas)
+            start_time = end - timedelta(seconds=rng.random() * days * 86400)
+            feature = {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [lon, lat]},
+                "properties": {
+                    "type": "park",
+                    "user_id": rng.choice(user_ids),
+                    "parking_area_id": area_id,
+                    "start_time": start_time.isoformat(),
+                    "end_time": (start_time + timedelta(minutes=10 + rng.random() * 470)).isoformat()
+                }
+            }
+        if i:
+            fp.write(",\n")
+        json.dump(feature, fp)
+    fp.write("\n]}\n")
+
+
+def delete_city(area_prefix="synthetic-area", user_prefix="synthetic-user"):
+    """Deletes the synthetic areas and users along with their events.
+    Does not commit."""
+    params = {"area_prefix": area_prefix, "user_prefix": user_prefix}
+    db.session.execute(text("""
+        DELETE FROM parking_events
+        WHERE parking_area_id IN (SELECT id FROM parking_areas WHERE name LIKE :area_prefix || '-%')
+           OR user_id IN (SELECT id FROM users WHERE username LIKE :user_prefix || '-%')
+    """), params)
+    db.session.execute(text("DELETE FROM parking_areas WHERE name LIKE :area_prefix || '-%'"), params)
+    db.session.execute(text("DELETE FROM users WHERE username LIKE :user_prefix || '-%'"), params)
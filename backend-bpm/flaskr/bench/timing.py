@@ -0,0 +1,34 @@
+import math
+import time
+
+
+def percentile(sorted_samples, q):
+    """Nearest-rank percentile (q in [0, 100]) of already sorted samples."""
+    if not sorted_samples:
+        return None
+    rank = max(1, math.ceil(q / 100 * len(sorted_samples)))
+    return sorted_samples[rank - 1]
+
+
+def summarize(latencies_ms, elapsed_s=None):
+    """Returns the latency distribution (ms) and, given the wall clock time
+    of the run, the achieved throughput."""
+    samples = sorted(latencies_ms)
+    summary = {
+        "count": len(samples),
+        "mean_ms": sum(samples) / len(samples) if samples else None,
+        "p50_ms": percentile(samples, 50),
+        "p90_ms": percentile(samples, 90),
+        "p99_ms": percentile(samples, 99),
+        "max_ms": samples[-1] if samples else None
+    }
+    if elapsed_s:
+        summary["throughput_rps"] = len(samples) / elapsed_s
+    return summary
+
+
+def timed(fn, *args, **kwargs):
+    """Calls fn and returns (result, elapsed milliseconds)."""
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - start) * 1000
@@ -1,15 +1,16 @@
 import click
-import json
 import os
 from flask import current_app
 from flask.cli import with_appcontext
 from flaskr.extensions import db
-from flaskr.models.users import User
-from flaskr.models.parking_areas import ParkingArea 
-from flaskr.models.events import ParkingEvent, EventType 
-from datetime import datetime
-from shapely.geometry import shape  # Required to parse GeoJSON geometry
-from geoalchemy2.elements import WKTElement
+from flaskr.models.capacity_summary import CapacitySummary
+from flaskr.models.events import parse_timestamp
+from flaskr.models.parking_areas import ParkingAreaSimplified
+from flaskr.services.bulk_import import import_users, import_parking_areas, import_parking_events
+from flaskr.services.columnar_export import FORMATS as EXPORT_FORMATS, export_events
+from flaskr.services.occupancy import refresh_occupancy_rollups
+from flaskr.services.partitions import ensure_event_partitions
+from datetime import datetime, timedelta
 
 @click.command("seed-db")
 @with_appcontext
@@ -21,200 +22,157 @@ def seed_db_command():
     seed_parking_events()
 
 
-def seed_users():
-    """Logic to seed users."""
-    json_path = os.path.join(current_app.root_path, 'seeds', 'users_data.json')
+@click.command("check-capacity-summary")
+@click.option("--repair", is_flag=True, help="Rebuild the summary from the parking areas if inconsistent.")
+@with_appcontext
+def check_capacity_summary_command(repair):
+    """Checks the maintained capacity summary against the parking areas table."""
 
-    if not os.path.exists(json_path):
-        print(f"⚠️  Users seed file not found at: {json_path}")
+    mismatches = CapacitySummary.check()
+    if not mismatches:
+        print("✅ Capacity summary is consistent.")
         return
 
-    print(f"🌱 Seeding Users from {json_path}...")
+    for key, (stored, actual) in mismatches.items():
+        print(f"❌ {key}: stored {stored}, actual {actual}")
 
-    try:
-        with open(json_path, 'r') as f:
-            users_data = json.load(f)
-    except Exception as e:
-        print(f"❌ Error reading Users JSON: {e}")
-        return
+    if repair:
+        CapacitySummary.rebuild()
+        db.session.commit()
+        print("🔧 Capacity summary rebuilt.")
+    else:
+        raise SystemExit(1)
 
-    added_count = 0
-    skipped_count = 0
 
-    for user_json in users_data:
-        username = user_json.get('username')
-        created_at_str = user_json.get('created_at')
+@click.command("refresh-occupancy")
+@with_appcontext
+def refresh_occupancy_command():
+    """Folds the new parking events into the hourly occupancy rollups."""
 
-        if User.query.filter_by(username=username).first():
-            skipped_count += 1
-            continue
+    if not refresh_occupancy_rollups():
+        print("⚠️  Another refresh is running, skipped.")
+        return
+    db.session.commit()
+    print("✅ Occupancy rollups refreshed.")
 
-        try:
-            dt_object = datetime.fromisoformat(created_at_str.replace("Z", "+00:00"))
-            date_only = dt_object.date()
-        except ValueError:
-            print(f"❌ Date format error for user {username}")
-            continue
 
-        new_user = User(username=username, created_at=date_only)
-        db.session.add(new_user)
-        added_count += 1
+@click.command("rebuild-simplified-areas")
+@with_appcontext
+def rebuild_simplified_areas_command():
+    """Recomputes the simplified area polygons (after editing the zoom levels)."""
 
-    try:
-        db.session.commit()
-        print(f"✅ Users Seeding: {added_count} added, {skipped_count} skipped.")
-    except Exception as e:
-        db.session.rollback()
-        print(f"❌ Database error (Users): {e}")
+    ParkingAreaSimplified.rebuild()
+    db.session.commit()
+    print("✅ Simplified parking areas rebuilt.")
 
 
-def seed_parking_areas():
-    """Logic to seed Parking Areas from GeoJSON."""
-    # 1. Path to your new geojson file
-    json_path = os.path.join(current_app.root_path, 'seeds', 'parkingAreas_data.geojson')
+@click.command("create-event-partitions")
+@click.option("--months-ahead", default=3, show_default=True, help="Months to create after the current one.")
+@click.option("--since", default=None, metavar="YYYY-MM", help="First month to create (default: current month).")
+@with_appcontext
+def create_event_partitions_command(months_ahead, since):
+    """Creates the missing monthly partitions of the parking events table."""
 
-    if not os.path.exists(json_path):
-        print(f"⚠️  Parking seed file not found at: {json_path}")
-        return
+    today = datetime.utcnow().date()
+    try:
+        first_month = datetime.strptime(since, "%Y-%m").date() if since else today
+    except ValueError:
+        print(f"❌ Invalid month: {since} (expected YYYY-MM)")
+        raise SystemExit(1)
 
-    print(f"🌱 Seeding Parking Areas from {json_path}...")
+    last_month = today.replace(day=1)
+    for _ in range(months_ahead):
+        last_month = (last_month + timedelta(days=32)).replace(day=1)
 
-    try:
-        with open(json_path, 'r') as f:
-            geojson_data = json.load(f)
-    except Exception as e:
-        print(f"❌ Error reading Parking GeoJSON: {e}")
-        return
+    created = ensure_event_partitions(first_month, last_month)
+    db.session.commit()
+    if created:
+        print(f"✅ Created partitions: {', '.join(created)}")
+    else:
+        print("✅ Partitions already exist.")
 
-    added_count = 0
-    skipped_count = 0
 
-    # 2. Iterate over GeoJSON Features
-    features = geojson_data.get('features', [])
-    
-    for feature in features:
-        props = feature.get('properties', {})
-        geometry = feature.get('geometry')
-        
-        area_id = props.get('id')
-        name = props.get('name')
-        max_cap = props.get('max_capacity')
-        res_cap = props.get('residual_capacity')
-
-        # Idempotency Check: Skip if name exists
-        if ParkingArea.query.filter_by(name=name).first():
-            skipped_count += 1
-            continue
-
-        # 3. Convert GeoJSON Geometry to WKT (Well Known Text)
-        # Shapely's 'shape' function takes a GeoJSON dict and makes a Python object
-        try:
-            shapely_geom = shape(geometry)
-            # Convert to WKT format that PostGIS/GeoAlchemy accepts easily
-            wkt_geom = WKTElement(shapely_geom.wkt, srid=4326)
-        except Exception as e:
-            print(f"❌ Geometry error for {name}: {e}")
-            continue
-
-        # 4. Create Model Instance
-        new_area = ParkingArea(
-            name=name,
-            location_area=wkt_geom,
-            max_capacity=max_cap,
-            residual_capacity=res_cap
-        )
-
-        db.session.add(new_area)
-        added_count += 1
+@click.command("import-areas")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@with_appcontext
+def import_areas_command(path):
+    """Imports a GeoJSON FeatureCollection of parking areas."""
+    run_import(import_parking_areas, path)
+
 
+@click.command("import-events")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@with_appcontext
+def import_events_command(path):
+    """Imports a GeoJSON FeatureCollection of parking events."""
+    run_import(import_parking_events, path)
+
+
+@click.command("export-events")
+@click.argument("path", type=click.Path(dir_okay=False, writable=True))
+@click.option("--format", "fmt", type=click.Choice(EXPORT_FORMATS), default="parquet", show_default=True,
+              help="Parquet, or Arrow IPC file.")
+@click.option("--from", "start", default=None, metavar="TIMESTAMP", help="Oldest start time (ISO 8601).")
+@click.option("--to", "end", default=None, metavar="TIMESTAMP", help="Start time upper bound (ISO 8601, excluded).")
+@click.option("--batch-size", default=None, type=int, help="Rows per batch (default: EXPORT_BATCH_SIZE).")
+@with_appcontext
+def export_events_command(path, fmt, start, end, batch_size):
+    """Exports the parking events to a columnar file."""
     try:
+        start = parse_timestamp(start) if start else None
+        end = parse_timestamp(end) if end else None
+    except ValueError as e:
+        print(f"❌ {e}")
+        raise SystemExit(1)
+
+    print(f"📦 Exporting parking events to {path}...")
+    started = datetime.utcnow()
+    count = export_events(path, fmt, start, end, batch_size or current_app.config["EXPORT_BATCH_SIZE"])
+    elapsed = (datetime.utcnow() - started).total_seconds()
+    db.session.rollback()
+    print(f"✅ {count} events exported in {elapsed:.1f}s")
+
+
+def run_import(importer, path):
+    """Runs a bulk import of a file in its own transaction."""
+    print(f"🌱 Importing {path}...")
+    try:
+        with open(path, 'r') as f:
+            result = importer(f)
         db.session.commit()
-        print(f"✅ Parking Seeding: {added_count} added, {skipped_count} skipped.")
+        print(f"✅ {result}")
+    except ValueError as e:
+        db.session.rollback()
+        print(f"❌ Error reading {path}: {e}")
     except Exception as e:
         db.session.rollback()
-        print(f"❌ Database error (Parking): {e}")
+        print(f"❌ Database error ({path}): {e}")
 
 
-def seed_parking_events():
-    """Logic to seed Parking Events from GeoJSON."""
-    json_path = os.path.join(current_app.root_path, 'seeds', 'parkingEvents_data.geojson')
-
+def seed_file(name):
+    json_path = os.path.join(current_app.root_path, 'seeds', name)
     if not os.path.exists(json_path):
-        print(f"⚠️  Events seed file not found at: {json_path}")
-        return
+        print(f"⚠️  Seed file not found at: {json_path}")
+        return None
+    return json_path
 
-    print(f"🌱 Seeding Events from {json_path}...")
 
-    try:
-        with open(json_path, 'r') as f:
-            geojson_data = json.load(f)
-    except Exception as e:
-        print(f"❌ Error reading Events GeoJSON: {e}")
-        return
+def seed_users():
+    """Logic to seed users."""
+    json_path = seed_file('users_data.json')
+    if json_path:
+        run_import(import_users, json_path)
 
-    added_count = 0
-    skipped_count = 0
-    features = geojson_data.get('features', [])
-
-    for feature in features:
-        props = feature.get('properties', {})
-        geometry = feature.get('geometry')
-        
-        # Extract fields
-        # Note: We use the GeoJSON "id" to prevent duplicates, assuming it maps 
-        # conceptually to the database ID for this initial seed.
-        event_id = props.get('id') 
-        user_id = props.get('user_id')
-        area_id = props.get('parking_area_id')
-        start_str = props.get('start_time')
-        end_str = props.get('end_time')
-
-        # Idempotency Check: 
-        # If we already have an event with this specific ID (or combo of user+time), skip.
-        # Since your DB auto-increments ID, we usually don't force the ID, 
-        # but for seeding, we can check if a similar event exists to avoid dupes.
-        existing = ParkingEvent.query.filter_by(
-            user_id=user_id, 
-            parking_area_id=area_id
-        ).filter(ParkingEvent.start_time == datetime.fromisoformat(start_str.replace("Z", "+00:00"))).first()
-
-        if existing:
-            skipped_count += 1
-            continue
-
-        # Parse Times
-        try:
-            start_dt = datetime.fromisoformat(start_str.replace("Z", "+00:00"))
-            end_dt = datetime.fromisoformat(end_str.replace("Z", "+00:00")) if end_str else None
-        except ValueError:
-            print(f"❌ Date error for event {event_id}")
-            continue
-
-        # Handle Geometry (Point)
-        try:
-            shapely_geom = shape(geometry)
-            wkt_geom = WKTElement(shapely_geom.wkt, srid=4326)
-        except Exception as e:
-            print(f"❌ Geometry error for event {event_id}: {e}")
-            continue
-
-        # Create Instance
-        # We default Type to PARK based on the data structure
-        new_event = ParkingEvent(
-            type=EventType.PARK, 
-            location_point=wkt_geom,
-            user_id=user_id,
-            parking_area_id=area_id,
-            start_time=start_dt,
-            end_time=end_dt
-        )
-
-        db.session.add(new_event)
-        added_count += 1
 
-    try:
-        db.session.commit()
-        print(f"✅ Events Seeding: {added_count} added, {skipped_count} skipped.")
-    except Exception as e:
-        db.session.rollback()
-        print(f"❌ Database error (Events): {e}")
\ No newline at end of file
+def seed_parking_areas():
+    """Logic to seed Parking Areas from GeoJSON."""
+    json_path = seed_file('parkingAreas_data.geojson')
+    if json_path:
+        run_import(import_parking_areas, json_path)
+
+
+def seed_parking_events():
+    """Logic to seed Parking Events from GeoJSON."""
+    json_path = seed_file('parkingEvents_data.geojson')
+    if json_path:
+        run_import(import_parking_events, json_path)
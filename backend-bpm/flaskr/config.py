@@ -3,4 +3,59 @@ import os
 load_dotenv()
 
 class Config(object):
-    DB_URL = os.getenv("DB_URL")
\ No newline at end of file
+    DB_URL = os.getenv("DB_URL")
+
+    # Seconds between geometry version checks of the in-memory area index
+    SPATIAL_INDEX_TTL = float(os.getenv("SPATIAL_INDEX_TTL", 5))
+
+    # Maximum number of events accepted by POST /events/parking/batch
+    EVENTS_BATCH_MAX_SIZE = int(os.getenv("EVENTS_BATCH_MAX_SIZE", 1000))
+
+    # Maximum page size of the keyset-paginated listings (?limit=&cursor=)
+    PAGE_MAX_LIMIT = int(os.getenv("PAGE_MAX_LIMIT", 5000))
+
+    # Rows fetched per round trip by the streamed (server-side cursor) listings
+    STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", 1000))
+
+    # Source of the capacity changes pushed to SSE clients:
+    # "postgres" (LISTEN/NOTIFY, all workers) or "memory" (this process only)
+    CAPACITY_FEED_BACKEND = os.getenv("CAPACITY_FEED_BACKEND", "postgres")
+    CAPACITY_FEED_QUEUE_SIZE = int(os.getenv("CAPACITY_FEED_QUEUE_SIZE", 256))
+    CAPACITY_FEED_HEARTBEAT = float(os.getenv("CAPACITY_FEED_HEARTBEAT", 15))
+
+    # Seconds between two refreshes of the occupancy rollups by the background
+    # refresher of each worker (0: none, run `flask refresh-occupancy` instead)
+    OCCUPANCY_REFRESH_INTERVAL = float(os.getenv("OCCUPANCY_REFRESH_INTERVAL", 60))
+
+    # Connections of the async pool serving POST /events/parking (flaskr.asgi)
+    ASYNC_DB_POOL_MIN_SIZE = int(os.getenv("ASYNC_DB_POOL_MIN_SIZE", 2))
+    ASYNC_DB_POOL_MAX_SIZE = int(os.getenv("ASYNC_DB_POOL_MAX_SIZE", 20))
+
+    # Write-behind mode of POST /events/parking: events are queued and
+    # inserted in batches of up to EVENTS_FLUSH_BATCH_SIZE rows, at least
+    # every EVENTS_FLUSH_INTERVAL seconds; beyond EVENTS_BUFFER_MAX_PENDING
+    # pending events, requests are answered 429
+    EVENTS_WRITE_BEHIND = os.getenv("EVENTS_WRITE_BEHIND", "false").lower() in ("1", "true", "yes")
+    EVENTS_BUFFER_MAX_PENDING = int(os.getenv("EVENTS_BUFFER_MAX_PENDING", 10000))
+    EVENTS_FLUSH_BATCH_SIZE = int(os.getenv("EVENTS_FLUSH_BATCH_SIZE", 500))
+    EVENTS_FLUSH_INTERVAL = float(os.getenv("EVENTS_FLUSH_INTERVAL", 0.05))
+
+    # Vector tiles (/tiles): tiles kept in the per-worker cache, seconds an
+    # events tile is served from it, minimum zoom and maximum number of
+    # features of the events tiles
+    TILE_CACHE_SIZE = int(os.getenv("TILE_CACHE_SIZE", 4096))
+    TILES_EVENTS_TTL = float(os.getenv("TILES_EVENTS_TTL", 30))
+    TILES_EVENTS_MIN_ZOOM = int(os.getenv("TILES_EVENTS_MIN_ZOOM", 12))
+    TILES_EVENTS_MAX_FEATURES = int(os.getenv("TILES_EVENTS_MAX_FEATURES", 10000))
+
+    # Rows per Arrow record batch (and Parquet row group) of the event exports
+    EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 50000))
+
+    # Users kept in the per-worker identity cache validating event user ids
+    USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 100000))
+
+    # Open parking sessions kept in the per-worker cache closing them on leave
+    OPEN_SESSIONS_CACHE_SIZE = int(os.getenv("OPEN_SESSIONS_CACHE_SIZE", 100000))
+
+    # Seconds the per-area dwell/turnover statistics (/areas/stats) are cached
+    AREA_STATS_TTL = float(os.getenv("AREA_STATS_TTL", 300))
\ No newline at end of file
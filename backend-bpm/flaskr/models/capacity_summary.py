@@ -0,0 +1,91 @@
+from flaskr.extensions import db
+from sqlalchemy import func, text
+
+
+class CapacitySummary(db.Model):
+    """Capacity totals of all parking areas, maintained by a database trigger.
+
+    Every statement changing `parking_areas` (park/leave, batch updates, seeds)
+    applies its delta to one of SLOTS rows (area id modulo SLOTS), so that
+    concurrent writers do not serialize on a single row. Reading the summary
+    sums the slots: constant time whatever the number of areas.
+    """
+    __tablename__ = 'capacity_summary'
+
+    SLOTS = 16
+
+    slot = db.Column(db.SmallInteger, primary_key=True)
+    total_areas = db.Column(db.Integer, nullable=False)
+    total_max_capacity = db.Column(db.BigInteger, nullable=False)
+    total_residual_capacity = db.Column(db.BigInteger, nullable=False)
+    areas_full = db.Column(db.Integer, nullable=False)
+    capacity_version = db.Column(db.BigInteger, nullable=False, server_default='0')
+
+    @staticmethod
+    def get_totals():
+        """Returns the maintained totals (sum of the slots)."""
+        row = db.session.query(
+            func.coalesce(func.sum(CapacitySummary.total_areas), 0).label('total_areas'),
+            func.coalesce(func.sum(CapacitySummary.total_max_capacity), 0).label('total_max_capacity'),
+            func.coalesce(func.sum(CapacitySummary.total_residual_capacity), 0).label('total_residual_capacity'),
+            func.coalesce(func.sum(CapacitySummary.areas_full), 0).label('areas_full')
+        ).one()
+        return {key: int(value) for key, value in row._mapping.items()}
+
+    @staticmethod
+    def check():
+        """Compares the maintained totals with the base table.
+
+        Both are read by a single statement, hence from the same snapshot:
+        park/leave transactions committing meanwhile cannot show up on one
+        side only. Returns a dict of the mismatching totals as
+        {name: (stored, actual)} (empty when consistent).
+        """
+        row = db.session.execute(text("""
+            SELECT s.total_areas, s.total_max_capacity, s.total_residual_capacity, s.areas_full,
+                   a.total_areas, a.total_max_capacity, a.total_residual_capacity, a.areas_full
+            FROM (
+                SELECT COALESCE(sum(total_areas), 0) AS total_areas,
+                       COALESCE(sum(total_max_capacity), 0) AS total_max_capacity,
+                       COALESCE(sum(total_residual_capacity), 0) AS total_residual_capacity,
+                       COALESCE(sum(areas_full), 0) AS areas_full
+                FROM capacity_summary
+            ) s, (
+                SELECT count(*) AS total_areas,
+                       COALESCE(sum(max_capacity), 0) AS total_max_capacity,
+                       COALESCE(sum(residual_capacity), 0) AS total_residual_capacity,
+                       count(*) FILTER (WHERE residual_capacity <= 0) AS areas_full
+                FROM parking_areas
+            ) a
+        """)).one()
+        keys = ("total_areas", "total_max_capacity", "total_residual_capacity", "areas_full")
+        stored = dict(zip(keys, (int(value) for value in row[:4])))
+        actual = dict(zip(keys, (int(value) for value in row[4:])))
+        return {key: (stored[key], actual[key]) for key in keys if stored[key] != actual[key]}
+
+    @staticmethod
+    def rebuild():
+        """Recomputes every slot from the parking_areas table. Does not commit."""
+        # Lock the areas so that no park/leave delta is applied meanwhile
+        db.session.execute(text("LOCK TABLE parking_areas IN SHARE MODE"))
+        db.session.execute(text("""
+            UPDATE capacity_summary cs SET
+                total_areas = COALESCE(a.total_areas, 0),
+                total_max_capacity = COALESCE(a.total_max_capacity, 0),
+                total_residual_capacity = COALESCE(a.total_residual_capacity, 0),
+                areas_full = COALESCE(a.areas_full, 0)
+            FROM capacity_summary s
+            LEFT JOIN (
+                SELECT id % :slots AS slot,
+                       count(*) AS total_areas,
+                       sum(max_capacity) AS total_max_capacity,
+                       sum(residual_capacity) AS total_residual_capacity,
+                       count(*) FILTER (WHERE residual_capacity <= 0) AS areas_full
+                FROM parking_areas
+                GROUP BY 1
+            ) a ON a.slot = s.slot
+            WHERE cs.slot = s.slot
+        """), {"slots": CapacitySummary.SLOTS})
+
+    def __repr__(self):
+        return f"<CapacitySummary slot {self.slot}>"
@@ -1,8 +1,12 @@
-from datetime import datetime
+from collections import defaultdict
+from datetime import datetime, timezone
 from flaskr.extensions import db
 from geoalchemy2 import Geometry
 from geoalchemy2.shape import to_shape
-import json
+from shapely.geometry import mapping
+from sqlalchemy import JSON, Text, cast, func, literal_column, text, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from flaskr.models.parking_areas import GEOJSON_MAX_DIGITS
 import enum
 
 
@@ -11,16 +15,54 @@ class EventType(enum.Enum):
     LEAVE = "leave"
 
 
+def parse_timestamp(value):
+    """Parses an ISO 8601 timestamp into a naive UTC datetime (as stored in the DB).
+
+    Raises ValueError if the value is not a valid timestamp.
+    """
+    if not isinstance(value, str):
+        raise ValueError(f"Invalid timestamp: {value!r}")
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
 class ParkingEvent(db.Model):
     __tablename__ = 'parking_events'
+    # Range-partitioned by month of start_time (see
+    # flaskr.services.partitions): the partition key is part of the primary key
+    __table_args__ = (
+        db.Index('ix_parking_events_start_time_id', 'start_time', 'id'),
+        db.Index('ix_parking_events_user_start_time_id', 'user_id', 'start_time', 'id'),
+        db.Index('ix_parking_events_area_start_time_id', 'parking_area_id', 'start_time', 'id'),
+        db.Index('ix_parking_events_type_start_time_id', 'type', 'start_time', 'id'),
+        # Deduplicates the bulk imports (flaskr.services.bulk_import)
+        db.Index('uq_parking_events_user_area_type_start_time', 'user_id', 'parking_area_id', 'type', 'start_time', unique=True),
+        # Delta sync (get_changes) and occupancy rollups
+        db.Index('ix_parking_events_user_change_xid_id', 'user_id', db.text('COALESCE(change_xid, 0)'), 'id'),
+        db.Index('ix_parking_events_change_xid', 'change_xid'),
+        # Parking intervals still open at the start of an occupancy refresh
+        db.Index('ix_parking_events_park_end_time', 'end_time', postgresql_where=db.text("type = 'PARK'")),
+        # Open parking sessions: PARK events not closed by a LEAVE yet
+        # (flaskr.services.sessions)
+        db.Index('ix_parking_events_open_sessions', 'user_id', 'parking_area_id', 'start_time',
+                 postgresql_where=db.text("type = 'PARK' AND end_time IS NULL")),
+        {'postgresql_partition_by': 'RANGE (start_time)'},
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    start_time = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    start_time = db.Column(db.DateTime, primary_key=True, nullable=False, default=datetime.utcnow)
     end_time = db.Column(db.DateTime, nullable=True)
     type = db.Column(db.Enum(EventType), nullable=False)
     location_point = db.Column(Geometry(geometry_type='POINT', srid=4326), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     parking_area_id = db.Column(db.Integer, db.ForeignKey('parking_areas.id'), nullable=False)
+    # Id of the transaction which last inserted or updated the event: set by
+    # the column default and by an update trigger (see change_horizon). NULL
+    # for the events stored before delta sync, older than any horizon
+    change_xid = db.Column(db.BigInteger, nullable=True,
+                           server_default=text("(pg_current_xact_id()::text)::bigint"))
 
     # Relationships
     user = db.relationship('User', backref=db.backref('parking_events', lazy='dynamic'))
@@ -37,13 +79,32 @@ class ParkingEvent(db.Model):
     def get_location_geojson(self):
         """Converts the geometry to GeoJSON dict."""
         if self.location_point is not None:
-            shape = to_shape(self.location_point)
-            return json.loads(json.dumps(shape.__geo_interface__))
+            return mapping(to_shape(self.location_point))
         return None
 
+    @staticmethod
+    def bulk_insert(rows):
+        """Inserts many events (column dicts) at once, skipping the duplicates
+        of recorded events; returns their ids in order, None for a duplicate."""
+        inserted = db.session.execute(
+            insert(ParkingEvent).on_conflict_do_nothing().returning(
+                ParkingEvent.id, ParkingEvent.user_id, ParkingEvent.parking_area_id, ParkingEvent.type,
+                ParkingEvent.start_time
+            ),
+            rows
+        ).all()
+        # Rows not returned were skipped: match the others by their unique key
+        ids = defaultdict(list)
+        for event_id, *key in inserted:
+            ids[tuple(key)].append(event_id)
+        return [
+            ids[key].pop() if ids[key] else None
+            for key in ((row["user_id"], row["parking_area_id"], row["type"], row["start_time"]) for row in rows)
+        ]
+
     @staticmethod
     def get_by_id(event_id):
-        return ParkingEvent.query.get(event_id)
+        return ParkingEvent.query.filter(ParkingEvent.id == event_id).first()
 
     @staticmethod
     def get_all():
@@ -51,7 +112,42 @@ class ParkingEvent(db.Model):
 
     @staticmethod
     def get_by_user(user_id):
-        return ParkingEvent.query.filter(ParkingEvent.user_id == user_id).all()
+        return ParkingEvent.query.filter(ParkingEvent.user_id == user_id).order_by(
+            ParkingEvent.start_time, ParkingEvent.id
+        ).all()
+
+    @staticmethod
+    def change_horizon():
+        """Returns the oldest transaction id still running (snapshot xmin).
+
+        Every event inserted or updated by a transaction not committed yet,
+        or started later, gets a change_xid >= the horizon: reading the events
+        with change_xid >= the horizon taken before the previous read misses
+        no change, even when transactions commit out of order (at worst, some
+        events are read twice).
+        """
+        return db.session.execute(text("SELECT (pg_snapshot_xmin(pg_current_snapshot())::text)::bigint")).scalar()
+
+    @staticmethod
+    def change_key():
+        """The change_xid of the events, NULL (before delta sync) read as 0:
+        such events only belong to a full sync (horizon 0). Matches the
+        expression of the delta sync index (literal 0, not a parameter)."""
+        return func.coalesce(ParkingEvent.change_xid, literal_column("0"))
+
+    @staticmethod
+    def get_changes(user_id, horizon, after=None, limit=None):
+        """Returns the events of the user changed since `horizon` (see
+        change_horizon), ordered by (change key, id) and starting after the
+        `after` (change key, id) key."""
+        change_key = ParkingEvent.change_key()
+        query = ParkingEvent.query.filter(
+            ParkingEvent.user_id == user_id,
+            change_key >= horizon
+        )
+        if after is not None:
+            query = query.filter(tuple_(change_key, ParkingEvent.id) > tuple_(*after))
+        return query.order_by(change_key, ParkingEvent.id).limit(limit).all()
 
     @staticmethod
     def get_by_parking_area(parking_area_id):
@@ -65,6 +161,46 @@ class ParkingEvent(db.Model):
     def get_recent(limit=10):
         return ParkingEvent.query.order_by(ParkingEvent.start_time.desc()).limit(limit).all()
 
+    @staticmethod
+    def filter_query(user_id=None, parking_area_id=None, event_type=None, start=None, end=None, bbox=None):
+        """Returns the (unordered) query of the events matching the filters.
+
+        Bounding start_time with `start`/`end` lets postgres skip the monthly
+        partitions outside of [start, end). `bbox` (minx, miny, maxx, maxy)
+        keeps the events located within, through the spatial index.
+        """
+        query = ParkingEvent.query
+        if bbox is not None:
+            query = query.filter(func.ST_Intersects(
+                ParkingEvent.location_point, func.ST_MakeEnvelope(*bbox, 4326)
+            ))
+        if start is not None:
+            query = query.filter(ParkingEvent.start_time >= start)
+        if end is not None:
+            query = query.filter(ParkingEvent.start_time < end)
+        if user_id is not None:
+            query = query.filter(ParkingEvent.user_id == user_id)
+        if parking_area_id is not None:
+            query = query.filter(ParkingEvent.parking_area_id == parking_area_id)
+        if event_type is not None:
+            query = query.filter(ParkingEvent.type == event_type)
+        return query
+
+    @staticmethod
+    def get_page(query, limit, after=None):
+        """Returns the next `limit` events of the query in (start_time, id)
+        order, strictly after the `after` (start_time, id) key if given."""
+        query = query.order_by(ParkingEvent.start_time, ParkingEvent.id)
+        if after is not None:
+            query = query.filter(tuple_(ParkingEvent.start_time, ParkingEvent.id) > tuple_(*after))
+        return query.limit(limit).all()
+
+    @staticmethod
+    def iter_all(query, chunk_size=1000):
+        """Iterates over the events of the query in (start_time, id) order,
+        fetching `chunk_size` rows at a time from a server-side cursor."""
+        return query.order_by(ParkingEvent.start_time, ParkingEvent.id).yield_per(chunk_size)
+
     def to_dict(self):
         """Converts the object to a dictionary for JSON responses."""
         return {
@@ -92,5 +228,122 @@ class ParkingEvent(db.Model):
             }
         }
 
+    @staticmethod
+    def geojson_feature_sql():
+        """SQL expression building the same document as to_geojson_feature()
+        inside PostGIS, as JSON text (no Shapely nor ORM hydration)."""
+        return cast(func.json_build_object(
+            'type', 'Feature',
+            'geometry', cast(func.ST_AsGeoJSON(ParkingEvent.location_point, literal_column(str(GEOJSON_MAX_DIGITS))),
+                             JSON),
+            'properties', func.json_build_object(
+                'id', ParkingEvent.id,
+                'start_time', ParkingEvent.start_time,
+                'end_time', ParkingEvent.end_time,
+                'type', func.lower(cast(ParkingEvent.type, Text)),
+                'user_id', ParkingEvent.user_id,
+                'parking_area_id', ParkingEvent.parking_area_id
+            )
+        ), Text)
+
+    @staticmethod
+    def get_tile(z, x, y, start=None, end=None, limit=10000, extent=4096, buffer=64):
+        """Returns the Mapbox Vector Tile (bytes) of the events located in tile
+        z/x/y: an `events` layer of points (times in epoch seconds), the
+        `limit` most recent events starting within [start, end) at most."""
+        # Literal bounds (not NULL-able parameters) keep the partition pruning
+        time_range = ""
+        if start is not None:
+            time_range += " AND e.start_time >= :start"
+        if end is not None:
+            time_range += " AND e.start_time < :end"
+        return db.session.execute(text(f"""
+            WITH tile AS (
+                SELECT e.id, lower(e.type::text) AS type, e.user_id, e.parking_area_id,
+                       extract(epoch FROM e.start_time)::bigint AS start_time,
+                       extract(epoch FROM e.end_time)::bigint AS end_time,
+                       ST_AsMVTGeom(ST_Transform(e.location_point, 3857), ST_TileEnvelope(:z, :x, :y),
+                                    :extent, :buffer) AS geom
+                FROM parking_events e
+                WHERE e.location_point && ST_Transform(
+                    ST_TileEnvelope(:z, :x, :y, margin => CAST(:buffer AS float8) / :extent), 4326
+                ){time_range}
+                ORDER BY e.start_time DESC
+                LIMIT :limit
+            )
+            SELECT ST_AsMVT(tile, 'events', :extent, 'geom', 'id') FROM tile WHERE geom IS NOT NULL
+        """), {"z": z, "x": x, "y": y, "start": start, "end": end, "limit": limit,
+               "extent": extent, "buffer": buffer}).scalar()
+
+    @staticmethod
+    def get_grid_counts(shape, size, start=None, end=None, event_type=None, bbox=None):
+        """Returns the number of events per cell of a square or hexagonal grid
+        as a GeoJSON FeatureCollection (JSON text) of the non-empty cells.
+
+        The grid is in web mercator (`size` in meters: side of the squares,
+        edge of the hexagons), aligned on the origin as ST_SquareGrid and
+        ST_HexagonGrid. Each point is binned on its own, arithmetically (no
+        grid generated and joined), then the cells are counted and built from
+        their index.
+        """
+        filters = ""
+        if start is not None:
+            filters += " AND e.start_time >= :start"
+        if end is not None:
+            filters += " AND e.start_time < :end"
+        if event_type is not None:
+            filters += " AND e.type = CAST(:type AS eventtype)"
+        if bbox is not None:
+            filters += " AND ST_Intersects(e.location_point, ST_MakeEnvelope(:minx, :miny, :maxx, :maxy, 4326))"
+
+        if shape == "square":
+            binning = """
+                SELECT floor(ST_X(p.geom) / :size)::int AS i, floor(ST_Y(p.geom) / :size)::int AS j
+                FROM (SELECT ST_Transform(e.location_point, 3857) AS geom) AS p
+            """
+            cell = "ST_Square(:size, c.i, c.j, ST_SetSRID(ST_MakePoint(0, 0), 3857))"
+        else:
+            # Nearest hexagon center, as laid out by ST_Hexagon (columns
+            # 1.5 * size apart, odd ones shifted up by half a row): only the
+            # two columns around the point can hold it. Ties go to the lowest
+            # (i, j)
+            binning = """
+                SELECT c.i, c.j
+                FROM (
+                    SELECT ST_X(g) AS x, ST_Y(g) AS y,
+                           1.5 * CAST(:size AS float8) AS w, sqrt(3) * CAST(:size AS float8) AS h
+                    FROM ST_Transform(e.location_point, 3857) AS g
+                ) AS p
+                CROSS JOIN LATERAL (VALUES (floor(p.x / p.w)::int), (floor(p.x / p.w)::int + 1)) AS k(i)
+                CROSS JOIN LATERAL (SELECT CASE WHEN k.i % 2 <> 0 THEN 0.5 ELSE 0.0 END AS shift) AS s
+                CROSS JOIN LATERAL (SELECT k.i AS i, round(p.y / p.h - s.shift)::int AS j) AS c
+                ORDER BY (p.x - p.w * c.i) ^ 2 + (p.y - p.h * (c.j + s.shift)) ^ 2, c.i, c.j
+                LIMIT 1
+            """
+            cell = "ST_Hexagon(:size, c.i, c.j, ST_SetSRID(ST_MakePoint(0, 0), 3857))"
+
+        params = {"size": size, "start": start, "end": end,
+                  "type": event_type.name if event_type is not None else None}
+        if bbox is not None:
+            params.update(zip(("minx", "miny", "maxx", "maxy"), bbox))
+        return db.session.execute(text(f"""
+            WITH c AS (
+                SELECT b.i, b.j, count(*) AS count
+                FROM parking_events e
+                CROSS JOIN LATERAL ({binning}) AS b
+                WHERE true{filters}
+                GROUP BY b.i, b.j
+            )
+            SELECT json_build_object(
+                'type', 'FeatureCollection',
+                'features', COALESCE(json_agg(json_build_object(
+                    'type', 'Feature',
+                    'geometry', ST_AsGeoJSON(ST_Transform({cell}, 4326), 7)::json,
+                    'properties', json_build_object('i', c.i, 'j', c.j, 'count', c.count)
+                ) ORDER BY c.i, c.j), '[]'::json)
+            )::text
+            FROM c
+        """), params).scalar()
+
     def __repr__(self):
         return f"<ParkingEvent {self.id} - {self.type.value} at {self.start_time}>"
\ No newline at end of file
@@ -0,0 +1,54 @@
+from flaskr.extensions import db
+
+
+class OccupancyHourly(db.Model):
+    """Per-area, per-hour occupancy rollup of the parking events.
+
+    Rows are sparse: hours with nobody parked and no arrival or departure
+    are not stored. Maintained by flaskr.services.occupancy.
+    """
+    __tablename__ = 'area_occupancy_hourly'
+
+    parking_area_id = db.Column(db.Integer, db.ForeignKey('parking_areas.id', ondelete='CASCADE'), primary_key=True)
+    bucket_start = db.Column(db.DateTime, primary_key=True)
+    avg_occupied = db.Column(db.Float, nullable=False)
+    peak_occupied = db.Column(db.Integer, nullable=False)
+    arrivals = db.Column(db.Integer, nullable=False)
+    departures = db.Column(db.Integer, nullable=False)
+
+    @staticmethod
+    def get_range(parking_area_id, start, end):
+        """Returns the stored hourly rows of the area within [start, end)."""
+        return OccupancyHourly.query.filter(
+            OccupancyHourly.parking_area_id == parking_area_id,
+            OccupancyHourly.bucket_start >= start,
+            OccupancyHourly.bucket_start < end
+        ).order_by(OccupancyHourly.bucket_start).all()
+
+    def to_dict(self):
+        """Converts the object to a dictionary for JSON responses."""
+        return {
+            "bucket_start": self.bucket_start.isoformat(),
+            "avg_occupied": self.avg_occupied,
+            "peak_occupied": self.peak_occupied,
+            "arrivals": self.arrivals,
+            "departures": self.departures
+        }
+
+    def __repr__(self):
+        return f"<OccupancyHourly area {self.parking_area_id} at {self.bucket_start}>"
+
+
+class OccupancyRollupState(db.Model):
+    """Single-row table with the progress of the occupancy rollups."""
+    __tablename__ = 'occupancy_rollup_state'
+
+    id = db.Column(db.Integer, primary_key=True)
+    # Transaction horizon of the last refresh: the events changed since have
+    # a change_xid >= it (see ParkingEvent.change_horizon)
+    change_horizon = db.Column(db.BigInteger, nullable=False)
+    refreshed_at = db.Column(db.DateTime, nullable=True)
+
+    @staticmethod
+    def get():
+        return db.session.get(OccupancyRollupState, 1)
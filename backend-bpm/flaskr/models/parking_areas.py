@@ -1,7 +1,22 @@
 from flaskr.extensions import db
+from flaskr.services.capacity_feed import record_capacity_changes
 from geoalchemy2 import Geometry
+from geoalchemy2 import functions as geo_func
 from geoalchemy2.shape import to_shape
-import json
+from shapely.geometry import mapping
+from sqlalchemy import text, update
+import math
+
+# Decimals of the full resolution GeoJSON built by PostGIS: ST_AsGeoJSON
+# rounds to 9 by default, 17 renders the shortest representation of every
+# double, as Python (and to_geojson_feature()) does
+GEOJSON_MAX_DIGITS = 17
+
+
+def geojson_digits(zoom):
+    """Returns the coordinate decimals resolving a pixel at `zoom`."""
+    pixel_degrees = 360 / (256 * 2 ** zoom)
+    return max(1, math.ceil(-math.log10(pixel_degrees)) + 1)
 
 
 class ParkingArea(db.Model):
@@ -12,6 +27,9 @@ class ParkingArea(db.Model):
     location_area = db.Column(Geometry(geometry_type='POLYGON', srid=4326), nullable=False)
     max_capacity = db.Column(db.Integer, nullable=False)
     residual_capacity = db.Column(db.Integer, nullable=False)
+    # Stamped by a database trigger with the global geometry version on every
+    # change of name, polygon or max capacity (see ParkingAreasState).
+    geometry_version = db.Column(db.BigInteger, nullable=False, server_default='1')
 
     def __init__(self, name, location_area, max_capacity, residual_capacity=None):
         self.name = name
@@ -19,21 +37,93 @@ class ParkingArea(db.Model):
         self.max_capacity = max_capacity
         self.residual_capacity = residual_capacity if residual_capacity is not None else max_capacity
 
-    def park_bicycle(self):
-        """Decrements residual capacity when a bicycle is parked."""
-        if self.residual_capacity > 0:
-            self.residual_capacity -= 1
-            db.session.commit()
-            return True
-        return False
-
-    def leave_parking(self):
-        """Increments residual capacity when a bicycle leaves."""
-        if self.residual_capacity < self.max_capacity:
-            self.residual_capacity += 1
-            db.session.commit()
-            return True
-        return False
+    @staticmethod
+    def park_bicycle(area_id):
+        """Atomically takes a spot in the area with a conditional UPDATE.
+
+        Returns the updated area, or None if it is full (or does not exist).
+        Does not commit: the caller commits together with its own writes.
+        """
+        area = db.session.execute(
+            update(ParkingArea)
+            .where(ParkingArea.id == area_id, ParkingArea.residual_capacity > 0)
+            .values(residual_capacity=ParkingArea.residual_capacity - 1)
+            .returning(ParkingArea)
+        ).scalar_one_or_none()
+        if area is not None:
+            record_capacity_changes([area.get_capacity_change(-1)])
+        return area
+
+    @staticmethod
+    def leave_parking(area_id):
+        """Atomically frees a spot in the area with a conditional UPDATE.
+
+        Returns the updated area, or None if it is already empty (or does not
+        exist). Does not commit: the caller commits together with its own writes.
+        """
+        area = db.session.execute(
+            update(ParkingArea)
+            .where(ParkingArea.id == area_id, ParkingArea.residual_capacity < ParkingArea.max_capacity)
+            .values(residual_capacity=ParkingArea.residual_capacity + 1)
+            .returning(ParkingArea)
+        ).scalar_one_or_none()
+        if area is not None:
+            record_capacity_changes([area.get_capacity_change(1)])
+        return area
+
+    @staticmethod
+    def apply_capacity_changes(changes):
+        """Applies an ordered list of (area_id, delta) capacity changes at once.
+
+        Locks the touched areas, replays the changes in order with the same
+        rules as park_bicycle/leave_parking (residual capacity must stay
+        within 0 and max capacity), then writes the net residual capacity of
+        each area with one bulk UPDATE. Returns the accepted flag of each
+        change and the resulting residual capacity per area. Does not commit.
+        """
+        if not changes:
+            return [], {}
+
+        area_ids = sorted({area_id for area_id, _ in changes})
+        # Lock in id order so that concurrent batches cannot deadlock
+        rows = db.session.query(
+            ParkingArea.id, ParkingArea.residual_capacity, ParkingArea.max_capacity
+        ).filter(ParkingArea.id.in_(area_ids)).order_by(ParkingArea.id).with_for_update().all()
+
+        initial = {row.id: row.residual_capacity for row in rows}
+        max_capacity = {row.id: row.max_capacity for row in rows}
+        residual = dict(initial)
+
+        accepted = []
+        for area_id, delta in changes:
+            if area_id in residual and 0 <= residual[area_id] + delta <= max_capacity[area_id]:
+                residual[area_id] += delta
+                accepted.append(True)
+            else:
+                accepted.append(False)
+
+        updated = [
+            {"id": area_id, "residual_capacity": value}
+            for area_id, value in residual.items() if value != initial[area_id]
+        ]
+        if updated:
+            db.session.execute(update(ParkingArea), updated)
+            record_capacity_changes([{
+                "id": row["id"],
+                "residual_capacity": row["residual_capacity"],
+                "max_capacity": max_capacity[row["id"]],
+                "delta": row["residual_capacity"] - initial[row["id"]]
+            } for row in updated])
+        return accepted, residual
+
+    def get_capacity_change(self, delta):
+        """Returns the capacity change message published to feed subscribers."""
+        return {
+            "id": self.id,
+            "residual_capacity": self.residual_capacity,
+            "max_capacity": self.max_capacity,
+            "delta": delta
+        }
 
     def is_full(self):
         """Check if parking area is full."""
@@ -48,8 +138,7 @@ class ParkingArea(db.Model):
     def get_geometry_geojson(self):
         """Converts the geometry to GeoJSON dict."""
         if self.location_area is not None:
-            shape = to_shape(self.location_area)
-            return json.loads(json.dumps(shape.__geo_interface__))
+            return mapping(to_shape(self.location_area))
         return None
 
     @staticmethod
@@ -64,6 +153,228 @@ class ParkingArea(db.Model):
     def get_all():
         return ParkingArea.query.all()
 
+    @staticmethod
+    def get_id_containing(location_point):
+        """Returns the id of the parking area containing the point, or None."""
+        return db.session.query(ParkingArea.id).filter(
+            geo_func.ST_Contains(ParkingArea.location_area, location_point)
+        ).order_by(ParkingArea.id).limit(1).scalar()
+
+    @staticmethod
+    def get_ids_containing(coordinates):
+        """Returns the area id (or None) for each (longitude, latitude) pair,
+        resolved with a single set-based spatial join."""
+        if not coordinates:
+            return []
+        rows = db.session.execute(text("""
+            SELECT p.idx, (
+                SELECT pa.id FROM parking_areas pa
+                WHERE ST_Contains(pa.location_area, ST_SetSRID(ST_MakePoint(p.lon, p.lat), 4326))
+                ORDER BY pa.id
+                LIMIT 1
+            )
+            FROM unnest(CAST(:lons AS float8[]), CAST(:lats AS float8[]))
+                WITH ORDINALITY AS p(lon, lat, idx)
+        """), {
+            "lons": [lon for lon, _ in coordinates],
+            "lats": [lat for _, lat in coordinates]
+        }).all()
+
+        area_ids = [None] * len(coordinates)
+        for idx, area_id in rows:
+            area_ids[idx - 1] = area_id
+        return area_ids
+
+    @staticmethod
+    def get_nearest(longitude, latitude, k=5, min_free=1):
+        """Returns the k areas nearest to the point with at least `min_free`
+        free spots, closest first, with their geodesic distance in meters.
+
+        Ordered by KNN (<->) on the geography index of the polygons, the
+        capacity filter being applied during the index scan.
+        """
+        rows = db.session.execute(text("""
+            SELECT id, name, max_capacity, residual_capacity,
+                   ST_X(ST_PointOnSurface(location_area)) AS longitude,
+                   ST_Y(ST_PointOnSurface(location_area)) AS latitude,
+                   ST_Distance(location_area::geography,
+                               ST_SetSRID(ST_MakePoint(:lon, :lat), 4326)::geography) AS distance_m
+            FROM parking_areas
+            WHERE residual_capacity >= :min_free
+            ORDER BY location_area::geography <-> ST_SetSRID(ST_MakePoint(:lon, :lat), 4326)::geography
+            LIMIT :k
+        """), {"lon": longitude, "lat": latitude, "k": k, "min_free": min_free}).all()
+        return [{
+            "id": row.id,
+            "name": row.name,
+            "max_capacity": row.max_capacity,
+            "residual_capacity": row.residual_capacity,
+            "occupancy_percentage": ((row.max_capacity - row.residual_capacity) / row.max_capacity * 100)
+                                    if row.max_capacity else 0,
+            "longitude": row.longitude,
+            "latitude": row.latitude,
+            "distance_m": row.distance_m
+        } for row in rows]
+
+    @staticmethod
+    def _viewport_sql(bbox=None, zoom=None):
+        """Returns the FROM clause (areas as `pa`), the GeoJSON geometry
+        expression and the parameters of the viewport queries: the areas
+        intersecting `bbox` (minx, miny, maxx, maxy) found with the spatial
+        index, their polygons simplified for `zoom` if given."""
+        source = "parking_areas pa"
+        geometry = f"ST_AsGeoJSON(pa.location_area, {GEOJSON_MAX_DIGITS})"
+        params = {}
+        if zoom is not None:
+            # Precomputed at the lowest level simplified with at most the
+            # pixel size of the zoom (see ParkingAreaSimplifiedZoom). Areas
+            # with nothing to simplify, or zooms beyond the last level, have
+            # no row: full resolution
+            source += """
+                LEFT JOIN parking_areas_simplified s
+                ON s.parking_area_id = pa.id
+                AND s.zoom = (SELECT min(zoom) FROM parking_areas_simplified_zooms WHERE zoom >= :zoom)"""
+            geometry = "ST_AsGeoJSON(COALESCE(s.location_area, pa.location_area), :digits)"
+            params["zoom"] = zoom
+            params["digits"] = geojson_digits(zoom)
+        if bbox is not None:
+            source += """
+                WHERE ST_Intersects(pa.location_area, ST_MakeEnvelope(:minx, :miny, :maxx, :maxy, 4326))"""
+            params.update(zip(("minx", "miny", "maxx", "maxy"), bbox))
+        return source, geometry, params
+
+    @staticmethod
+    def get_geojson_collection(bbox=None, zoom=None):
+        """Returns the parking areas as a GeoJSON FeatureCollection (JSON text),
+        assembled inside PostGIS with the same features as to_geojson_feature(),
+        restricted to a viewport (see _viewport_sql) if given."""
+        source, geometry, params = ParkingArea._viewport_sql(bbox, zoom)
+        return db.session.execute(text(f"""
+            SELECT json_build_object(
+                'type', 'FeatureCollection',
+                'features', COALESCE(json_agg(json_build_object(
+                    'type', 'Feature',
+                    'geometry', {geometry}::json,
+                    'properties', json_build_object(
+                        'id', pa.id,
+                        'name', pa.name,
+                        'max_capacity', pa.max_capacity,
+                        'residual_capacity', pa.residual_capacity,
+                        'occupancy_percentage', CASE WHEN pa.max_capacity = 0 THEN 0
+                            ELSE (pa.max_capacity - pa.residual_capacity)::float8 / pa.max_capacity * 100 END
+                    )
+                ) ORDER BY pa.id), '[]'::json)
+            )::text
+            FROM {source}
+        """), params).scalar()
+
+    @staticmethod
+    def get_list_json(bbox=None, zoom=None):
+        """Returns the parking areas of a viewport (see _viewport_sql) as a JSON
+        array (text) of the to_dict() documents, assembled inside PostGIS."""
+        source, geometry, params = ParkingArea._viewport_sql(bbox, zoom)
+        return db.session.execute(text(f"""
+            SELECT COALESCE(json_agg(json_build_object(
+                'id', pa.id,
+                'name', pa.name,
+                'location_area', {geometry}::json,
+                'max_capacity', pa.max_capacity,
+                'residual_capacity', pa.residual_capacity,
+                'occupancy_percentage', CASE WHEN pa.max_capacity = 0 THEN 0
+                    ELSE (pa.max_capacity - pa.residual_capacity)::float8 / pa.max_capacity * 100 END
+            ) ORDER BY pa.id), '[]'::json)::text
+            FROM {source}
+        """), params).scalar()
+
+    @staticmethod
+    def get_geometry_collection():
+        """Returns the static part of all parking areas (name, polygon, max
+        capacity) as a GeoJSON FeatureCollection (JSON text) tagged with the
+        global geometry version, assembled inside PostGIS."""
+        return db.session.execute(text(f"""
+            SELECT json_build_object(
+                'type', 'FeatureCollection',
+                'geometry_version', (SELECT geometry_version FROM parking_areas_state WHERE id = 1),
+                'features', COALESCE(json_agg(json_build_object(
+                    'type', 'Feature',
+                    'geometry', ST_AsGeoJSON(location_area, {GEOJSON_MAX_DIGITS})::json,
+                    'properties', json_build_object(
+                        'id', id,
+                        'name', name,
+                        'max_capacity', max_capacity,
+                        'geometry_version', geometry_version
+                    )
+                ) ORDER BY id), '[]'::json)
+            )::text
+            FROM parking_areas
+        """)).scalar()
+
+    @staticmethod
+    def get_capacities():
+        """Returns the dynamic part of all parking areas (capacity only)."""
+        rows = db.session.query(
+            ParkingArea.id, ParkingArea.max_capacity, ParkingArea.residual_capacity
+        ).order_by(ParkingArea.id).all()
+        return [{
+            "id": row.id,
+            "max_capacity": row.max_capacity,
+            "residual_capacity": row.residual_capacity,
+            "occupancy_percentage": ((row.max_capacity - row.residual_capacity) / row.max_capacity * 100)
+                                    if row.max_capacity else 0
+        } for row in rows]
+
+    @staticmethod
+    def get_collection_etag():
+        """Returns an ETag value for listings of all areas with their capacity:
+        the global geometry version plus the capacity version (sum of the
+        versions of the capacity summary slots, bumped by every capacity
+        change). Reads 17 rows whatever the number of areas."""
+        geometry_version, capacity_version = db.session.execute(text("""
+            SELECT (SELECT geometry_version FROM parking_areas_state WHERE id = 1),
+                   (SELECT sum(capacity_version) FROM capacity_summary)
+        """)).one()
+        return f"{geometry_version}-{capacity_version}"
+
+    @staticmethod
+    def get_tile(z, x, y, extent=4096, buffer=64):
+        """Returns the Mapbox Vector Tile (bytes) of the areas in tile z/x/y:
+        an `areas` layer with the capacity and occupancy of every area."""
+        return db.session.execute(text("""
+            WITH tile AS (
+                SELECT pa.id, pa.name, pa.max_capacity, pa.residual_capacity,
+                       CASE WHEN pa.max_capacity = 0 THEN 0
+                           ELSE (pa.max_capacity - pa.residual_capacity)::float8 / pa.max_capacity * 100
+                       END AS occupancy_percentage,
+                       ST_AsMVTGeom(ST_Transform(pa.location_area, 3857), ST_TileEnvelope(:z, :x, :y),
+                                    :extent, :buffer) AS geom
+                FROM parking_areas pa
+                WHERE pa.location_area && ST_Transform(
+                    ST_TileEnvelope(:z, :x, :y, margin => CAST(:buffer AS float8) / :extent), 4326
+                )
+            )
+            SELECT ST_AsMVT(tile, 'areas', :extent, 'geom', 'id') FROM tile WHERE geom IS NOT NULL
+        """), {"z": z, "x": x, "y": y, "extent": extent, "buffer": buffer}).scalar()
+
+    @staticmethod
+    def get_tile_tag(z, x, y, extent=4096, buffer=64):
+        """Returns a version tag of tile z/x/y (as get_collection_etag, over
+        the areas of the tile only): the cached tiles whose tag differs are
+        outdated. Digests the capacities of the tile: cached per global
+        version (see TileCache.tag)."""
+        geometry_version, capacity_digest = db.session.execute(text("""
+            SELECT (SELECT geometry_version FROM parking_areas_state WHERE id = 1),
+                   md5(COALESCE(string_agg(id || ':' || residual_capacity, ',' ORDER BY id), ''))
+            FROM parking_areas
+            WHERE location_area && ST_Transform(
+                ST_TileEnvelope(:z, :x, :y, margin => CAST(:buffer AS float8) / :extent), 4326
+            )
+        """), {"z": z, "x": x, "y": y, "extent": extent, "buffer": buffer}).one()
+        return f"{geometry_version}-{capacity_digest}"
+
+    def get_etag(self):
+        """Returns an ETag value for the serializations of this area."""
+        return f"{self.geometry_version}-{self.residual_capacity}"
+
     def to_dict(self):
         """Converts the object to a dictionary for JSON responses."""
         return {
@@ -90,4 +401,70 @@ class ParkingArea(db.Model):
         }
 
     def __repr__(self):
-        return f"<ParkingArea {self.name}>"
\ No newline at end of file
+        return f"<ParkingArea {self.name}>"
+
+
+class ParkingAreaSimplifiedZoom(db.Model):
+    """Zoom levels with precomputed simplified polygons, and the tolerance
+    they are simplified with (the pixel size at the zoom, degrees).
+
+    Read by the parking_areas_simplified trigger and by the viewport
+    queries: after editing the levels, run `flask rebuild-simplified-areas`.
+    """
+    __tablename__ = 'parking_areas_simplified_zooms'
+
+    zoom = db.Column(db.SmallInteger, primary_key=True)
+    tolerance = db.Column(db.Float, nullable=False)
+
+    def __repr__(self):
+        return f"<ParkingAreaSimplifiedZoom {self.zoom}>"
+
+
+class ParkingAreaSimplified(db.Model):
+    """Polygons of the parking areas simplified for the zoom levels of
+    ParkingAreaSimplifiedZoom, so that viewport queries never simplify at
+    request time.
+
+    Rows are written by a database trigger whenever an area polygon is
+    inserted or changes, only for the zooms where simplifying drops vertices.
+    """
+    __tablename__ = 'parking_areas_simplified'
+
+    parking_area_id = db.Column(db.Integer, db.ForeignKey('parking_areas.id', ondelete='CASCADE'), primary_key=True)
+    zoom = db.Column(db.SmallInteger, primary_key=True)
+    location_area = db.Column(Geometry(geometry_type='POLYGON', srid=4326, spatial_index=False), nullable=False)
+
+    @staticmethod
+    def rebuild():
+        """Recomputes the simplified polygons of every area at the current
+        zoom levels. Does not commit."""
+        db.session.execute(text("DELETE FROM parking_areas_simplified"))
+        db.session.execute(text("""
+            INSERT INTO parking_areas_simplified (parking_area_id, zoom, location_area)
+            SELECT pa.id, z.zoom, simplified
+            FROM parking_areas pa,
+                 parking_areas_simplified_zooms z,
+                 LATERAL ST_SimplifyPreserveTopology(pa.location_area, z.tolerance) AS simplified
+            WHERE ST_NPoints(simplified) < ST_NPoints(pa.location_area)
+        """))
+
+    def __repr__(self):
+        return f"<ParkingAreaSimplified {self.parking_area_id} at zoom {self.zoom}>"
+
+
+class ParkingAreasState(db.Model):
+    """Single-row table with the global version of the parking areas geometry.
+
+    The version is bumped by a database trigger whenever an area is added,
+    deleted, or its name, polygon or max capacity changes.
+    """
+    __tablename__ = 'parking_areas_state'
+
+    id = db.Column(db.Integer, primary_key=True)
+    geometry_version = db.Column(db.BigInteger, nullable=False)
+
+    @staticmethod
+    def get_geometry_version():
+        return db.session.query(ParkingAreasState.geometry_version).filter(
+            ParkingAreasState.id == 1
+        ).scalar()
@@ -1,4 +1,5 @@
 from flaskr.extensions import db
+from sqlalchemy.dialects.postgresql import insert
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -12,14 +13,43 @@ class User(db.Model):
         self.username = username        
         self.created_at = created_at        
     
-    def register_user_if_not_exist(self):        
-        db_user = User.query.filter(User.username == self.username).all()
-        if not db_user:
-            db.session.add(self)
-            db.session.commit()
-        
-        return True
+    @staticmethod
+    def register(username, created_at):
+        """Inserts a user unless the username is taken, in a single
+        INSERT ... ON CONFLICT statement (no check-then-insert race).
+
+        Returns the (id, username, created_at) row of the new user, or None
+        if the username already exists. Does not commit.
+        """
+        return db.session.execute(
+            insert(User).values(username=username, created_at=created_at)
+            .on_conflict_do_nothing(index_elements=[User.username])
+            .returning(User.id, User.username, User.created_at)
+        ).first()
+    
+    @staticmethod
+    def get_usernames(user_ids):
+        """Returns {id: username} of the existing users among the given ids."""
+        if not user_ids:
+            return {}
+        return dict(db.session.execute(
+            db.select(User.id, User.username).where(User.id.in_(user_ids))
+        ).all())
     
+    @staticmethod
+    def get_page(limit, after_id=None):
+        """Returns the next `limit` users in id order, after `after_id` if given."""
+        query = User.query.order_by(User.id)
+        if after_id is not None:
+            query = query.filter(User.id > after_id)
+        return query.limit(limit).all()
+    
+    @staticmethod
+    def iter_all(chunk_size=1000):
+        """Iterates over all users in id order, fetching `chunk_size` rows
+        at a time from a server-side cursor."""
+        return User.query.order_by(User.id).yield_per(chunk_size)
+
     def get_by_username(username):        
         db_user = User.query.filter(User.username == username).first()
         return db_user
@@ -0,0 +1,201 @@
+import threading
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from psycopg import sql
+from sqlalchemy import text
+from flaskr.extensions import db
+from flaskr.services.metrics import Counter, Histogram, metrics
+
+# Parking sessions (PARK events, closed by their LEAVE, see
+# flaskr.services.sessions) as fixed-width rows of a binary COPY: area id,
+# start and end time (epoch seconds, NaN while open)
+SESSIONS_COPY_SQL = """
+    COPY (
+        SELECT parking_area_id,
+               extract(epoch FROM start_time)::float8,
+               COALESCE(extract(epoch FROM end_time)::float8, 'NaN')
+        FROM parking_events
+        WHERE type = 'PARK' AND start_time >= {start} AND start_time < {end}
+    ) TO STDOUT (FORMAT BINARY)
+"""
+
+# Signature, flags and header extension length of the binary COPY format
+COPY_HEADER_SIZE = 19
+COPY_TRAILER_SIZE = 2
+# Field count, then (length, value) per field, in network byte order
+SESSION_ROW = np.dtype([
+    ("fields", ">i2"),
+    ("area_length", ">i4"), ("area", ">i4"),
+    ("start_length", ">i4"), ("start", ">f8"),
+    ("end_length", ">i4"), ("end", ">f8"),
+])
+
+# Upper bounds (seconds) of the computation duration histogram buckets
+COMPUTE_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def load_sessions(start, end):
+    """Returns the parking sessions started within [start, end) as NumPy
+    arrays (area ids, start and end epoch seconds, NaN end while open).
+
+    The rows are read with one binary COPY and decoded in a single
+    np.frombuffer over the whole payload, without a Python object per row.
+    """
+    connection = db.session.connection().connection.driver_connection
+    payload = bytearray()
+    with connection.cursor() as cursor:
+        query = sql.SQL(SESSIONS_COPY_SQL).format(start=sql.Literal(start), end=sql.Literal(end))
+        with cursor.copy(query) as copy:
+            for chunk in copy:
+                payload += chunk
+    if len(payload) <= COPY_HEADER_SIZE + COPY_TRAILER_SIZE:
+        rows = np.empty(0, dtype=SESSION_ROW)
+    else:
+        rows = np.frombuffer(payload, dtype=SESSION_ROW, offset=COPY_HEADER_SIZE,
+                             count=(len(payload) - COPY_HEADER_SIZE - COPY_TRAILER_SIZE) // SESSION_ROW.itemsize)
+    return rows["area"].astype(np.int64), rows["start"].astype(np.float64), rows["end"].astype(np.float64)
+
+
+def load_areas():
+    """Returns the area ids (sorted) and their max capacities as NumPy arrays."""
+    rows = db.session.execute(text("SELECT id, max_capacity FROM parking_areas ORDER BY id")).all()
+    area_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    capacities = np.fromiter((row[1] for row in rows), dtype=np.int64, count=len(rows))
+    return area_ids, capacities
+
+
+def _grouped_percentiles(groups, values, size, quantiles):
+    """Percentiles (linear interpolation, as np.percentile) of the values of
+    every group 0..size-1, in one sort; NaN for the empty groups.
+
+    The values (non-negative) are sorted within their group with a single
+    float sort of `group * span + value`: several times faster than a
+    lexsort of the two columns, exact as long as the keys fit in the 53 bits
+    of the mantissa (otherwise the lexsort is used).
+    """
+    counts = np.bincount(groups, minlength=size)
+    span = values.max() + 1.0 if values.size else 1.0
+    if size * span < 2.0 ** 53:
+        values = np.sort(groups * span + values) - np.repeat(np.arange(size) * span, counts)
+    else:
+        values = values[np.lexsort((values, groups))]
+    offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    nonempty = counts > 0
+    results = []
+    for q in quantiles:
+        position = (counts[nonempty] - 1) * q
+        low = np.floor(position).astype(np.int64)
+        high = np.ceil(position).astype(np.int64)
+        base = offsets[nonempty]
+        result = np.full(size, np.nan)
+        result[nonempty] = values[base + low] + (values[base + high] - values[base + low]) * (position - low)
+        results.append(result)
+    return results
+
+
+def compute_area_stats(area_ids, capacities, session_areas, starts, ends, days):
+    """Computes the statistics of every area in one vectorized pass.
+
+    `area_ids` are sorted, `capacities` aligned with them; the sessions are
+    given as (area id, start, end) arrays, `ends` NaN while open. Returns one
+    dict per area: sessions and closed sessions, median and p90 dwell time
+    (closed sessions, seconds), turnover (sessions per space per day) and
+    peak arrival hour (UTC, hour with the most sessions started).
+    """
+    size = len(area_ids)
+    # Sessions of unknown (deleted) areas are left out
+    index = np.searchsorted(area_ids, session_areas)
+    known = index < size
+    known[known] = area_ids[index[known]] == session_areas[known]
+    index, starts, ends = index[known], starts[known], ends[known]
+
+    sessions = np.bincount(index, minlength=size)
+    closed = ~np.isnan(ends)
+    closed_sessions = np.bincount(index[closed], minlength=size)
+    dwell = np.maximum(ends[closed] - starts[closed], 0.0)
+    median, p90 = _grouped_percentiles(index[closed], dwell, size, (0.5, 0.9))
+
+    hours = (starts // 3600 % 24).astype(np.int64)
+    arrivals = np.bincount(index * 24 + hours, minlength=size * 24).reshape(size, 24)
+    peak_hours = arrivals.argmax(axis=1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        turnover = np.where(capacities > 0, sessions / (capacities * days), np.nan)
+
+    def value(x):
+        return None if np.isnan(x) else float(x)
+
+    return [
+        {
+            "parking_area_id": int(area_ids[i]),
+            "sessions": int(sessions[i]),
+            "closed_sessions": int(closed_sessions[i]),
+            "dwell_median_seconds": value(median[i]),
+            "dwell_p90_seconds": value(p90[i]),
+            "turnover_per_day": value(turnover[i]),
+            "peak_arrival_hour": int(peak_hours[i]) if sessions[i] else None
+        }
+        for i in range(size)
+    ]
+
+
+class AreaStats:
+    """Per-worker cache of the area statistics, recomputed when older than
+    `ttl` seconds.
+
+    One computation runs at a time: the requests arriving meanwhile wait for
+    it instead of starting their own.
+    """
+
+    def __init__(self, ttl=300.0):
+        self.ttl = ttl
+        # days -> (monotonic time, statistics)
+        self._stats = {}
+        self._lock = threading.Lock()
+
+        self.lookups = Counter("bpm_area_stats_lookups_total", "Area statistics cache lookups.", ("result",))
+        self.compute_latency = Histogram("bpm_area_stats_compute_seconds", "Area statistics computation time.",
+                                         buckets=COMPUTE_BUCKETS)
+
+    def init_app(self, app):
+        self.ttl = app.config.get("AREA_STATS_TTL", self.ttl)
+        for metric in (self.lookups, self.compute_latency):
+            metrics.register(metric)
+
+    def get(self, days):
+        """Returns the statistics over the last `days` days."""
+        entry = self._stats.get(days)
+        if entry is not None and time.monotonic() - entry[0] < self.ttl:
+            self.lookups.inc("hit")
+            return entry[1]
+        with self._lock:
+            entry = self._stats.get(days)
+            if entry is not None and time.monotonic() - entry[0] < self.ttl:
+                self.lookups.inc("hit")
+                return entry[1]
+            self.lookups.inc("miss")
+            start = time.perf_counter()
+            stats = self.compute(days)
+            self.compute_latency.observe(time.perf_counter() - start)
+            self._stats[days] = (time.monotonic(), stats)
+            return stats
+
+    def compute(self, days, now=None):
+        end = now or datetime.utcnow()
+        start = end - timedelta(days=days)
+        area_ids, capacities = load_areas()
+        session_areas, starts, ends = load_sessions(start, end)
+        return {
+            "from": start.isoformat(),
+            "to": end.isoformat(),
+            "days": days,
+            "areas": compute_area_stats(area_ids, capacities, session_areas, starts, ends, days)
+        }
+
+    def clear(self):
+        with self._lock:
+            self._stats.clear()
+
+
+area_stats = AreaStats()
@@ -0,0 +1,182 @@
+import time
+from shapely.errors import ShapelyError
+from shapely.geometry import shape
+from sqlalchemy import text
+from flaskr.extensions import db
+from flaskr.models.events import EventType, parse_timestamp
+from flaskr.services.json_stream import iter_json_array
+from flaskr.services.partitions import ensure_event_partitions
+
+
+class ImportResult:
+    """Counters of an import, reported as rows per second."""
+
+    def __init__(self, label):
+        self.label = label
+        self.read = 0
+        self.invalid = 0
+        self.inserted = 0
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def done(self, inserted):
+        self.inserted = inserted
+        self.elapsed = time.perf_counter() - self.started
+        return self
+
+    @property
+    def skipped(self):
+        return self.read - self.invalid - self.inserted
+
+    @property
+    def rows_per_second(self):
+        return self.read / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        return (f"{self.label}: {self.inserted} added, {self.skipped} skipped, {self.invalid} invalid "
+                f"({self.read} read in {self.elapsed:.1f}s, {self.rows_per_second:,.0f} rows/s)")
+
+
+def _copy(table, columns, rows):
+    """Streams rows into a table with COPY, on the session's connection."""
+    conn = db.session.connection().connection.driver_connection
+    with conn.cursor() as cursor:
+        with cursor.copy(f"COPY {table} ({', '.join(columns)}) FROM STDIN") as copy:
+            for row in rows:
+                copy.write_row(row)
+
+
+def _stage(table, columns_sql, columns, rows):
+    # Dropped with the transaction, or by the next import of the same one
+    db.session.execute(text(f"DROP TABLE IF EXISTS {table}"))
+    db.session.execute(text(f"CREATE TEMP TABLE {table} ({columns_sql}) ON COMMIT DROP"))
+    _copy(table, columns, rows)
+    db.session.execute(text(f"ANALYZE {table}"))
+
+
+def _valid_rows(items, result, to_row):
+    for item in items:
+        result.read += 1
+        try:
+            row = to_row(item)
+        except (AttributeError, KeyError, TypeError, ValueError, ShapelyError):
+            result.invalid += 1
+            continue
+        yield row
+
+
+# ----------------------------------------------------------------------
+#                           USERS
+# ----------------------------------------------------------------------
+def _user_row(item):
+    username = item["username"]
+    if not isinstance(username, str) or not username:
+        raise ValueError("Invalid username")
+    return username, parse_timestamp(item["created_at"]).date()
+
+
+def import_users(fp):
+    """Imports a JSON array of users, skipping the existing usernames.
+    Does not commit."""
+    result = ImportResult("Users")
+    _stage("users_staging", "username TEXT, created_at DATE",
+           ["username", "created_at"], _valid_rows(iter_json_array(fp), result, _user_row))
+    inserted = db.session.execute(text("""
+        INSERT INTO users (username, created_at)
+        SELECT DISTINCT ON (username) username, created_at
+        FROM users_staging
+        ORDER BY username
+        ON CONFLICT (username) DO NOTHING
+    """)).rowcount
+    return result.done(inserted)
+
+
+# ----------------------------------------------------------------------
+#                           PARKING AREAS
+# ----------------------------------------------------------------------
+def _area_row(feature):
+    props = feature["properties"]
+    max_capacity = int(props["max_capacity"])
+    residual_capacity = int(props.get("residual_capacity", max_capacity))
+    if not props["name"] or not 0 <= residual_capacity <= max_capacity:
+        raise ValueError("Invalid parking area")
+    geometry = shape(feature["geometry"])
+    if geometry.geom_type != "Polygon":
+        raise ValueError("Parking areas must be polygons")
+    return props["name"], geometry.wkt, max_capacity, residual_capacity
+
+
+def import_parking_areas(fp):
+    """Imports a GeoJSON FeatureCollection of parking areas, skipping the
+    existing names. Does not commit."""
+    result = ImportResult("Parking Areas")
+    _stage("parking_areas_staging",
+           "name TEXT, geometry TEXT, max_capacity INTEGER, residual_capacity INTEGER",
+           ["name", "geometry", "max_capacity", "residual_capacity"],
+           _valid_rows(iter_json_array(fp, "features"), result, _area_row))
+    inserted = db.session.execute(text("""
+        INSERT INTO parking_areas (name, location_area, max_capacity, residual_capacity)
+        SELECT DISTINCT ON (name)
+               name, ST_GeomFromText(geometry, 4326), max_capacity, residual_capacity
+        FROM parking_areas_staging
+        ORDER BY name
+        ON CONFLICT (name) DO NOTHING
+    """)).rowcount
+    return result.done(inserted)
+
+
+# ----------------------------------------------------------------------
+#                           PARKING EVENTS
+# ----------------------------------------------------------------------
+# Database labels of the event types, by API value
+EVENT_TYPE_LABELS = {event_type.value: event_type.name for event_type in EventType}
+
+
+def _event_row(feature):
+    props = feature["properties"]
+    lon, lat = feature["geometry"]["coordinates"][:2]
+    end_time = props.get("end_time")
+    # Events without a type are parkings, as in the original dataset
+    return (
+        EVENT_TYPE_LABELS[props.get("type", EventType.PARK.value)],
+        float(lon),
+        float(lat),
+        int(props["user_id"]),
+        int(props["parking_area_id"]),
+        parse_timestamp(props["start_time"]),
+        parse_timestamp(end_time) if end_time else None
+    )
+
+
+def import_parking_events(fp):
+    """Imports a GeoJSON FeatureCollection of parking events.
+
+    Events already stored (same user, area, type and start time) or referencing
+    unknown users or areas are skipped. The monthly partitions the events
+    fall in are created first. Does not commit.
+    """
+    result = ImportResult("Events")
+    _stage("parking_events_staging",
+           "type TEXT, lon DOUBLE PRECISION, lat DOUBLE PRECISION, user_id INTEGER, "
+           "parking_area_id INTEGER, start_time TIMESTAMP, end_time TIMESTAMP",
+           ["type", "lon", "lat", "user_id", "parking_area_id", "start_time", "end_time"],
+           _valid_rows(iter_json_array(fp, "features"), result, _event_row))
+
+    first, last = db.session.execute(text(
+        "SELECT min(start_time), max(start_time) FROM parking_events_staging"
+    )).one()
+    if first is not None:
+        ensure_event_partitions(first, last)
+
+    inserted = db.session.execute(text("""
+        INSERT INTO parking_events (type, location_point, user_id, parking_area_id, start_time, end_time)
+        SELECT DISTINCT ON (s.user_id, s.parking_area_id, s.type, s.start_time)
+               s.type::eventtype, ST_SetSRID(ST_MakePoint(s.lon, s.lat), 4326),
+               s.user_id, s.parking_area_id, s.start_time, s.end_time
+        FROM parking_events_staging s
+        JOIN users u ON u.id = s.user_id
+        JOIN parking_areas a ON a.id = s.parking_area_id
+        ORDER BY s.user_id, s.parking_area_id, s.type, s.start_time
+        ON CONFLICT (user_id, parking_area_id, type, start_time) DO NOTHING
+    """)).rowcount
+    return result.done(inserted)
@@ -0,0 +1,210 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+import psycopg
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+from flaskr.extensions import db
+
+logger = logging.getLogger(__name__)
+
+# Channel notified by the trigger on parking_areas.residual_capacity
+CHANNEL = "capacity_changes"
+
+# Longest wait (seconds) for the listener to be LISTENing before a subscriber
+# is refused
+LISTEN_TIMEOUT = 5.0
+
+
+class Subscription:
+    """A client of the feed: a bounded asyncio queue of pending changes, fed
+    on the event loop of the client."""
+
+    def __init__(self, maxsize, loop):
+        self.queue = asyncio.Queue(maxsize)
+        self.loop = loop
+        self.closed = False
+
+
+class CapacityFeed:
+    """Per-worker fan-out of residual capacity changes to SSE clients, served
+    by the ASGI app (flaskr.asgi): a client is a queue on the event loop, not
+    a thread.
+
+    Changes come from one source per worker process:
+     - "postgres": a single listener thread LISTENing on the `capacity_changes`
+       channel, fed by a trigger on parking_areas (any writer, any worker);
+     - "memory": the changes made by this process' own park/leave paths,
+       published when their transaction commits (tests, single process).
+    Either way, changes are handed to the event loop of each subscriber with
+    call_soon_threadsafe.
+
+    A subscriber falling behind (or missing changes while the listener
+    reconnects) is closed; SSE clients reconnect automatically and start
+    again from a fresh snapshot.
+    """
+
+    def __init__(self):
+        self.backend = "postgres"
+        self.queue_size = 256
+        self.heartbeat = 15.0
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._listener = None
+        self._listening = threading.Event()
+        self._conninfo = None
+
+    def init_app(self, app):
+        self.backend = app.config.get("CAPACITY_FEED_BACKEND", self.backend)
+        self.queue_size = app.config.get("CAPACITY_FEED_QUEUE_SIZE", self.queue_size)
+        self.heartbeat = app.config.get("CAPACITY_FEED_HEARTBEAT", self.heartbeat)
+        self._conninfo = make_url(app.config["SQLALCHEMY_DATABASE_URI"]).set(
+            drivername="postgresql"
+        ).render_as_string(hide_password=False)
+        if self.backend == "memory":
+            event.listen(Session, "after_commit", self._publish_recorded)
+            event.listen(Session, "after_rollback", self._discard_recorded)
+
+    # ------------------------------------------------------------------
+    #                       SUBSCRIBERS
+    # ------------------------------------------------------------------
+    async def subscribe(self):
+        """Registers a new subscriber on the running event loop.
+
+        With the postgres source, returns once the listener is LISTENing, so
+        that a snapshot read afterwards misses no change. Raises TimeoutError
+        if it is not within LISTEN_TIMEOUT seconds.
+        """
+        if self.backend == "postgres":
+            self._ensure_listener()
+            if not self._listening.is_set():
+                # Brief wait in the default executor, only while (re)connecting
+                loop = asyncio.get_running_loop()
+                if not await loop.run_in_executor(None, self._listening.wait, LISTEN_TIMEOUT):
+                    raise TimeoutError("Capacity feed listener is not connected")
+        subscription = Subscription(self.queue_size, asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Closes a subscription (from any thread); its stream ends."""
+        with self._lock:
+            if subscription not in self._subscribers:
+                return
+            self._subscribers.discard(subscription)
+        try:
+            subscription.loop.call_soon_threadsafe(self._close, subscription)
+        except RuntimeError:
+            # Event loop already closed
+            subscription.closed = True
+
+    def publish(self, change):
+        """Fans a change out to every subscriber, without ever blocking
+        (callable from any thread)."""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(self._deliver, subscription, change)
+            except RuntimeError:
+                self.unsubscribe(subscription)
+
+    def _deliver(self, subscription, change):
+        # On the subscriber's event loop
+        if subscription.closed:
+            return
+        try:
+            subscription.queue.put_nowait(change)
+        except asyncio.QueueFull:
+            with self._lock:
+                self._subscribers.discard(subscription)
+            self._close(subscription)
+
+    @staticmethod
+    def _close(subscription):
+        # On the subscriber's event loop: wakes the stream up
+        subscription.closed = True
+        try:
+            subscription.queue.put_nowait(None)
+        except asyncio.QueueFull:
+            pass
+
+    async def stream(self, subscription, snapshot):
+        """Yields the server-sent events of a subscription: the snapshot of
+        all capacities first, then one `capacity` event per change."""
+        try:
+            yield f"retry: 1000\nevent: snapshot\ndata: {json.dumps(snapshot)}\n\n"
+            while not subscription.closed:
+                try:
+                    change = await asyncio.wait_for(subscription.queue.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if change is None or subscription.closed:
+                    break
+                yield f"event: capacity\ndata: {json.dumps(change)}\n\n"
+        finally:
+            self.unsubscribe(subscription)
+
+    def _close_all(self):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            self.unsubscribe(subscription)
+
+    # ------------------------------------------------------------------
+    #                       POSTGRES SOURCE
+    # ------------------------------------------------------------------
+    def _ensure_listener(self):
+        with self._lock:
+            if self._listener is not None and self._listener.is_alive():
+                return
+            self._listener = threading.Thread(target=self._listen, name="capacity-feed-listener", daemon=True)
+            self._listener.start()
+
+    def _listen(self):
+        while True:
+            try:
+                with psycopg.connect(self._conninfo, autocommit=True) as conn:
+                    conn.execute(f"LISTEN {CHANNEL}")
+                    self._listening.set()
+                    for notify in conn.notifies():
+                        try:
+                            change = json.loads(notify.payload)
+                        except ValueError:
+                            logger.error("Invalid capacity change notification %r", notify.payload)
+                            continue
+                        self.publish(change)
+            except psycopg.Error:
+                logger.exception("Capacity feed listener disconnected, reconnecting")
+            except Exception:
+                logger.exception("Capacity feed listener failed, restarting")
+            self._listening.clear()
+            # Changes may have been missed: make every client resync
+            self._close_all()
+            time.sleep(1)
+
+    # ------------------------------------------------------------------
+    #                       IN-PROCESS SOURCE
+    # ------------------------------------------------------------------
+    def _publish_recorded(self, session):
+        for change in session.info.pop("capacity_changes", []):
+            self.publish(change)
+
+    def _discard_recorded(self, session):
+        session.info.pop("capacity_changes", None)
+
+
+capacity_feed = CapacityFeed()
+
+
+def record_capacity_changes(changes):
+    """Records capacity changes made in the current transaction, published on
+    commit by the in-process feed. The postgres feed gets them from the
+    database trigger instead, so nothing is recorded in that mode."""
+    if capacity_feed.backend == "memory":
+        db.session.info.setdefault("capacity_changes", []).extend(changes)
@@ -0,0 +1,113 @@
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import Text, cast, func, select
+from flaskr.extensions import db
+from flaskr.models.events import ParkingEvent
+
+# Columns of the exports (locations as lon/lat, times in UTC)
+SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("type", pa.string()),
+    ("user_id", pa.int32()),
+    ("parking_area_id", pa.int32()),
+    ("start_time", pa.timestamp("us", tz="UTC")),
+    ("end_time", pa.timestamp("us", tz="UTC")),
+    ("longitude", pa.float64()),
+    ("latitude", pa.float64()),
+])
+
+FORMATS = ("parquet", "arrow")
+
+
+def iter_event_batches(start=None, end=None, batch_size=50000):
+    """Yields the events starting within [start, end) as Arrow record batches
+    of `batch_size` rows, in (start_time, id) order, read from a server-side
+    cursor: memory stays bounded by one batch whatever the size of the export."""
+    query = select(
+        ParkingEvent.id,
+        func.lower(cast(ParkingEvent.type, Text)),
+        ParkingEvent.user_id,
+        ParkingEvent.parking_area_id,
+        ParkingEvent.start_time,
+        ParkingEvent.end_time,
+        func.ST_X(ParkingEvent.location_point),
+        func.ST_Y(ParkingEvent.location_point)
+    ).order_by(ParkingEvent.start_time, ParkingEvent.id)
+    if start is not None:
+        query = query.where(ParkingEvent.start_time >= start)
+    if end is not None:
+        query = query.where(ParkingEvent.start_time < end)
+
+    result = db.session.execute(query, execution_options={"yield_per": batch_size})
+    for rows in result.partitions():
+        columns = zip(*rows)
+        yield pa.RecordBatch.from_arrays(
+            [pa.array(column, type=field.type) for column, field in zip(columns, SCHEMA)],
+            schema=SCHEMA
+        )
+
+
+def open_writer(sink, fmt, stream=False):
+    """Returns a writer of the events schema to `sink` (path or file).
+
+    Arrow exports use the IPC file format, or the IPC stream format if
+    `stream` (no footer to seek back to, for responses).
+    """
+    if fmt == "parquet":
+        return pq.ParquetWriter(sink, SCHEMA, compression="zstd")
+    if fmt == "arrow":
+        return pa.ipc.new_stream(sink, SCHEMA) if stream else pa.ipc.new_file(sink, SCHEMA)
+    raise ValueError(f"Unknown export format '{fmt}'. Must be one of: {', '.join(FORMATS)}")
+
+
+def export_events(path, fmt, start=None, end=None, batch_size=50000):
+    """Writes the events starting within [start, end) to a file; returns the
+    number of exported events."""
+    count = 0
+    with open_writer(path, fmt) as writer:
+        for batch in iter_event_batches(start, end, batch_size):
+            writer.write_batch(batch)
+            count += batch.num_rows
+    return count
+
+
+class _ChunkSink:
+    """Write-only file object keeping what a writer emits until drained."""
+
+    closed = False
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_events(fmt, start=None, end=None, batch_size=50000):
+    """Yields an export of the events starting within [start, end), as bytes
+    chunks, for streamed responses (one chunk per written batch)."""
+    sink = _ChunkSink()
+    writer = open_writer(sink, fmt, stream=True)
+    try:
+        for batch in iter_event_batches(start, end, batch_size):
+            writer.write_batch(batch)
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    finally:
+        writer.close()
+    yield sink.drain()
@@ -0,0 +1,230 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import Counter as Multiset
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from flaskr.extensions import db
+from flaskr.models.events import EventType, ParkingEvent
+from flaskr.models.parking_areas import ParkingArea
+from flaskr.services.metrics import Counter, Gauge, Histogram, metrics
+from flaskr.services.sessions import close_sessions
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the flushed batch size histogram buckets
+BATCH_BUCKETS = (1, 10, 50, 100, 250, 500, 1000, 5000)
+
+
+class EventBuffer:
+    """Write-behind buffer of the parking events (EVENTS_WRITE_BEHIND).
+
+    The request reserves the capacity (committed at once) and queues the
+    event row; a flusher thread inserts the queued rows in batches, every
+    `batch_size` rows or `flush_interval` seconds, with one multi-row INSERT
+    and one commit per batch instead of one per event.
+
+    The number of pending events is bounded by `max_pending` slots, taken
+    before any database work: when none is free the request is answered 429.
+    A batch failing on a database error is kept and retried with backoff;
+    when a row is invalid, the rows are flushed (and retried) one at a time
+    and the invalid ones dropped, their capacity restored. On shutdown
+    (interpreter exit) the buffer stops taking events and flushes the
+    pending ones. Events are only lost if the process dies abruptly.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.max_pending = 10000
+        self.batch_size = 500
+        self.flush_interval = 0.05
+        # Backoff (seconds) between the attempts of a failing flush
+        self.retry_delay = 0.1
+        self.max_retry_delay = 5.0
+        self._app = None
+        self._queue = queue.Queue()
+        self._slots = None
+        self._flusher = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+        self.flush_latency = Histogram("bpm_events_flush_duration_seconds", "Write-behind batch flush latency.")
+        self.batch_sizes = Histogram("bpm_events_flush_batch_size", "Events per write-behind batch.",
+                                     buckets=BATCH_BUCKETS)
+        self.rejected = Counter("bpm_events_rejected_total", "Events refused because the buffer was full.")
+        self.dropped = Counter("bpm_events_dropped_total",
+                               "Buffered events dropped as duplicates or invalid (capacity restored).")
+        self.flush_errors = Counter("bpm_events_flush_errors_total", "Failed write-behind flushes (retried).")
+
+    def init_app(self, app):
+        self.enabled = app.config.get("EVENTS_WRITE_BEHIND", self.enabled)
+        self.max_pending = app.config.get("EVENTS_BUFFER_MAX_PENDING", self.max_pending)
+        self.batch_size = app.config.get("EVENTS_FLUSH_BATCH_SIZE", self.batch_size)
+        self.flush_interval = app.config.get("EVENTS_FLUSH_INTERVAL", self.flush_interval)
+        self._app = app
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        for metric in (self.flush_latency, self.batch_sizes, self.rejected, self.dropped, self.flush_errors,
+                       Gauge("bpm_events_pending", "Events waiting in the write-behind buffer.",
+                             lambda: self._queue.qsize())):
+            metrics.register(metric)
+        if self.enabled:
+            atexit.register(self.close)
+
+    # ------------------------------------------------------------------
+    #                       PRODUCERS
+    # ------------------------------------------------------------------
+    def acquire_slot(self):
+        """Takes a pending event slot; False if the buffer is saturated."""
+        if self._closed or not self._slots.acquire(blocking=False):
+            self.rejected.inc()
+            return False
+        return True
+
+    def release_slot(self):
+        """Gives back a slot whose event was not queued."""
+        self._slots.release()
+
+    def put(self, row):
+        """Queues an event row (ParkingEvent column dict) for a held slot."""
+        self._ensure_flusher()
+        self._queue.put(row)
+
+    # ------------------------------------------------------------------
+    #                       FLUSHER
+    # ------------------------------------------------------------------
+    def _ensure_flusher(self):
+        with self._lock:
+            if self._flusher is None or not self._flusher.is_alive():
+                self._flusher = threading.Thread(target=self._run, name="event-buffer-flusher", daemon=True)
+                self._flusher.start()
+
+    def _next_batch(self):
+        try:
+            batch = [self._queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not (self._closed and self._queue.empty()):
+            batch = self._next_batch()
+            if not batch:
+                continue
+            try:
+                try:
+                    self._retry(self.flush, batch)
+                except IntegrityError:
+                    # Some row is invalid (e.g. its user was deleted meanwhile)
+                    self._flush_each(batch)
+            except Exception:
+                # Not a database error: the thread keeps serving the next batches
+                logger.exception("Write-behind flush of %d events failed, events lost", len(batch))
+            finally:
+                for _ in batch:
+                    self._slots.release()
+
+    def _retry(self, write, rows):
+        """Runs write(rows) until it succeeds, backing off on database errors.
+
+        Integrity errors are raised: retrying the same rows cannot succeed.
+        """
+        delay = self.retry_delay
+        while True:
+            try:
+                return write(rows)
+            except IntegrityError:
+                raise
+            except SQLAlchemyError:
+                self.flush_errors.inc()
+                logger.exception("Write-behind flush of %d events failed, retrying", len(rows))
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+
+    def flush(self, batch):
+        """Inserts a batch of event rows in one statement and commits.
+
+        Duplicates of already stored events are skipped, and the capacity
+        they reserved is given back. The inserted leaves close their sessions.
+        """
+        start = time.perf_counter()
+        with self._app.app_context():
+            try:
+                inserted = db.session.execute(
+                    insert(ParkingEvent).on_conflict_do_nothing().returning(
+                        ParkingEvent.user_id, ParkingEvent.parking_area_id, ParkingEvent.type,
+                        ParkingEvent.start_time
+                    ),
+                    batch
+                ).all()
+                # Rows not returned were skipped as duplicates
+                not_inserted = Multiset(_key(row) for row in batch)
+                not_inserted.subtract(tuple(row) for row in inserted)
+                duplicates = []
+                for row in batch:
+                    if not_inserted[_key(row)] > 0:
+                        not_inserted[_key(row)] -= 1
+                        duplicates.append(row)
+                if duplicates:
+                    self._restore_capacity(duplicates)
+                # The leaves close the sessions of their parks
+                close_sessions([
+                    {"user_id": user_id, "parking_area_id": area_id, "start_time": start_time}
+                    for user_id, area_id, event_type, start_time in inserted if event_type == EventType.LEAVE
+                ])
+                db.session.commit()
+            except SQLAlchemyError:
+                db.session.rollback()
+                raise
+        self.flush_latency.observe(time.perf_counter() - start)
+        self.batch_sizes.observe(len(batch))
+
+    def _flush_each(self, batch):
+        for row in batch:
+            try:
+                self._retry(self.flush, [row])
+            except IntegrityError:
+                logger.exception("Dropping invalid buffered event %r", _key(row))
+                self._retry(self._drop, [row])
+
+    def _drop(self, rows):
+        """Gives back the capacity reserved by rows that cannot be inserted."""
+        with self._app.app_context():
+            try:
+                self._restore_capacity(rows)
+                db.session.commit()
+            except SQLAlchemyError:
+                db.session.rollback()
+                raise
+
+    def _restore_capacity(self, rows):
+        ParkingArea.apply_capacity_changes([
+            (row["parking_area_id"], 1 if row["type"] == EventType.PARK else -1) for row in rows
+        ])
+        self.dropped.inc(amount=len(rows))
+
+    def close(self, timeout=30.0):
+        """Stops taking events and waits for the pending ones to be flushed."""
+        self._closed = True
+        flusher = self._flusher
+        if flusher is not None:
+            flusher.join(timeout)
+        if not self._queue.empty():
+            logger.error("Write-behind buffer closed with %d events not flushed", self._queue.qsize())
+
+
+def _key(row):
+    return row["user_id"], row["parking_area_id"], row["type"], row["start_time"]
+
+
+event_buffer = EventBuffer()
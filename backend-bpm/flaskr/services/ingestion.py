@@ -0,0 +1,178 @@
+from datetime import datetime
+from psycopg.errors import ForeignKeyViolation, UniqueViolation
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+from sqlalchemy.engine import make_url
+from flaskr.models.events import EventType
+from flaskr.models.parking_areas import GEOJSON_MAX_DIGITS
+from flaskr.services.capacity_feed import capacity_feed
+from flaskr.services.sessions import open_sessions
+
+# Resolves the area (lowest id among the areas containing the point, as the
+# sync path), checks the user, applies the capacity change if it keeps the
+# residual capacity within [0, max_capacity] and inserts the event (the sync
+# route's checks, in the same order): a single statement, hence
+# a single round trip, atomic on its own. A LEAVE also closes the latest open
+# session (PARK event) of the user in the area, as flaskr.services.sessions.
+RECORD_EVENT_SQL = f"""
+    WITH area AS (
+        SELECT id FROM parking_areas
+        WHERE ST_Contains(location_area, ST_SetSRID(ST_MakePoint(%(lon)s, %(lat)s), 4326))
+        ORDER BY id
+        LIMIT 1
+    ), usr AS (
+        SELECT id FROM users WHERE id = %(user_id)s
+    ), updated AS (
+        UPDATE parking_areas pa
+        SET residual_capacity = pa.residual_capacity + %(delta)s
+        FROM area
+        WHERE pa.id = area.id AND EXISTS (SELECT 1 FROM usr)
+          AND pa.residual_capacity + %(delta)s BETWEEN 0 AND pa.max_capacity
+        RETURNING pa.id, pa.name, pa.max_capacity, pa.residual_capacity,
+                  ST_AsGeoJSON(pa.location_area, {GEOJSON_MAX_DIGITS})::json AS location_area
+    ), inserted AS (
+        INSERT INTO parking_events (type, location_point, user_id, parking_area_id, start_time)
+        SELECT %(type)s::eventtype, ST_SetSRID(ST_MakePoint(%(lon)s, %(lat)s), 4326),
+               %(user_id)s, updated.id, %(start_time)s
+        FROM updated
+        RETURNING id
+    ), closed AS (
+        UPDATE parking_events p SET end_time = %(start_time)s
+        FROM (
+            SELECT pe.id, pe.start_time FROM parking_events pe, updated
+            WHERE %(type)s = 'LEAVE' AND EXISTS (SELECT 1 FROM inserted)
+              AND pe.user_id = %(user_id)s AND pe.parking_area_id = updated.id
+              AND pe.type = 'PARK' AND pe.end_time IS NULL AND pe.start_time <= %(start_time)s
+            ORDER BY pe.start_time DESC
+            LIMIT 1
+        ) o
+        WHERE p.id = o.id AND p.start_time = o.start_time AND p.end_time IS NULL
+    )
+    SELECT (SELECT id FROM area) AS area_id, EXISTS (SELECT 1 FROM usr) AS user_exists,
+           (SELECT id FROM inserted) AS event_id, updated.*
+    FROM (SELECT 1) AS one
+    LEFT JOIN updated ON true
+"""
+
+
+class AsyncIngestion:
+    """Asyncio implementation of POST /events/parking over an async psycopg
+    pool (see flaskr.asgi). Writes synchronously: with EVENTS_WRITE_BEHIND,
+    the route is left to the Flask app."""
+
+    def __init__(self):
+        self.pool = None
+        self.min_size = 2
+        self.max_size = 20
+
+    def init_app(self, app):
+        self.min_size = app.config.get("ASYNC_DB_POOL_MIN_SIZE", self.min_size)
+        self.max_size = app.config.get("ASYNC_DB_POOL_MAX_SIZE", self.max_size)
+        self.conninfo = make_url(app.config["SQLALCHEMY_DATABASE_URI"]).set(
+            drivername="postgresql"
+        ).render_as_string(hide_password=False)
+
+    async def open(self):
+        self.pool = AsyncConnectionPool(
+            self.conninfo, min_size=self.min_size, max_size=self.max_size,
+            kwargs={"autocommit": True, "row_factory": dict_row}, open=False
+        )
+        await self.pool.open()
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    async def get_capacities(self):
+        """Returns the capacity of all parking areas, as
+        ParkingArea.get_capacities()."""
+        async with self.pool.connection() as conn:
+            cursor = await conn.execute(
+                "SELECT id, max_capacity, residual_capacity FROM parking_areas ORDER BY id"
+            )
+            rows = await cursor.fetchall()
+        return [{
+            "id": row["id"],
+            "max_capacity": row["max_capacity"],
+            "residual_capacity": row["residual_capacity"],
+            "occupancy_percentage": ((row["max_capacity"] - row["residual_capacity"]) / row["max_capacity"] * 100)
+                                    if row["max_capacity"] else 0
+        } for row in rows]
+
+    async def record_parking_event(self, fields):
+        """Records a validated parking event (see parse_event_payload).
+
+        Returns (status, body) with the same responses as the sync route.
+        """
+        event_type = fields["type"]
+        start_time = fields["start_time"] or datetime.utcnow()
+        params = {
+            "lon": fields["longitude"],
+            "lat": fields["latitude"],
+            "delta": -1 if event_type == EventType.PARK else 1,
+            "type": event_type.name,
+            "user_id": fields["user_id"],
+            "start_time": start_time
+        }
+        try:
+            async with self.pool.connection() as conn:
+                cursor = await conn.execute(RECORD_EVENT_SQL, params)
+                row = await cursor.fetchone()
+        except ForeignKeyViolation:
+            # User deleted concurrently
+            return 400, {"error": "User not found"}
+        except UniqueViolation:
+            return 409, {"error": "Event already recorded"}
+
+        if row["area_id"] is None:
+            return 400, {"error": "Location is not within any parking area"}
+        if not row["user_exists"]:
+            return 400, {"error": "User not found"}
+        if row["event_id"] is None:
+            if event_type == EventType.PARK:
+                return 400, {"error": "Parking area is full"}
+            return 400, {"error": "Parking area is already empty"}
+
+        capacity_change = {
+            "id": row["id"],
+            "residual_capacity": row["residual_capacity"],
+            "max_capacity": row["max_capacity"],
+            "delta": params["delta"]
+        }
+        # The postgres feed gets the change from the database trigger
+        if capacity_feed.backend == "memory":
+            capacity_feed.publish(capacity_change)
+        # As the sync route: the PARK is the open session of the user in the
+        # area, closed (in the statement above) by a LEAVE
+        if event_type == EventType.PARK:
+            open_sessions.add(fields["user_id"], row["id"], row["event_id"], start_time)
+        else:
+            open_sessions.pop(fields["user_id"], row["id"])
+
+        max_capacity = row["max_capacity"]
+        residual_capacity = row["residual_capacity"]
+        return 201, {
+            "message": f"Bicycle {event_type.value} event recorded successfully",
+            "event": {
+                "id": row["event_id"],
+                "start_time": start_time.isoformat(),
+                "end_time": None,
+                "type": event_type.value,
+                "location_point": {"type": "Point", "coordinates": [fields["longitude"], fields["latitude"]]},
+                "user_id": fields["user_id"],
+                "parking_area_id": row["id"]
+            },
+            "parking_area": {
+                "id": row["id"],
+                "name": row["name"],
+                "location_area": row["location_area"],
+                "max_capacity": max_capacity,
+                "residual_capacity": residual_capacity,
+                "occupancy_percentage": ((max_capacity - residual_capacity) / max_capacity * 100)
+                if max_capacity else 0
+            }
+        }
+
+
+async_ingestion = AsyncIngestion()
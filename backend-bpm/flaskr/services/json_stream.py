@@ -0,0 +1,100 @@
+import json
+import re
+
+READ_SIZE = 1 << 20
+
+WHITESPACE = re.compile(r"\s*")
+# Characters a number can still continue with (e.g. "-7" then ".5e10")
+NUMBER_TAIL = re.compile(r"[0-9.eE+-]*")
+
+
+class _Reader:
+    """Buffered reader of a JSON text, decoding one value at a time."""
+
+    def __init__(self, fp, read_size):
+        self.fp = fp
+        self.read_size = read_size
+        self.decoder = json.JSONDecoder()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        data = self.fp.read(self.read_size)
+        if not data:
+            self.eof = True
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+
+    def peek(self):
+        """Returns the next non-whitespace character ('' at the end)."""
+        while True:
+            self.pos = WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf) or self.eof:
+                return self.buf[self.pos:self.pos + 1]
+            self._fill()
+
+    def expect(self, chars):
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError(f"Expected one of {chars!r}, found {char!r}")
+        self.pos += 1
+        return char
+
+    def decode(self):
+        """Decodes the next value, reading more of the file as needed."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                self._fill()
+                continue
+            # A number cut by the end of the buffer (possibly at its "." or
+            # exponent, which raw_decode stops before) may continue in the
+            # next read
+            if (not self.eof and isinstance(value, (int, float)) and not isinstance(value, bool)
+                    and NUMBER_TAIL.fullmatch(self.buf, end)):
+                self._fill()
+                continue
+            self.pos = end
+            return value
+
+
+def _iter_array(reader):
+    reader.expect("[")
+    if reader.peek() == "]":
+        reader.pos += 1
+        return
+    while True:
+        yield reader.decode()
+        if reader.expect(",]") == "]":
+            return
+
+
+def iter_json_array(fp, key=None, read_size=READ_SIZE):
+    """Iterates over the items of a JSON array without loading the document.
+
+    The array is either the whole document or, with `key`, the value of that
+    top-level key of an object (e.g. "features" of a FeatureCollection).
+    Only one item at a time is held in memory.
+    """
+    reader = _Reader(fp, read_size)
+    if key is None:
+        yield from _iter_array(reader)
+        return
+
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+    while True:
+        name = reader.decode()
+        reader.expect(":")
+        if name == key:
+            yield from _iter_array(reader)
+        else:
+            reader.decode()
+        if reader.expect(",}") == "}":
+            return
@@ -0,0 +1,215 @@
+import bisect
+import threading
+import time
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Upper bounds of the statements per request histogram buckets
+STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 500)
+
+
+def _labels_text(names, values):
+    return ",".join(f'{name}="{value}"' for name, value in zip(names, values))
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            lines.append(f"{self.name}{{{_labels_text(self.labels, label_values)}}} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [per bucket counts (+Inf last), sum, count]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            values = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items())
+        for label_values, (counts, total, count) in values:
+            labels = _labels_text(self.labels, label_values)
+            prefix = f"{labels}," if labels else ""
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{labels}}} {total}")
+            lines.append(f"{self.name}_count{{{labels}}} {count}")
+        return lines
+
+
+class Gauge:
+    """A value read from `read()` when the metrics are scraped."""
+
+    def __init__(self, name, help, read):
+        self.name = name
+        self.help = help
+        self.read = read
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {self.read()}"]
+
+
+class Metrics:
+    """Per-process request, SQL and connection pool instrumentation.
+
+    Every request gets a `Server-Timing` header (total, database and
+    application time, statement count). The Prometheus metrics are labelled
+    by endpoint (the blueprint route, not the URL, to bound their
+    cardinality) and exposed by GET /metrics. With several workers, each
+    process exposes its own metrics.
+
+    Streamed responses are timed up to their first byte: the statements run
+    while streaming are counted in the metrics, not in the header.
+    """
+
+    def __init__(self):
+        self.requests = Counter("bpm_http_requests_total", "HTTP requests.", ("endpoint", "method", "status"))
+        self.latency = Histogram("bpm_http_request_duration_seconds", "HTTP request latency.",
+                                 ("endpoint", "method"))
+        self.statements = Counter("bpm_db_statements_total", "SQL statements executed.", ("endpoint",))
+        self.db_time = Counter("bpm_db_time_seconds_total", "Time spent executing SQL statements.", ("endpoint",))
+        self.statements_per_request = Histogram("bpm_db_statements_per_request", "SQL statements per request.",
+                                                ("endpoint",), STATEMENT_BUCKETS)
+        self.pool_wait = Histogram("bpm_db_pool_checkout_wait_seconds",
+                                   "Time waited for a connection from the pool.")
+        # Metrics of the other services
+        self._registered = []
+
+    def init_app(self, app):
+        """Must be called before db.init_app, which creates the engine."""
+        app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", {}).setdefault("poolclass", TimedQueuePool)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        event.listen(Engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", self._after_cursor_execute)
+        event.listen(Engine, "handle_error", self._handle_error)
+
+    # ------------------------------------------------------------------
+    #                       HOOKS
+    # ------------------------------------------------------------------
+    def _before_request(self):
+        g.metrics_start = time.perf_counter()
+        g.db_statements = 0
+        g.db_time = 0.0
+
+    def _after_request(self, response):
+        start = g.get("metrics_start")
+        if start is None:
+            return response
+        total = time.perf_counter() - start
+        endpoint = request.endpoint or "unmatched"
+        db_time = g.db_time
+
+        self.requests.inc(endpoint, request.method, response.status_code)
+        self.latency.observe(total, endpoint, request.method)
+        self.statements_per_request.observe(g.db_statements, endpoint)
+
+        response.headers.add("Server-Timing", ", ".join([
+            f'db;dur={db_time * 1000:.2f};desc="{g.db_statements} statements"',
+            f"app;dur={(total - db_time) * 1000:.2f}",
+            f"total;dur={total * 1000:.2f}"
+        ]))
+        return response
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_start", []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["metrics_start"].pop()
+        if has_request_context():
+            endpoint = request.endpoint or "unmatched"
+            if "db_statements" in g:
+                g.db_statements += 1
+                g.db_time += elapsed
+        else:
+            endpoint = "none"
+        self.statements.inc(endpoint)
+        self.db_time.inc(endpoint, amount=elapsed)
+
+    def _handle_error(self, exception_context):
+        # The failed statement never reaches after_cursor_execute
+        connection = exception_context.connection
+        if connection is not None and connection.info.get("metrics_start"):
+            connection.info["metrics_start"].pop()
+
+    def register(self, metric):
+        """Adds a Counter, Histogram or Gauge to the exposed metrics."""
+        if all(registered.name != metric.name for registered in self._registered):
+            self._registered.append(metric)
+
+    def observe_pool_wait(self, seconds):
+        self.pool_wait.observe(seconds)
+
+    # ------------------------------------------------------------------
+    #                       EXPOSITION
+    # ------------------------------------------------------------------
+    def render(self, pool=None):
+        """Returns the metrics in the Prometheus text format."""
+        lines = []
+        for metric in (self.requests, self.latency, self.statements, self.db_time,
+                       self.statements_per_request, self.pool_wait, *self._registered):
+            lines.extend(metric.render())
+        if isinstance(pool, QueuePool):
+            lines.extend([
+                "# HELP bpm_db_pool_size Connections kept by the pool.",
+                "# TYPE bpm_db_pool_size gauge",
+                f"bpm_db_pool_size {pool.size()}",
+                "# HELP bpm_db_pool_checked_out Connections currently in use.",
+                "# TYPE bpm_db_pool_checked_out gauge",
+                f"bpm_db_pool_checked_out {pool.checkedout()}",
+                "# HELP bpm_db_pool_overflow Connections opened beyond the pool size.",
+                "# TYPE bpm_db_pool_overflow gauge",
+                f"bpm_db_pool_overflow {max(pool.overflow(), 0)}"
+            ])
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool recording how long each checkout waited for a connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.observe_pool_wait(time.perf_counter() - start)
@@ -0,0 +1,267 @@
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from itertools import groupby
+from sqlalchemy import func, insert, text
+from sqlalchemy.exc import SQLAlchemyError
+from flaskr.extensions import db
+from flaskr.models.events import ParkingEvent, EventType
+from flaskr.models.occupancy import OccupancyHourly, OccupancyRollupState
+from flaskr.services.metrics import Counter, Histogram, metrics
+
+logger = logging.getLogger(__name__)
+
+HOUR = timedelta(hours=1)
+
+# pg advisory lock key serializing the refreshes across workers
+REFRESH_LOCK_KEY = 0x0CC0_0001
+
+# Parking intervals overlapping [:lowest_from, :now), in three index range
+# scans instead of a sweep of the whole history: the intervals starting in
+# the range, and the older ones still open at its start, either not closed
+# yet (ix_parking_events_open_sessions) or closed later (ix_parking_events_park_end_time).
+# The literal predicates match the partial indexes.
+INTERVALS_SQL = """
+    SELECT parking_area_id, start_time, end_time FROM (
+        SELECT parking_area_id, start_time, end_time FROM parking_events
+        WHERE type = 'PARK' AND start_time >= :lowest_from AND start_time < :now
+        UNION ALL
+        SELECT parking_area_id, start_time, end_time FROM parking_events
+        WHERE type = 'PARK' AND end_time IS NULL AND start_time < :lowest_from
+        UNION ALL
+        SELECT parking_area_id, start_time, end_time FROM parking_events
+        WHERE type = 'PARK' AND end_time > :lowest_from AND start_time < :lowest_from
+    ) intervals
+    ORDER BY parking_area_id
+"""
+
+
+def floor_hour(t):
+    return t.replace(minute=0, second=0, microsecond=0)
+
+
+# ----------------------------------------------------------------------
+#                           SWEEP LINE
+# ----------------------------------------------------------------------
+def sweep_hourly(intervals, start_hour, now):
+    """Computes the hourly occupancy of one area from its parking intervals.
+
+    `intervals` are (start, end) pairs, `end` being None while the bicycle is
+    still parked. Intervals starting before `start_hour` only contribute to
+    the initial level. Returns the rows of every hour bucket in
+    [start_hour, now) with some occupancy or activity; the current (partial)
+    hour is averaged over its elapsed part only.
+    """
+    level = 0
+    changes = []
+    for start, end in intervals:
+        if end is not None and (end <= start or end <= start_hour):
+            continue
+        if start < start_hour:
+            level += 1
+        elif start < now:
+            changes.append((start, 1))
+        else:
+            continue
+        if end is not None and end < now:
+            changes.append((end, -1))
+    # At equal times departures come first, so a swap does not inflate the peak
+    changes.sort()
+
+    rows = []
+    i = 0
+    bucket = start_hour
+    while bucket < now:
+        bucket_end = min(bucket + HOUR, now)
+
+        # Skip the idle hours up to the next change
+        if level == 0 and (i == len(changes) or changes[i][0] >= bucket_end):
+            if i == len(changes):
+                break
+            bucket = floor_hour(changes[i][0])
+            continue
+
+        t = bucket
+        occupied_seconds = 0.0
+        peak = level
+        arrivals = departures = 0
+        while i < len(changes) and changes[i][0] < bucket_end:
+            at, delta = changes[i]
+            occupied_seconds += level * (at - t).total_seconds()
+            t = at
+            level += delta
+            peak = max(peak, level)
+            if delta > 0:
+                arrivals += 1
+            else:
+                departures += 1
+            i += 1
+        occupied_seconds += level * (bucket_end - t).total_seconds()
+
+        rows.append({
+            "bucket_start": bucket,
+            "avg_occupied": occupied_seconds / (bucket_end - bucket).total_seconds(),
+            "peak_occupied": peak,
+            "arrivals": arrivals,
+            "departures": departures
+        })
+        bucket += HOUR
+    return rows
+
+
+# ----------------------------------------------------------------------
+#                           INCREMENTAL REFRESH
+# ----------------------------------------------------------------------
+def refresh_occupancy_rollups(now=None):
+    """Brings the hourly rollups up to date with the parking events.
+
+    Every area is recomputed from the hour of the previous refresh (its
+    bucket was partial, and recent intervals may have opened or closed since):
+    only the intervals overlapping the recomputed hours are read, through
+    the indexes (see INTERVALS_SQL).
+    Areas with events inserted or closed since the previous refresh but
+    starting earlier (backfills, late departures, detected through their
+    change_xid) are recomputed from the hour of their oldest changed event.
+    The first refresh rebuilds everything.
+
+    Does not commit. Returns False without doing anything if another worker
+    is refreshing at the same time.
+    """
+    if not db.session.execute(text("SELECT pg_try_advisory_xact_lock(:key)"),
+                              {"key": REFRESH_LOCK_KEY}).scalar():
+        return False
+
+    now = now or datetime.utcnow()
+    state = OccupancyRollupState.get()
+    horizon = ParkingEvent.change_horizon()
+
+    window_start = floor_hour(state.refreshed_at) if state.refreshed_at else floor_hour(now)
+
+    # Oldest start hour of the changed parking intervals, per area (all of
+    # them on the first refresh)
+    changed_events = db.session.query(
+        ParkingEvent.parking_area_id, func.min(ParkingEvent.start_time)
+    ).filter(ParkingEvent.type == EventType.PARK)
+    if state.refreshed_at is not None:
+        changed_events = changed_events.filter(ParkingEvent.change_xid >= state.change_horizon)
+    area_from = {}
+    for area_id, oldest_start in changed_events.group_by(ParkingEvent.parking_area_id):
+        area_from[area_id] = min(floor_hour(oldest_start), window_start)
+    lowest_from = min(area_from.values(), default=window_start)
+
+    # Drop the buckets about to be recomputed
+    db.session.query(OccupancyHourly).filter(
+        OccupancyHourly.bucket_start >= window_start
+    ).delete(synchronize_session=False)
+    for area_id, from_hour in area_from.items():
+        if from_hour < window_start:
+            db.session.query(OccupancyHourly).filter(
+                OccupancyHourly.parking_area_id == area_id,
+                OccupancyHourly.bucket_start >= from_hour
+            ).delete(synchronize_session=False)
+
+    # Sweep the intervals overlapping the recomputed ranges, one area at a time
+    intervals = db.session.execute(
+        text(INTERVALS_SQL), {"lowest_from": lowest_from, "now": now},
+        execution_options={"yield_per": 10000}
+    )
+
+    rows = []
+    for area_id, area_intervals in groupby(intervals, key=lambda row: row.parking_area_id):
+        from_hour = area_from.get(area_id, window_start)
+        for row in sweep_hourly([(r.start_time, r.end_time) for r in area_intervals], from_hour, now):
+            row["parking_area_id"] = area_id
+            rows.append(row)
+    if rows:
+        db.session.execute(insert(OccupancyHourly), rows)
+
+    state.change_horizon = horizon
+    state.refreshed_at = now
+    return True
+
+
+class OccupancyRefresher:
+    """Background thread refreshing the rollups every `interval` seconds, so
+    that no request waits for a refresh.
+
+    Every worker runs one (started by its first request); the advisory lock
+    of refresh_occupancy_rollups lets a single one refresh at a time. With an
+    interval of 0 nothing runs in the app: schedule `flask refresh-occupancy`
+    instead.
+    """
+
+    def __init__(self, interval=60.0):
+        self.interval = interval
+        self._app = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+        self.latency = Histogram("bpm_occupancy_refresh_duration_seconds", "Occupancy rollup refresh time.")
+        self.errors = Counter("bpm_occupancy_refresh_errors_total", "Failed occupancy rollup refreshes.")
+
+    def init_app(self, app):
+        self.interval = app.config.get("OCCUPANCY_REFRESH_INTERVAL", self.interval)
+        self._app = app
+        for metric in (self.latency, self.errors):
+            metrics.register(metric)
+        if self.interval > 0:
+            app.before_request(self._ensure_started)
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="occupancy-refresher", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            start = time.perf_counter()
+            with self._app.app_context():
+                try:
+                    if refresh_occupancy_rollups():
+                        db.session.commit()
+                        self.latency.observe(time.perf_counter() - start)
+                except SQLAlchemyError:
+                    db.session.rollback()
+                    self.errors.inc()
+                    logger.exception("Occupancy rollup refresh failed")
+            time.sleep(self.interval)
+
+
+occupancy_refresher = OccupancyRefresher()
+
+
+def get_occupancy_series(parking_area_id, start, end, bucket="hour"):
+    """Returns the occupancy series of an area over [start, end) by hour or
+    day buckets, missing (idle) hours filled with zeros."""
+    stored = {row.bucket_start: row for row in OccupancyHourly.get_range(parking_area_id, start, end)}
+
+    hours = []
+    hour = floor_hour(start)
+    while hour < end:
+        row = stored.get(hour)
+        hours.append(row.to_dict() if row else {
+            "bucket_start": hour.isoformat(),
+            "avg_occupied": 0.0,
+            "peak_occupied": 0,
+            "arrivals": 0,
+            "departures": 0
+        })
+        hour += HOUR
+    if bucket == "hour":
+        return hours
+
+    days = []
+    for day, day_hours in groupby(hours, key=lambda h: h["bucket_start"][:10]):
+        day_hours = list(day_hours)
+        days.append({
+            "bucket_start": f"{day}T00:00:00",
+            "avg_occupied": sum(h["avg_occupied"] for h in day_hours) / len(day_hours),
+            "peak_occupied": max(h["peak_occupied"] for h in day_hours),
+            "arrivals": sum(h["arrivals"] for h in day_hours),
+            "departures": sum(h["departures"] for h in day_hours)
+        })
+    return days
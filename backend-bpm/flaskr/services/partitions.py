@@ -0,0 +1,79 @@
+from datetime import date
+from sqlalchemy import text
+from flaskr.extensions import db
+
+# Rows outside of every monthly partition land here
+DEFAULT_PARTITION = "parking_events_default"
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def next_month(value):
+    return date(value.year + value.month // 12, value.month % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"parking_events_y{month.year:04d}m{month.month:02d}"
+
+
+def ensure_event_partitions(first_month, last_month):
+    """Creates the monthly partitions of parking_events from the month of
+    `first_month` to the month of `last_month` (included) that do not exist.
+
+    Rows of a new month that already fell in the default partition are moved
+    into the new partition. Does not commit. Returns the created partitions.
+    """
+    existing = set(db.session.execute(text("""
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = 'parking_events'
+    """)).scalars())
+
+    created = []
+    month = month_start(first_month)
+    while month <= month_start(last_month):
+        name = partition_name(month)
+        if name not in existing:
+            _create_partition(name, month, next_month(month))
+            created.append(name)
+        month = next_month(month)
+    return created
+
+
+def _create_partition(name, start, end):
+    bounds = {"start": start, "end": end}
+    misplaced = db.session.execute(text(f"""
+        SELECT EXISTS (
+            SELECT 1 FROM {DEFAULT_PARTITION}
+            WHERE start_time >= :start AND start_time < :end
+        )
+    """), bounds).scalar()
+
+    if not misplaced:
+        db.session.execute(text(f"""
+            CREATE TABLE {name} PARTITION OF parking_events
+            FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')
+        """))
+        return
+
+    # Attaching a partition fails while the default one holds rows of its
+    # range: build the partition apart, move the rows, then attach it.
+    db.session.execute(text(f"""
+        CREATE TABLE {name} (LIKE parking_events INCLUDING DEFAULTS INCLUDING CONSTRAINTS)
+    """))
+    db.session.execute(text(f"""
+        WITH moved AS (
+            DELETE FROM {DEFAULT_PARTITION}
+            WHERE start_time >= :start AND start_time < :end
+            RETURNING *
+        )
+        INSERT INTO {name} SELECT * FROM moved
+    """), bounds)
+    db.session.execute(text(f"""
+        ALTER TABLE parking_events ATTACH PARTITION {name}
+        FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')
+    """))
@@ -0,0 +1,147 @@
+import threading
+from collections import OrderedDict
+from sqlalchemy import text
+from flaskr.extensions import db
+from flaskr.models.events import ParkingEvent
+from flaskr.services.metrics import Counter, Gauge, metrics
+
+# A parking session is a PARK event, open while its end_time is NULL; the
+# LEAVE of the same user in the same area closes it by setting end_time.
+# The literal predicates match the partial index of the open sessions
+# (ix_parking_events_open_sessions), which only holds the open PARK events.
+OPEN_SESSION = "type = 'PARK' AND end_time IS NULL"
+
+# Latest open session of the user in the area started by `end_time`, through
+# the partial index (re-checked under the row lock against concurrent leaves)
+CLOSE_SESSION_SQL = f"""
+    UPDATE parking_events p SET end_time = :end_time
+    FROM (
+        SELECT id, start_time FROM parking_events
+        WHERE user_id = :user_id AND parking_area_id = :parking_area_id
+          AND {OPEN_SESSION} AND start_time <= :end_time
+        ORDER BY start_time DESC
+        LIMIT 1
+    ) o
+    WHERE p.id = o.id AND p.start_time = o.start_time AND p.end_time IS NULL
+    RETURNING p.id
+"""
+
+# Same, for many leaves at once; a session matched by several leaves is
+# closed by the earliest one
+CLOSE_SESSIONS_SQL = f"""
+    WITH leaves AS (
+        SELECT * FROM unnest(CAST(:user_ids AS integer[]), CAST(:parking_area_ids AS integer[]),
+                             CAST(:end_times AS timestamp[]))
+        AS l(user_id, parking_area_id, end_time)
+    ), matched AS (
+        SELECT DISTINCT ON (o.id) o.id, o.start_time, l.end_time
+        FROM leaves l
+        CROSS JOIN LATERAL (
+            SELECT id, start_time FROM parking_events
+            WHERE user_id = l.user_id AND parking_area_id = l.parking_area_id
+              AND {OPEN_SESSION} AND start_time <= l.end_time
+            ORDER BY start_time DESC
+            LIMIT 1
+        ) o
+        ORDER BY o.id, l.end_time
+    )
+    UPDATE parking_events p SET end_time = m.end_time
+    FROM matched m
+    WHERE p.id = m.id AND p.start_time = m.start_time AND p.end_time IS NULL
+    RETURNING p.id
+"""
+
+
+class OpenSessionCache:
+    """Per-worker LRU cache of the open parking sessions recorded by this
+    worker: (user_id, parking_area_id) -> (event id, start_time) of the PARK.
+
+    A cached session is closed by its primary key, without searching for it.
+    Entries may be outdated (session closed by another worker, or by a leave
+    of the asyncio path): closing re-checks the row and falls back to the
+    partial index.
+    """
+
+    def __init__(self, max_size=100000):
+        self.max_size = max_size
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.lookups = Counter("bpm_open_sessions_cache_lookups_total",
+                               "Open session cache lookups when closing a session.", ("result",))
+
+    def init_app(self, app):
+        self.max_size = app.config.get("OPEN_SESSIONS_CACHE_SIZE", self.max_size)
+        for metric in (self.lookups, Gauge("bpm_open_sessions_cached", "Open sessions in the cache.",
+                                           lambda: len(self._sessions))):
+            metrics.register(metric)
+
+    def add(self, user_id, parking_area_id, event_id, start_time):
+        """Records a committed PARK event as the open session of the user in the area."""
+        key = (user_id, parking_area_id)
+        with self._lock:
+            self._sessions[key] = (event_id, start_time)
+            self._sessions.move_to_end(key)
+            while len(self._sessions) > self.max_size:
+                self._sessions.popitem(last=False)
+
+    def pop(self, user_id, parking_area_id):
+        with self._lock:
+            return self._sessions.pop((user_id, parking_area_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+
+
+open_sessions = OpenSessionCache()
+
+
+def close_session(user_id, parking_area_id, end_time):
+    """Closes the open session of the user in the area (started by
+    `end_time`) for a LEAVE at `end_time`. Returns the id of the closed PARK
+    event, or None if there was no open session. Does not commit."""
+    cached = open_sessions.pop(user_id, parking_area_id)
+    if cached is not None and cached[1] <= end_time:
+        event_id, start_time = cached
+        closed = db.session.execute(text(f"""
+            UPDATE parking_events SET end_time = :end_time
+            WHERE id = :id AND start_time = :start_time AND {OPEN_SESSION}
+            RETURNING id
+        """), {"end_time": end_time, "id": event_id, "start_time": start_time}).scalar()
+        if closed is not None:
+            open_sessions.lookups.inc("hit")
+            return closed
+    open_sessions.lookups.inc("miss")
+    return db.session.execute(text(CLOSE_SESSION_SQL), {
+        "user_id": user_id, "parking_area_id": parking_area_id, "end_time": end_time
+    }).scalar()
+
+
+def close_sessions(leaves):
+    """Closes the open sessions matched by many LEAVE events (column dicts
+    with user_id, parking_area_id and start_time) in one statement, the PARK
+    events inserted earlier in the transaction included. Returns the ids of
+    the closed PARK events. Does not commit."""
+    if not leaves:
+        return []
+    for leave in leaves:
+        open_sessions.pop(leave["user_id"], leave["parking_area_id"])
+    return db.session.execute(text(CLOSE_SESSIONS_SQL), {
+        "user_ids": [leave["user_id"] for leave in leaves],
+        "parking_area_ids": [leave["parking_area_id"] for leave in leaves],
+        "end_times": [leave["start_time"] for leave in leaves]
+    }).scalars().all()
+
+
+def open_sessions_query(user_id=None, parking_area_id=None):
+    """Returns the query of the open sessions (PARK events), to be read in
+    (start_time, id) order with ParkingEvent.get_page or iter_all."""
+    query = ParkingEvent.query.filter(text(
+        "parking_events.type = 'PARK' AND parking_events.end_time IS NULL"
+    ))
+    if user_id is not None:
+        query = query.filter(ParkingEvent.user_id == user_id)
+    if parking_area_id is not None:
+        query = query.filter(ParkingEvent.parking_area_id == parking_area_id)
+    return query
@@ -0,0 +1,118 @@
+import threading
+import time
+from geoalchemy2.shape import to_shape
+from shapely import STRtree, points
+from shapely.geometry import Point
+from sqlalchemy.exc import SQLAlchemyError
+from flaskr.extensions import db
+from flaskr.models.parking_areas import ParkingArea, ParkingAreasState
+
+
+class _Snapshot:
+    """Immutable STR-tree over the parking areas at a given geometry version."""
+
+    def __init__(self, version, area_ids, polygons):
+        self.version = version
+        self.area_ids = area_ids
+        self.tree = STRtree(polygons)
+
+    def lookup(self, longitude, latitude):
+        hits = self.tree.query(Point(longitude, latitude), predicate="within")
+        if len(hits) == 0:
+            return None
+        # Same tie-break as the database lookup when polygons overlap
+        return min(self.area_ids[i] for i in hits)
+
+    def lookup_many(self, coordinates):
+        area_ids = [None] * len(coordinates)
+        if not coordinates:
+            return area_ids
+        input_idx, tree_idx = self.tree.query(points(coordinates), predicate="within")
+        for i, j in zip(input_idx.tolist(), tree_idx.tolist()):
+            area_id = self.area_ids[j]
+            if area_ids[i] is None or area_id < area_ids[i]:
+                area_ids[i] = area_id
+        return area_ids
+
+
+class AreaSpatialIndex:
+    """Per-worker in-memory index answering point-in-area lookups.
+
+    The index is tagged with the global geometry version of the parking areas.
+    At most every `ttl` seconds the version is re-read from the database and
+    the tree is rebuilt if it changed. While the index is stale (never built,
+    being refreshed by another thread, or the refresh failed) lookups fall
+    back to the database `ST_Contains` query. Misses are checked against the
+    database too (they are rare), so that an area added less than `ttl`
+    seconds ago is not missed.
+    """
+
+    def __init__(self, ttl=5.0):
+        self.ttl = ttl
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._refresh_lock = threading.Lock()
+
+    def init_app(self, app):
+        self.ttl = app.config.get("SPATIAL_INDEX_TTL", self.ttl)
+
+    def invalidate(self):
+        """Forces a version check on the next lookup (e.g. after editing areas)."""
+        self._checked_at = 0.0
+
+    def lookup(self, longitude, latitude, location_point):
+        """Returns the id of the parking area containing the point, or None."""
+        snapshot = self._fresh_snapshot()
+        area_id = snapshot.lookup(longitude, latitude) if snapshot is not None else None
+        if area_id is None:
+            return ParkingArea.get_id_containing(location_point)
+        return area_id
+
+    def lookup_many(self, coordinates):
+        """Returns the area id (or None) for each (longitude, latitude) pair."""
+        snapshot = self._fresh_snapshot()
+        if snapshot is None:
+            return ParkingArea.get_ids_containing(coordinates)
+        area_ids = snapshot.lookup_many(coordinates)
+        missed = [i for i, area_id in enumerate(area_ids) if area_id is None]
+        if missed:
+            for i, area_id in zip(missed, ParkingArea.get_ids_containing([coordinates[i] for i in missed])):
+                area_ids[i] = area_id
+        return area_ids
+
+    def _fresh_snapshot(self):
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._checked_at < self.ttl:
+            return snapshot
+
+        # Only one thread refreshes; the others answer from the database meanwhile
+        if not self._refresh_lock.acquire(blocking=False):
+            return None
+        try:
+            checked_at = time.monotonic()
+            # Read the version before the polygons: a concurrent edit can only
+            # make the tree newer than its tag, never older.
+            version = ParkingAreasState.get_geometry_version()
+            if snapshot is None or snapshot.version != version:
+                snapshot = self._build(version)
+                self._snapshot = snapshot
+            self._checked_at = checked_at
+            return snapshot
+        except SQLAlchemyError:
+            # The fallback query runs on the same session
+            db.session.rollback()
+            return None
+        finally:
+            self._refresh_lock.release()
+
+    @staticmethod
+    def _build(version):
+        rows = db.session.query(ParkingArea.id, ParkingArea.location_area).all()
+        return _Snapshot(
+            version,
+            [area_id for area_id, _ in rows],
+            [to_shape(location_area) for _, location_area in rows]
+        )
+
+
+area_index = AreaSpatialIndex()
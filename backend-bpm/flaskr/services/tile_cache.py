@@ -0,0 +1,85 @@
+import threading
+from collections import OrderedDict
+from flaskr.services.metrics import Counter, Gauge, metrics
+
+
+class TileCache:
+    """Per-worker LRU cache of the encoded vector tiles.
+
+    Every tile is stored with the tag it was built at (a version computed by
+    the route, far cheaper than the tile) and only served to a request
+    computing the same tag: editing an area or changing its capacity changes
+    the tag of the tiles covering it, which are rebuilt on their next request.
+    The least recently used tiles are evicted beyond `max_size` entries.
+
+    Computing a tag (a digest of the capacities within the tile) still
+    costs a query per request: tags are cached too, with the global version
+    of the areas they were computed at (see ParkingArea.get_collection_etag,
+    a few rows whatever the number of areas). A tag is only recomputed once
+    something changed somewhere since.
+    """
+
+    def __init__(self, max_size=4096):
+        self.max_size = max_size
+        self._tiles = OrderedDict()
+        # key -> (global version, tag)
+        self._tags = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.lookups = Counter("bpm_tile_cache_lookups_total", "Vector tile cache lookups.", ("layer", "result"))
+        self.tag_lookups = Counter("bpm_tile_cache_tag_lookups_total", "Vector tile tag cache lookups.",
+                                   ("layer", "result"))
+
+    def init_app(self, app):
+        self.max_size = app.config.get("TILE_CACHE_SIZE", self.max_size)
+        for metric in (self.lookups, self.tag_lookups, Gauge("bpm_tile_cache_tiles", "Vector tiles in the cache.",
+                                           lambda: len(self._tiles))):
+            metrics.register(metric)
+
+    def tag(self, key, version, compute):
+        """Returns the tag of the tile of `key`, computed by `compute()` unless
+        already known at the global `version`."""
+        layer = key[0]
+        with self._lock:
+            entry = self._tags.get(key)
+            if entry is not None and entry[0] == version:
+                self._tags.move_to_end(key)
+                self.tag_lookups.inc(layer, "hit")
+                return entry[1]
+        self.tag_lookups.inc(layer, "miss")
+
+        tag = compute()
+        with self._lock:
+            self._tags[key] = (version, tag)
+            self._tags.move_to_end(key)
+            while len(self._tags) > self.max_size:
+                self._tags.popitem(last=False)
+        return tag
+
+    def get(self, key, tag, build):
+        """Returns the tile of `key` at `tag`, built by `build()` on a miss."""
+        layer = key[0]
+        with self._lock:
+            entry = self._tiles.get(key)
+            if entry is not None and entry[0] == tag:
+                self._tiles.move_to_end(key)
+                self.lookups.inc(layer, "hit")
+                return entry[1]
+        self.lookups.inc(layer, "miss" if entry is None else "stale")
+
+        # Built outside the lock: concurrent misses of a tile build it twice
+        tile = build()
+        with self._lock:
+            self._tiles[key] = (tag, tile)
+            self._tiles.move_to_end(key)
+            while len(self._tiles) > self.max_size:
+                self._tiles.popitem(last=False)
+        return tile
+
+    def clear(self):
+        with self._lock:
+            self._tiles.clear()
+            self._tags.clear()
+
+
+tile_cache = TileCache()
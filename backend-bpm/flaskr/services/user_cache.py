@@ -0,0 +1,65 @@
+import threading
+from collections import OrderedDict
+from flaskr.models.users import User
+from flaskr.services.metrics import Counter, Gauge, metrics
+
+
+class UserCache:
+    """Per-worker LRU cache of the existing users (id -> username).
+
+    Event ingestion validates user ids against it, only querying the
+    database for the ids it does not hold. Only existing users are cached
+    (a user signing up elsewhere is found on the next miss) and at most
+    `max_size` of them. Users are never deleted by the API: an entry made
+    stale by a manual deletion is still caught by the foreign key.
+    """
+
+    def __init__(self, max_size=100000):
+        self.max_size = max_size
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.lookups = Counter("bpm_user_cache_lookups_total", "User identity cache lookups.", ("result",))
+
+    def init_app(self, app):
+        self.max_size = app.config.get("USER_CACHE_SIZE", self.max_size)
+        for metric in (self.lookups, Gauge("bpm_user_cache_users", "Users in the identity cache.",
+                                           lambda: len(self._users))):
+            metrics.register(metric)
+
+    def add(self, user_id, username):
+        with self._lock:
+            self._users[user_id] = username
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_size:
+                self._users.popitem(last=False)
+
+    def existing_ids(self, user_ids):
+        """Returns the subset of the given ids that belong to existing users."""
+        found = set()
+        missing = []
+        with self._lock:
+            for user_id in user_ids:
+                if user_id in self._users:
+                    self._users.move_to_end(user_id)
+                    found.add(user_id)
+                else:
+                    missing.append(user_id)
+        if found:
+            self.lookups.inc("hit", amount=len(found))
+        if missing:
+            self.lookups.inc("miss", amount=len(missing))
+            for user_id, username in User.get_usernames(missing).items():
+                self.add(user_id, username)
+                found.add(user_id)
+        return found
+
+    def exists(self, user_id):
+        return bool(self.existing_ids((user_id,)))
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+
+
+user_cache = UserCache()
@@ -0,0 +1,27 @@
+"""parking_events_park_end_time
+
+Revision ID: 2c7b9e0d4f16
+Revises: 8e3f1a7c5d20
+Create Date: 2026-10-18 10:41:09.552310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2c7b9e0d4f16'
+down_revision = '8e3f1a7c5d20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Occupancy refreshes read the intervals closed after the start of the
+    # recomputed hours by range on end_time (see occupancy.INTERVALS_SQL)
+    op.create_index('ix_parking_events_park_end_time', 'parking_events', ['end_time'],
+                    postgresql_where=sa.text("type = 'PARK'"))
+
+
+def downgrade():
+    op.drop_index('ix_parking_events_park_end_time', table_name='parking_events')
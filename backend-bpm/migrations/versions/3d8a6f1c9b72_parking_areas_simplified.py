@@ -0,0 +1,63 @@
+"""parking_areas_simplified
+
+Revision ID: 3d8a6f1c9b72
+Revises: e91b4c7d2a53
+Create Date: 2026-03-23 09:52:17.480126
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from geoalchemy2 import Geometry
+
+
+# revision identifiers, used by Alembic.
+revision = '3d8a6f1c9b72'
+down_revision = 'e91b4c7d2a53'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('parking_areas_simplified',
+    sa.Column('parking_area_id', sa.Integer(), nullable=False),
+    sa.Column('zoom', sa.SmallInteger(), nullable=False),
+    sa.Column('location_area', Geometry(geometry_type='POLYGON', srid=4326, spatial_index=False, from_text='ST_GeomFromEWKT', name='geometry', nullable=False), nullable=False),
+    sa.ForeignKeyConstraint(['parking_area_id'], ['parking_areas.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('parking_area_id', 'zoom')
+    )
+
+    # Zoom levels of flaskr.models.parking_areas.SIMPLIFIED_ZOOMS, tolerance
+    # of one 256px tile pixel at the zoom (degrees)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION refresh_parking_areas_simplified() RETURNS trigger AS $$
+        BEGIN
+            DELETE FROM parking_areas_simplified WHERE parking_area_id = NEW.id;
+            INSERT INTO parking_areas_simplified (parking_area_id, zoom, location_area)
+            SELECT NEW.id, z, simplified
+            FROM unnest(ARRAY[6, 8, 10, 12, 14, 16]) AS z,
+                 LATERAL ST_SimplifyPreserveTopology(NEW.location_area, 360.0 / (256 * 2 ^ z)) AS simplified
+            WHERE ST_NPoints(simplified) < ST_NPoints(NEW.location_area);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+        CREATE TRIGGER trg_parking_areas_simplified
+        AFTER INSERT OR UPDATE OF location_area ON parking_areas
+        FOR EACH ROW EXECUTE FUNCTION refresh_parking_areas_simplified();
+    """)
+
+    op.execute("""
+        INSERT INTO parking_areas_simplified (parking_area_id, zoom, location_area)
+        SELECT pa.id, z, simplified
+        FROM parking_areas pa,
+             unnest(ARRAY[6, 8, 10, 12, 14, 16]) AS z,
+             LATERAL ST_SimplifyPreserveTopology(pa.location_area, 360.0 / (256 * 2 ^ z)) AS simplified
+        WHERE ST_NPoints(simplified) < ST_NPoints(pa.location_area)
+    """)
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS trg_parking_areas_simplified ON parking_areas")
+    op.execute("DROP FUNCTION IF EXISTS refresh_parking_areas_simplified()")
+    op.drop_table('parking_areas_simplified')
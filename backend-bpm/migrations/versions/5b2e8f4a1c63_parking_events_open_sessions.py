@@ -0,0 +1,42 @@
+"""parking_events_open_sessions
+
+Revision ID: 5b2e8f4a1c63
+Revises: 3d8a6f1c9b72
+Create Date: 2026-03-30 11:04:38.215947
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b2e8f4a1c63'
+down_revision = '3d8a6f1c9b72'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Close the sessions of the history: a PARK followed by a LEAVE of the
+    # same user in the same area ends at that LEAVE
+    op.execute("""
+        UPDATE parking_events p SET end_time = s.end_time
+        FROM (
+            SELECT id, start_time, type,
+                   lead(type) OVER w AS next_type,
+                   lead(start_time) OVER w AS end_time
+            FROM parking_events
+            WINDOW w AS (PARTITION BY user_id, parking_area_id ORDER BY start_time, id)
+        ) s
+        WHERE p.id = s.id AND p.start_time = s.start_time
+          AND s.type = 'PARK' AND s.next_type = 'LEAVE' AND p.end_time IS NULL
+    """)
+
+    # Only holds the sessions still open, a small fraction of the events
+    op.create_index('ix_parking_events_open_sessions', 'parking_events',
+                    ['user_id', 'parking_area_id', 'start_time'],
+                    postgresql_where=sa.text("type = 'PARK' AND end_time IS NULL"))
+
+
+def downgrade():
+    op.drop_index('ix_parking_events_open_sessions', table_name='parking_events')
@@ -0,0 +1,98 @@
+"""capacity_summary
+
+Revision ID: 5e8b0c3f91a4
+Revises: d41f6a2b8e17
+Create Date: 2026-02-02 11:37:45.062381
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e8b0c3f91a4'
+down_revision = 'd41f6a2b8e17'
+branch_labels = None
+depends_on = None
+
+# Must match CapacitySummary.SLOTS
+SLOTS = 16
+
+
+def upgrade():
+    # Capacity totals of the parking areas, split in SLOTS rows (area id modulo
+    # SLOTS) so that concurrent park/leave transactions do not all queue on the
+    # lock of a single row. The summary is the sum of the slots.
+    op.create_table('capacity_summary',
+    sa.Column('slot', sa.SmallInteger(), nullable=False),
+    sa.Column('total_areas', sa.Integer(), nullable=False),
+    sa.Column('total_max_capacity', sa.BigInteger(), nullable=False),
+    sa.Column('total_residual_capacity', sa.BigInteger(), nullable=False),
+    sa.Column('areas_full', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('slot')
+    )
+    op.execute(f"""
+        INSERT INTO capacity_summary
+        SELECT s.slot,
+               COALESCE(a.total_areas, 0),
+               COALESCE(a.total_max_capacity, 0),
+               COALESCE(a.total_residual_capacity, 0),
+               COALESCE(a.areas_full, 0)
+        FROM generate_series(0, {SLOTS - 1}) AS s(slot)
+        LEFT JOIN (
+            SELECT id % {SLOTS} AS slot,
+                   count(*) AS total_areas,
+                   sum(max_capacity) AS total_max_capacity,
+                   sum(residual_capacity) AS total_residual_capacity,
+                   count(*) FILTER (WHERE residual_capacity <= 0) AS areas_full
+            FROM parking_areas
+            GROUP BY 1
+        ) a ON a.slot = s.slot
+    """)
+
+    # Maintained by the statements changing the parking areas themselves
+    # (park/leave updates, batch updates, seeds, manual edits).
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION update_capacity_summary() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'UPDATE' AND NEW.id = OLD.id THEN
+                UPDATE capacity_summary SET
+                    total_max_capacity = total_max_capacity + NEW.max_capacity - OLD.max_capacity,
+                    total_residual_capacity = total_residual_capacity + NEW.residual_capacity - OLD.residual_capacity,
+                    areas_full = areas_full + (NEW.residual_capacity <= 0)::int - (OLD.residual_capacity <= 0)::int
+                WHERE slot = NEW.id % {SLOTS};
+                RETURN NULL;
+            END IF;
+
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                UPDATE capacity_summary SET
+                    total_areas = total_areas - 1,
+                    total_max_capacity = total_max_capacity - OLD.max_capacity,
+                    total_residual_capacity = total_residual_capacity - OLD.residual_capacity,
+                    areas_full = areas_full - (OLD.residual_capacity <= 0)::int
+                WHERE slot = OLD.id % {SLOTS};
+            END IF;
+
+            IF TG_OP IN ('UPDATE', 'INSERT') THEN
+                UPDATE capacity_summary SET
+                    total_areas = total_areas + 1,
+                    total_max_capacity = total_max_capacity + NEW.max_capacity,
+                    total_residual_capacity = total_residual_capacity + NEW.residual_capacity,
+                    areas_full = areas_full + (NEW.residual_capacity <= 0)::int
+                WHERE slot = NEW.id % {SLOTS};
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+        CREATE TRIGGER trg_parking_areas_capacity_summary
+        AFTER INSERT OR DELETE OR UPDATE OF id, max_capacity, residual_capacity ON parking_areas
+        FOR EACH ROW EXECUTE FUNCTION update_capacity_summary();
+    """)
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS trg_parking_areas_capacity_summary ON parking_areas")
+    op.execute("DROP FUNCTION IF EXISTS update_capacity_summary()")
+    op.drop_table('capacity_summary')
@@ -0,0 +1,62 @@
+"""parking_areas_simplified_zooms
+
+Revision ID: 6a1f3c8e2b94
+Revises: 2c7b9e0d4f16
+Create Date: 2026-10-18 14:05:31.208817
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6a1f3c8e2b94'
+down_revision = '2c7b9e0d4f16'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Zoom levels of the simplified polygons and their tolerance (one 256px
+    # tile pixel at the zoom, degrees), read by the trigger and the viewport
+    # queries alike
+    op.create_table('parking_areas_simplified_zooms',
+    sa.Column('zoom', sa.SmallInteger(), nullable=False),
+    sa.Column('tolerance', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('zoom')
+    )
+    op.execute("""
+        INSERT INTO parking_areas_simplified_zooms (zoom, tolerance)
+        SELECT z, 360.0 / (256 * 2 ^ z) FROM unnest(ARRAY[6, 8, 10, 12, 14, 16]) AS z
+    """)
+
+    op.execute("""
+        CREATE OR REPLACE FUNCTION refresh_parking_areas_simplified() RETURNS trigger AS $$
+        BEGIN
+            DELETE FROM parking_areas_simplified WHERE parking_area_id = NEW.id;
+            INSERT INTO parking_areas_simplified (parking_area_id, zoom, location_area)
+            SELECT NEW.id, z.zoom, simplified
+            FROM parking_areas_simplified_zooms z,
+                 LATERAL ST_SimplifyPreserveTopology(NEW.location_area, z.tolerance) AS simplified
+            WHERE ST_NPoints(simplified) < ST_NPoints(NEW.location_area);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+
+
+def downgrade():
+    op.execute("""
+        CREATE OR REPLACE FUNCTION refresh_parking_areas_simplified() RETURNS trigger AS $$
+        BEGIN
+            DELETE FROM parking_areas_simplified WHERE parking_area_id = NEW.id;
+            INSERT INTO parking_areas_simplified (parking_area_id, zoom, location_area)
+            SELECT NEW.id, z, simplified
+            FROM unnest(ARRAY[6, 8, 10, 12, 14, 16]) AS z,
+                 LATERAL ST_SimplifyPreserveTopology(NEW.location_area, 360.0 / (256 * 2 ^ z)) AS simplified
+            WHERE ST_NPoints(simplified) < ST_NPoints(NEW.location_area);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    op.drop_table('parking_areas_simplified_zooms')
@@ -0,0 +1,117 @@
+"""partition_parking_events
+
+Revision ID: 7f4d2a9c0e35
+Revises: a5f20c8e6b91
+Create Date: 2026-03-02 10:26:13.845091
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7f4d2a9c0e35'
+down_revision = 'a5f20c8e6b91'
+branch_labels = None
+depends_on = None
+
+# Monthly partitions created ahead of the current month (afterwards:
+# `flask create-event-partitions`)
+MONTHS_AHEAD = 3
+
+# Indexes matching the query shapes of ParkingEvent (created on the parent,
+# hence on every partition)
+INDEXES = [
+    ('ix_parking_events_start_time_id', ['start_time', 'id']),
+    ('ix_parking_events_user_start_time_id', ['user_id', 'start_time', 'id']),
+    ('ix_parking_events_area_start_time_id', ['parking_area_id', 'start_time', 'id']),
+    ('ix_parking_events_type_start_time_id', ['type', 'start_time', 'id']),
+]
+
+
+def upgrade():
+    # 1. Partitioned copy of parking_events, by month of start_time. The
+    #    partition key must be part of the primary key.
+    op.execute("""
+        CREATE TABLE parking_events_partitioned (
+            id INTEGER NOT NULL DEFAULT nextval('parking_events_id_seq'),
+            start_time TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            end_time TIMESTAMP WITHOUT TIME ZONE,
+            type eventtype NOT NULL,
+            location_point geometry(POINT, 4326) NOT NULL,
+            user_id INTEGER NOT NULL REFERENCES users (id),
+            parking_area_id INTEGER NOT NULL REFERENCES parking_areas (id),
+            PRIMARY KEY (id, start_time)
+        ) PARTITION BY RANGE (start_time)
+    """)
+
+    # 2. One partition per month, from the oldest event up to MONTHS_AHEAD
+    #    months from now, plus a default partition for anything outside.
+    op.execute(f"""
+        DO $$
+        DECLARE
+            part_month DATE := date_trunc('month', COALESCE((SELECT min(start_time) FROM parking_events), now()));
+            last_month DATE := date_trunc('month', now()) + interval '{MONTHS_AHEAD} months';
+        BEGIN
+            WHILE part_month <= last_month LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF parking_events_partitioned FOR VALUES FROM (%L) TO (%L)',
+                    'parking_events_' || to_char(part_month, '"y"YYYY"m"MM'),
+                    part_month, part_month + interval '1 month'
+                );
+                part_month := part_month + interval '1 month';
+            END LOOP;
+        END $$;
+    """)
+    op.execute("CREATE TABLE parking_events_default PARTITION OF parking_events_partitioned DEFAULT")
+
+    # 3. Move the rows, keep the id sequence (owned by the new table, so
+    #    that it survives the drop of the old one) and swap the tables.
+    op.execute("""
+        INSERT INTO parking_events_partitioned (id, start_time, end_time, type, location_point, user_id, parking_area_id)
+        SELECT id, start_time, end_time, type, location_point, user_id, parking_area_id
+        FROM parking_events
+    """)
+    op.execute("ALTER SEQUENCE parking_events_id_seq OWNED BY parking_events_partitioned.id")
+    op.execute("DROP TABLE parking_events")
+    op.execute("ALTER TABLE parking_events_partitioned RENAME TO parking_events")
+    op.execute("ALTER TABLE parking_events RENAME CONSTRAINT parking_events_partitioned_pkey TO parking_events_pkey")
+    op.execute("ALTER TABLE parking_events RENAME CONSTRAINT parking_events_partitioned_user_id_fkey TO parking_events_user_id_fkey")
+    op.execute("ALTER TABLE parking_events RENAME CONSTRAINT parking_events_partitioned_parking_area_id_fkey TO parking_events_parking_area_id_fkey")
+
+    # 4. Indexes
+    for name, columns in INDEXES:
+        op.create_index(name, 'parking_events', columns, unique=False)
+    op.create_index('idx_parking_events_location_point', 'parking_events', ['location_point'], unique=False, postgresql_using='gist')
+    op.execute("ANALYZE parking_events")
+
+
+def downgrade():
+    op.execute("""
+        CREATE TABLE parking_events_plain (
+            id INTEGER NOT NULL DEFAULT nextval('parking_events_id_seq') PRIMARY KEY,
+            start_time TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            end_time TIMESTAMP WITHOUT TIME ZONE,
+            type eventtype NOT NULL,
+            location_point geometry(POINT, 4326) NOT NULL,
+            user_id INTEGER NOT NULL REFERENCES users (id),
+            parking_area_id INTEGER NOT NULL REFERENCES parking_areas (id)
+        )
+    """)
+    op.execute("""
+        INSERT INTO parking_events_plain (id, start_time, end_time, type, location_point, user_id, parking_area_id)
+        SELECT id, start_time, end_time, type, location_point, user_id, parking_area_id
+        FROM parking_events
+    """)
+    op.execute("ALTER SEQUENCE parking_events_id_seq OWNED BY parking_events_plain.id")
+    # Drops the partitions along with the parent
+    op.execute("DROP TABLE parking_events")
+    op.execute("ALTER TABLE parking_events_plain RENAME TO parking_events")
+    op.execute("ALTER TABLE parking_events RENAME CONSTRAINT parking_events_plain_pkey TO parking_events_pkey")
+    op.execute("ALTER TABLE parking_events RENAME CONSTRAINT parking_events_plain_user_id_fkey TO parking_events_user_id_fkey")
+    op.execute("ALTER TABLE parking_events RENAME CONSTRAINT parking_events_plain_parking_area_id_fkey TO parking_events_parking_area_id_fkey")
+
+    for name, columns in INDEXES:
+        if name != 'ix_parking_events_user_start_time_id':
+            op.create_index(name, 'parking_events', columns, unique=False)
+    op.create_index('idx_parking_events_location_point', 'parking_events', ['location_point'], unique=False, postgresql_using='gist')
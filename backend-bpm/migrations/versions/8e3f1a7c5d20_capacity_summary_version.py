@@ -0,0 +1,71 @@
+"""capacity_summary_version
+
+Revision ID: 8e3f1a7c5d20
+Revises: 5b2e8f4a1c63
+Create Date: 2026-10-18 10:12:44.301857
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e3f1a7c5d20'
+down_revision = '5b2e8f4a1c63'
+branch_labels = None
+depends_on = None
+
+# Must match CapacitySummary.SLOTS
+SLOTS = 16
+
+
+def summary_function(bump):
+    """Body of update_capacity_summary(), bumping the slot version if `bump`."""
+    version = ",\n                    capacity_version = capacity_version + 1" if bump else ""
+    return f"""
+        CREATE OR REPLACE FUNCTION update_capacity_summary() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'UPDATE' AND NEW.id = OLD.id THEN
+                UPDATE capacity_summary SET
+                    total_max_capacity = total_max_capacity + NEW.max_capacity - OLD.max_capacity,
+                    total_residual_capacity = total_residual_capacity + NEW.residual_capacity - OLD.residual_capacity,
+                    areas_full = areas_full + (NEW.residual_capacity <= 0)::int - (OLD.residual_capacity <= 0)::int{version}
+                WHERE slot = NEW.id % {SLOTS};
+                RETURN NULL;
+            END IF;
+
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                UPDATE capacity_summary SET
+                    total_areas = total_areas - 1,
+                    total_max_capacity = total_max_capacity - OLD.max_capacity,
+                    total_residual_capacity = total_residual_capacity - OLD.residual_capacity,
+                    areas_full = areas_full - (OLD.residual_capacity <= 0)::int{version}
+                WHERE slot = OLD.id % {SLOTS};
+            END IF;
+
+            IF TG_OP IN ('UPDATE', 'INSERT') THEN
+                UPDATE capacity_summary SET
+                    total_areas = total_areas + 1,
+                    total_max_capacity = total_max_capacity + NEW.max_capacity,
+                    total_residual_capacity = total_residual_capacity + NEW.residual_capacity,
+                    areas_full = areas_full + (NEW.residual_capacity <= 0)::int{version}
+                WHERE slot = NEW.id % {SLOTS};
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """
+
+
+def upgrade():
+    # Bumped with the totals of the slot by every capacity change: the sum of
+    # the slot versions changes whenever any residual capacity does, without
+    # taking any lock the park/leave transactions do not already hold.
+    op.add_column('capacity_summary', sa.Column('capacity_version', sa.BigInteger(), nullable=False,
+                                                server_default='0'))
+    op.execute(summary_function(bump=True))
+
+
+def downgrade():
+    op.execute(summary_function(bump=False))
+    op.drop_column('capacity_summary', 'capacity_version')
@@ -0,0 +1,69 @@
+"""parking_areas_geometry_version
+
+Revision ID: 9c2e51d7a0b3
+Revises: 4a081d29fe28
+Create Date: 2026-01-12 10:14:32.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c2e51d7a0b3'
+down_revision = '4a081d29fe28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Single-row table holding the global geometry version of the parking areas.
+    op.create_table('parking_areas_state',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('geometry_version', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute("INSERT INTO parking_areas_state (id, geometry_version) VALUES (1, 1)")
+
+    op.add_column('parking_areas', sa.Column('geometry_version', sa.BigInteger(), server_default='1', nullable=False))
+
+    # Every insert, delete or edit of the static part of an area (name, polygon,
+    # max capacity) bumps the global version and stamps it on the row, so that
+    # per-worker caches can detect changes made by any writer (API, seeds, pgAdmin).
+    op.execute("""
+        CREATE OR REPLACE FUNCTION bump_parking_areas_geometry_version() RETURNS trigger AS $$
+        DECLARE
+            new_version BIGINT;
+        BEGIN
+            IF TG_OP = 'UPDATE'
+                AND NEW.name IS NOT DISTINCT FROM OLD.name
+                AND NEW.max_capacity IS NOT DISTINCT FROM OLD.max_capacity
+                AND ST_Equals(NEW.location_area, OLD.location_area) THEN
+                RETURN NEW;
+            END IF;
+
+            UPDATE parking_areas_state
+               SET geometry_version = geometry_version + 1
+             WHERE id = 1
+            RETURNING geometry_version INTO new_version;
+
+            IF TG_OP = 'DELETE' THEN
+                RETURN OLD;
+            END IF;
+            NEW.geometry_version := new_version;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+        CREATE TRIGGER trg_parking_areas_geometry_version
+        BEFORE INSERT OR DELETE OR UPDATE OF name, location_area, max_capacity ON parking_areas
+        FOR EACH ROW EXECUTE FUNCTION bump_parking_areas_geometry_version();
+    """)
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS trg_parking_areas_geometry_version ON parking_areas")
+    op.execute("DROP FUNCTION IF EXISTS bump_parking_areas_geometry_version()")
+    op.drop_column('parking_areas', 'geometry_version')
+    op.drop_table('parking_areas_state')
@@ -0,0 +1,28 @@
+"""parking_areas_geography_index
+
+Revision ID: a5f20c8e6b91
+Revises: e3c7d9a15f28
+Create Date: 2026-02-23 14:05:51.226870
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a5f20c8e6b91'
+down_revision = 'e3c7d9a15f28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Index-assisted KNN (<->) ordering on geodesic (sphere) distance
+    op.execute("""
+        CREATE INDEX idx_parking_areas_location_area_geog
+        ON parking_areas USING gist ((location_area::geography))
+    """)
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS idx_parking_areas_location_area_geog")
@@ -0,0 +1,47 @@
+"""capacity_changes_notify
+
+Revision ID: b7a93e4d2c60
+Revises: 5e8b0c3f91a4
+Create Date: 2026-02-09 15:21:08.417733
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7a93e4d2c60'
+down_revision = '5e8b0c3f91a4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Publishes every residual capacity change on the 'capacity_changes'
+    # channel. Notifications are delivered when the transaction commits, and
+    # are dropped if it rolls back.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION notify_capacity_change() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('capacity_changes', json_build_object(
+                'id', NEW.id,
+                'residual_capacity', NEW.residual_capacity,
+                'max_capacity', NEW.max_capacity,
+                'delta', NEW.residual_capacity - OLD.residual_capacity
+            )::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+        CREATE TRIGGER trg_parking_areas_notify_capacity
+        AFTER UPDATE OF residual_capacity ON parking_areas
+        FOR EACH ROW
+        WHEN (OLD.residual_capacity IS DISTINCT FROM NEW.residual_capacity)
+        EXECUTE FUNCTION notify_capacity_change();
+    """)
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS trg_parking_areas_notify_capacity ON parking_areas")
+    op.execute("DROP FUNCTION IF EXISTS notify_capacity_change()")
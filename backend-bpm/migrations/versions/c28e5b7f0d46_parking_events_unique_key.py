@@ -0,0 +1,37 @@
+"""parking_events_unique_key
+
+Revision ID: c28e5b7f0d46
+Revises: 7f4d2a9c0e35
+Create Date: 2026-03-09 15:41:52.318270
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c28e5b7f0d46'
+down_revision = '7f4d2a9c0e35'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Drop the duplicates left by the seeders (same user, area, type and
+    # start time), keeping the oldest event
+    op.execute("""
+        DELETE FROM parking_events e
+        USING parking_events d
+        WHERE e.user_id = d.user_id
+          AND e.parking_area_id = d.parking_area_id
+          AND e.type = d.type
+          AND e.start_time = d.start_time
+          AND e.id > d.id
+    """)
+    # Conflict target of the bulk imports (includes the partition key)
+    op.create_index('uq_parking_events_user_area_type_start_time', 'parking_events',
+                    ['user_id', 'parking_area_id', 'type', 'start_time'], unique=True)
+
+
+def downgrade():
+    op.drop_index('uq_parking_events_user_area_type_start_time', table_name='parking_events')
@@ -0,0 +1,77 @@
+"""parking_events_change_xid
+
+Revision ID: e91b4c7d2a53
+Revises: c28e5b7f0d46
+Create Date: 2026-03-16 10:27:05.614392
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e91b4c7d2a53'
+down_revision = 'c28e5b7f0d46'
+branch_labels = None
+depends_on = None
+
+CURRENT_XID = "(pg_current_xact_id()::text)::bigint"
+
+
+def upgrade():
+    # Existing events are left NULL ("before delta sync", older than any
+    # horizon): adding a nullable column rewrites no row. New events get the
+    # id of their inserting transaction
+    op.add_column('parking_events', sa.Column('change_xid', sa.BigInteger(), nullable=True))
+    op.alter_column('parking_events', 'change_xid', server_default=sa.text(CURRENT_XID))
+
+    # ... and of their updating one
+    op.execute(f"""
+        CREATE FUNCTION parking_events_touch_change_xid() RETURNS trigger AS $$
+        BEGIN
+            NEW.change_xid := {CURRENT_XID};
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER parking_events_touch_change_xid
+        BEFORE UPDATE ON parking_events
+        FOR EACH ROW EXECUTE FUNCTION parking_events_touch_change_xid()
+    """)
+
+    # Delta sync of the user events (NULL sorted as 0), occupancy rollups
+    op.create_index('ix_parking_events_user_change_xid_id', 'parking_events',
+                    ['user_id', sa.text('COALESCE(change_xid, 0)'), 'id'])
+    op.create_index('ix_parking_events_change_xid', 'parking_events', ['change_xid'])
+
+    # The rollups move from the event id watermark to the transaction horizon.
+    # The existing events have no change_xid: if some were not folded in yet,
+    # the next refresh rebuilds everything, as the first one
+    op.add_column('occupancy_rollup_state', sa.Column('change_horizon', sa.BigInteger(), nullable=False,
+                                                      server_default='0'))
+    op.execute(f"""
+        UPDATE occupancy_rollup_state
+        SET change_horizon = {CURRENT_XID},
+            refreshed_at = CASE WHEN EXISTS (SELECT 1 FROM parking_events WHERE id > last_event_id)
+                                THEN NULL ELSE refreshed_at END
+    """)
+    op.alter_column('occupancy_rollup_state', 'change_horizon', server_default=None)
+    op.drop_column('occupancy_rollup_state', 'last_event_id')
+
+
+def downgrade():
+    op.add_column('occupancy_rollup_state', sa.Column('last_event_id', sa.BigInteger(), nullable=False,
+                                                      server_default='0'))
+    op.execute("""
+        UPDATE occupancy_rollup_state
+        SET last_event_id = (SELECT COALESCE(max(id), 0) FROM parking_events)
+    """)
+    op.alter_column('occupancy_rollup_state', 'last_event_id', server_default=None)
+    op.drop_column('occupancy_rollup_state', 'change_horizon')
+
+    op.drop_index('ix_parking_events_change_xid', table_name='parking_events')
+    op.drop_index('ix_parking_events_user_change_xid_id', table_name='parking_events')
+    op.execute("DROP TRIGGER parking_events_touch_change_xid ON parking_events")
+    op.execute("DROP FUNCTION parking_events_touch_change_xid()")
+    op.drop_column('parking_events', 'change_xid')
@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from flaskr.services.area_stats import _grouped_percentiles, compute_area_stats
+
+
+@pytest.mark.parametrize("scale", [1e4, 1e16])   # composite key sort, lexsort fallback
+def test_grouped_percentiles_match_numpy(scale):
+    rng = np.random.default_rng(3)
+    size = 6
+    groups = rng.integers(0, size, 1000)
+    groups[groups == 4] = 5   # group 4 left empty
+    values = rng.random(1000) * scale
+    median, p90 = _grouped_percentiles(groups, values, size, (0.5, 0.9))
+    for group in range(size):
+        if group == 4:
+            assert np.isnan(median[group]) and np.isnan(p90[group])
+            continue
+        expected = values[groups == group]
+        assert median[group] == pytest.approx(np.percentile(expected, 50))
+        assert p90[group] == pytest.approx(np.percentile(expected, 90))
+
+
+def test_grouped_percentiles_without_values():
+    (median,) = _grouped_percentiles(np.empty(0, np.int64), np.empty(0), 3, (0.5,))
+    assert np.isnan(median).all()
+
+
+def epoch(hour, minute=0):
+    return datetime(2026, 3, 1, hour, minute).timestamp() - datetime(1970, 1, 1).timestamp()
+
+
+def test_compute_area_stats():
+    area_ids = np.array([1, 2, 5])
+    capacities = np.array([10, 0, 4])
+    sessions = [
+        (1, epoch(8), epoch(8, 30)),
+        (1, epoch(8, 15), epoch(9, 45)),
+        (1, epoch(9), epoch(9, 10)),
+        (1, epoch(8, 40), np.nan),            # still open
+        (2, epoch(17), epoch(16)),            # ends before it starts: 0s
+        (3, epoch(12), epoch(13)),            # unknown area
+    ]
+    session_areas, starts, ends = (np.array(column) for column in zip(*sessions))
+    stats = compute_area_stats(area_ids, capacities, session_areas.astype(np.int64), starts, ends, 2)
+    assert stats == [
+        {"parking_area_id": 1, "sessions": 4, "closed_sessions": 3, "dwell_median_seconds": 1800.0,
+         "dwell_p90_seconds": pytest.approx(4680.0), "turnover_per_day": 0.2, "peak_arrival_hour": 8},
+        {"parking_area_id": 2, "sessions": 1, "closed_sessions": 1, "dwell_median_seconds": 0.0,
+         "dwell_p90_seconds": 0.0, "turnover_per_day": None, "peak_arrival_hour": 17},
+        {"parking_area_id": 5, "sessions": 0, "closed_sessions": 0, "dwell_median_seconds": None,
+         "dwell_p90_seconds": None, "turnover_per_day": 0.0, "peak_arrival_hour": None},
+    ]
+
+
+def test_area_stats_route(client, make_area, make_user, make_event):
+    area = make_area(max_capacity=2)
+    user = make_user()
+    start = datetime.utcnow().replace(microsecond=0) - timedelta(hours=5)
+    make_event(user.id, area.id, start)
+    response = client.get("/areas/stats?days=1")
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["days"] == 1
+    assert body["areas"] == [{
+        "parking_area_id": area.id, "sessions": 1, "closed_sessions": 0, "dwell_median_seconds": None,
+        "dwell_p90_seconds": None, "turnover_per_day": 0.5, "peak_arrival_hour": start.hour
+    }]
+
+
+@pytest.mark.parametrize("days", ["0", "367", "week"])
+def test_area_stats_bad_days(client, days):
+    assert client.get(f"/areas/stats?days={days}").status_code == 400
@@ -0,0 +1,53 @@
+import asyncio
+from flaskr.api.events_routes import parse_event_payload
+from flaskr.asgi import application
+from flaskr.services.event_buffer import event_buffer
+from flaskr.services.ingestion import async_ingestion
+from flaskr.services.sessions import open_sessions
+
+
+def test_write_behind_leaves_the_route_to_flask(monkeypatch):
+    forwarded = []
+
+    async def wsgi(scope, receive, send):
+        forwarded.append(scope["path"])
+
+    monkeypatch.setattr(event_buffer, "enabled", True)
+    monkeypatch.setattr(application, "wsgi", wsgi)
+    asyncio.run(application({"type": "http", "method": "POST", "path": "/events/parking"}, None, None))
+    assert forwarded == ["/events/parking"]
+
+
+def event(user_id, type="park"):
+    return {"user_id": user_id, "longitude": 9.1905, "latitude": 45.4605, "type": type,
+            "start_time": "2026-03-01T08:00:00"}
+
+
+def record(*payloads):
+    """Records the events through the async path; returns their (status, body)."""
+    async def main():
+        await async_ingestion.open()
+        try:
+            return [await async_ingestion.record_parking_event(parse_event_payload(payload)[0])
+                    for payload in payloads]
+        finally:
+            await async_ingestion.close()
+    return asyncio.run(main())
+
+
+def test_unknown_user_is_reported_before_capacity(db_session, make_area, make_user):
+    make_area(residual_capacity=0)
+    user = make_user()
+    db_session.commit()
+    unknown, full = record(event(user.id + 1000), event(user.id))
+    assert unknown == (400, {"error": "User not found"})
+    assert full == (400, {"error": "Parking area is full"})
+
+
+def test_park_is_cached_as_open_session(db_session, make_area, make_user):
+    area = make_area()
+    user = make_user()
+    db_session.commit()
+    [(status, body)] = record(event(user.id))
+    assert status == 201
+    assert open_sessions.pop(user.id, area.id)[0] == body["event"]["id"]
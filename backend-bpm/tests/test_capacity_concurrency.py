@@ -0,0 +1,60 @@
+import threading
+from sqlalchemy import text
+from flaskr.extensions import db
+from flaskr.models.capacity_summary import CapacitySummary
+from flaskr.models.parking_areas import ParkingArea
+
+THREADS = 16
+OPERATIONS = 50
+
+
+def test_parallel_park_and_leave_keep_capacity_in_bounds(app, make_area):
+    area_id = make_area(max_capacity=5).id
+    applied = [0] * THREADS
+    errors = []
+    out_of_bounds = []
+    stop = threading.Event()
+
+    def worker(index):
+        try:
+            with app.app_context():
+                for operation in range(OPERATIONS):
+                    # Half of the threads mostly park, the others mostly leave
+                    park = (operation + index) % 3 != 0 if index % 2 else (operation + index) % 3 == 0
+                    area = ParkingArea.park_bicycle(area_id) if park else ParkingArea.leave_parking(area_id)
+                    if area is None:
+                        db.session.rollback()
+                        continue
+                    db.session.commit()
+                    applied[index] += -1 if park else 1
+        except Exception as e:  # reported by the main thread
+            errors.append(e)
+
+    def monitor():
+        with app.app_context():
+            while not stop.is_set():
+                residual, max_capacity = db.session.execute(text(
+                    "SELECT residual_capacity, max_capacity FROM parking_areas WHERE id = :id"
+                ), {"id": area_id}).one()
+                db.session.rollback()
+                if not 0 <= residual <= max_capacity:
+                    out_of_bounds.append(residual)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(THREADS)]
+    watcher = threading.Thread(target=monitor)
+    watcher.start()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stop.set()
+    watcher.join()
+
+    assert not errors
+    assert not out_of_bounds
+    with app.app_context():
+        area = db.session.get(ParkingArea, area_id)
+        assert 0 <= area.residual_capacity <= area.max_capacity
+        # Every committed change is accounted for: no update was lost
+        assert area.residual_capacity == 5 + sum(applied)
+        assert CapacitySummary.check() == {}
@@ -0,0 +1,76 @@
+import asyncio
+import json
+import threading
+from flaskr.services.capacity_feed import CapacityFeed
+
+
+def make_feed(queue_size=4, heartbeat=5.0):
+    feed = CapacityFeed()
+    feed.backend = "memory"
+    feed.queue_size = queue_size
+    feed.heartbeat = heartbeat
+    return feed
+
+
+def change(i):
+    return {"id": i, "residual_capacity": 9, "max_capacity": 10, "delta": -1}
+
+
+def test_stream_yields_snapshot_then_changes_published_from_a_thread():
+    feed = make_feed()
+
+    async def main():
+        subscription = await feed.subscribe()
+        stream = feed.stream(subscription, [{"id": 1}])
+        assert "event: snapshot" in await anext(stream)
+        publisher = threading.Thread(target=feed.publish, args=(change(1),))
+        publisher.start()
+        chunk = await asyncio.wait_for(anext(stream), 5.0)
+        publisher.join()
+        assert chunk == f"event: capacity\ndata: {json.dumps(change(1))}\n\n"
+        await stream.aclose()
+        assert not feed._subscribers
+
+    asyncio.run(main())
+
+
+def test_idle_stream_sends_heartbeats():
+    feed = make_feed(heartbeat=0.01)
+
+    async def main():
+        stream = feed.stream(await feed.subscribe(), [])
+        await anext(stream)
+        assert await asyncio.wait_for(anext(stream), 5.0) == ": keep-alive\n\n"
+        await stream.aclose()
+
+    asyncio.run(main())
+
+
+def test_slow_subscriber_is_closed_on_overflow():
+    feed = make_feed(queue_size=2)
+
+    async def main():
+        subscription = await feed.subscribe()
+        for i in range(3):
+            feed.publish(change(i))
+        # Let the event loop run the deliveries
+        await asyncio.sleep(0)
+        assert subscription.closed
+        assert not feed._subscribers
+        chunks = [chunk async for chunk in feed.stream(subscription, [])]
+        assert len(chunks) == 1
+
+    asyncio.run(main())
+
+
+def test_unsubscribe_ends_the_stream():
+    feed = make_feed()
+
+    async def main():
+        subscription = await feed.subscribe()
+        stream = feed.stream(subscription, [])
+        await anext(stream)
+        feed.unsubscribe(subscription)
+        assert [chunk async for chunk in stream] == []
+
+    asyncio.run(main())
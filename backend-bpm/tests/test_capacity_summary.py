@@ -0,0 +1,59 @@
+import threading
+from sqlalchemy import text
+from flaskr.extensions import db
+from flaskr.models.capacity_summary import CapacitySummary
+from flaskr.models.parking_areas import ParkingArea
+
+
+def test_summary_follows_the_areas(client, db_session, make_area):
+    full = make_area("full", max_capacity=1)
+    make_area("other", lon=9.2, max_capacity=4, residual_capacity=2)
+    client.post(f"/areas/{full.id}/park")
+
+    assert CapacitySummary.get_totals() == {
+        "total_areas": 2, "total_max_capacity": 5, "total_residual_capacity": 2, "areas_full": 1
+    }
+    assert CapacitySummary.check() == {}
+
+
+def test_check_reports_and_rebuild_repairs(db_session, make_area):
+    make_area(max_capacity=4)
+    db_session.execute(text("UPDATE capacity_summary SET total_residual_capacity = total_residual_capacity + 3"))
+    assert CapacitySummary.check() == {"total_residual_capacity": (7, 4)}
+
+    CapacitySummary.rebuild()
+    db_session.commit()
+    assert CapacitySummary.check() == {}
+
+
+def test_check_under_concurrent_changes(app, make_area):
+    area_ids = [make_area(f"area-{i}", lon=9.19 + i * 0.01, max_capacity=3).id for i in range(4)]
+    stop = threading.Event()
+    errors = []
+
+    def writer(area_id):
+        try:
+            with app.app_context():
+                while not stop.is_set():
+                    for change in (ParkingArea.park_bicycle, ParkingArea.leave_parking):
+                        change(area_id)
+                        db.session.commit()
+        except Exception as e:  # reported by the main thread
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(area_id,)) for area_id in area_ids]
+    for thread in threads:
+        thread.start()
+    try:
+        with app.app_context():
+            mismatches = []
+            for _ in range(200):
+                mismatches.append(CapacitySummary.check())
+                db.session.rollback()
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    assert not errors
+    assert all(mismatch == {} for mismatch in mismatches)
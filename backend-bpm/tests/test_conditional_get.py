@@ -0,0 +1,59 @@
+import pytest
+from flaskr.bench.endpoints import _tile_xy
+from flaskr.models.parking_areas import ParkingArea
+
+
+@pytest.mark.parametrize("url", ["/areas/", "/areas/geojson"])
+def test_area_listings_revalidate(client, db_session, make_area, url):
+    area = make_area(max_capacity=3)
+    first = client.get(url)
+    etag = first.headers["ETag"]
+    assert first.status_code == 200
+
+    unchanged = client.get(url, headers={"If-None-Match": etag})
+    assert unchanged.status_code == 304
+    assert unchanged.headers["ETag"] == etag
+
+    # A capacity change...
+    assert client.post(f"/areas/{area.id}/park").status_code == 200
+    parked = client.get(url, headers={"If-None-Match": etag})
+    assert parked.status_code == 200
+    assert parked.headers["ETag"] != etag
+
+    # ... as a geometry change, or a new area
+    etag = parked.headers["ETag"]
+    db_session.get(ParkingArea, area.id).name = "renamed"
+    db_session.commit()
+    renamed = client.get(url, headers={"If-None-Match": etag})
+    assert renamed.status_code == 200
+    etag = renamed.headers["ETag"]
+    make_area("other", lon=9.2)
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_rejected_park_keeps_the_etag(client, make_area):
+    area = make_area(max_capacity=0)
+    etag = client.get("/areas/").headers["ETag"]
+    assert client.post(f"/areas/{area.id}/park").status_code == 400
+    assert client.get("/areas/", headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_unknown_area(client):
+    assert client.post("/areas/12345/park").status_code == 404
+    assert client.get("/areas/12345/geojson").status_code == 404
+
+
+def test_area_tile_revalidates(client, make_area):
+    area = make_area(lon=9.19, lat=45.46)
+    other = make_area("other", lon=12.49, lat=41.89)
+    url = "/tiles/areas/14/{}/{}.mvt".format(*_tile_xy(9.1905, 45.4605, 14))
+    etag = client.get(url).headers["ETag"]
+
+    # A capacity change elsewhere keeps the tile
+    assert client.post(f"/areas/{other.id}/park").status_code == 200
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+    assert client.post(f"/areas/{area.id}/park").status_code == 200
+    changed = client.get(url, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
@@ -0,0 +1,112 @@
+import io
+import json
+import random
+from datetime import datetime
+from sqlalchemy import text
+from flaskr.bench.synthetic import write_events_geojson
+from flaskr.services.bulk_import import _event_row, import_parking_events
+from flaskr.services.json_stream import iter_json_array
+
+
+def event(user_id, type="park", start_time="2026-03-01T08:00:00"):
+    return {"user_id": user_id, "longitude": 9.1905, "latitude": 45.4605, "type": type, "start_time": start_time}
+
+
+def residual_capacity(session, area_id):
+    return session.execute(text("SELECT residual_capacity FROM parking_areas WHERE id = :id"),
+                           {"id": area_id}).scalar_one()
+
+
+def test_resent_event_conflicts(client, db_session, make_area, make_user):
+    area = make_area()
+    user = make_user()
+    assert client.post("/events/parking", json=event(user.id)).status_code == 201
+    response = client.post("/events/parking", json=event(user.id))
+    assert response.status_code == 409
+    assert response.get_json() == {"error": "Event already recorded"}
+    # The capacity reserved for the duplicate is rolled back with it
+    assert residual_capacity(db_session, area.id) == 9
+
+
+def test_park_and_leave_at_the_same_time_do_not_conflict(client, make_area, make_user):
+    make_area()
+    user = make_user()
+    assert client.post("/events/parking", json=event(user.id)).status_code == 201
+    assert client.post("/events/parking", json=event(user.id, "leave")).status_code == 201
+
+
+def test_resent_batch_records_only_new_events(client, db_session, make_area, make_user):
+    area = make_area()
+    user = make_user()
+    batch = {"events": [event(user.id), event(user.id, start_time="2026-03-01T09:00:00")]}
+    assert client.post("/events/parking/batch", json=batch).status_code == 200
+    # One new event, one already recorded: only the new one is applied
+    batch["events"][0]["start_time"] = "2026-03-01T10:00:00"
+    response = client.post("/events/parking/batch", json=batch)
+    assert response.status_code == 200
+    body = response.get_json()
+    assert (body["accepted"], body["rejected"]) == (1, 1)
+    assert [result["status"] for result in body["results"]] == [201, 409]
+    assert body["results"][1]["error"] == "Event already recorded"
+    # The capacity reserved for the duplicate is given back
+    assert body["parking_areas"] == [{"id": area.id, "residual_capacity": 7}]
+    assert residual_capacity(db_session, area.id) == 7
+    assert db_session.execute(text("SELECT count(*) FROM parking_events")).scalar_one() == 3
+
+
+def test_event_repeated_in_a_batch_is_recorded_once(client, db_session, make_area, make_user):
+    area = make_area()
+    user = make_user()
+    response = client.post("/events/parking/batch", json=[event(user.id), event(user.id)])
+    assert [result["status"] for result in response.get_json()["results"]] == [201, 409]
+    assert residual_capacity(db_session, area.id) == 9
+
+
+def features(*events):
+    return io.StringIO(json.dumps({"type": "FeatureCollection", "features": [
+        {"type": "Feature", "geometry": {"type": "Point", "coordinates": [9.1905, 45.4605]},
+         "properties": properties}
+        for properties in events
+    ]}))
+
+
+def test_import_skips_duplicates(db_session, make_area, make_user, make_event):
+    area = make_area()
+    user = make_user()
+    make_event(user.id, area.id, datetime(2026, 3, 1, 8))
+    park = {"user_id": user.id, "parking_area_id": area.id, "start_time": "2026-03-01T08:00:00"}
+    result = import_parking_events(features(
+        park,                                                   # already stored
+        {**park, "start_time": "2026-03-01T09:00:00"},
+        {**park, "start_time": "2026-03-01T09:00:00"},          # twice in the file
+        {**park, "type": "leave"},                              # same time, other type
+        {**park, "user_id": user.id + 1000},                    # unknown user
+        {**park, "start_time": "soon"},
+    ))
+    db_session.commit()
+    assert (result.read, result.inserted, result.skipped, result.invalid) == (6, 2, 3, 1)
+
+
+def test_reimport_in_the_same_transaction_skips_everything(db_session, make_area, make_user):
+    area = make_area()
+    user = make_user()
+    park = {"user_id": user.id, "parking_area_id": area.id, "start_time": "2026-03-01T08:00:00"}
+    first = import_parking_events(features(park))
+    second = import_parking_events(features(park))
+    db_session.commit()
+    assert (first.inserted, second.inserted, second.skipped) == (1, 0, 1)
+
+
+def test_generated_import_file():
+    buffer = io.StringIO()
+    areas = [(1, 11.34, 44.49), (2, 11.35, 44.50)]
+    write_events_geojson(buffer, 200, areas, [7, 8, 9], datetime(2026, 3, 1), random.Random(1), days=10,
+                         duplicate_ratio=0.1)
+    buffer.seek(0)
+    rows = [_event_row(feature) for feature in iter_json_array(buffer, "features")]
+    assert len(rows) == 200
+    assert 0 < len(rows) - len(set(rows)) < 50
+    for type_, lon, lat, user_id, area_id, start_time, end_time in rows:
+        assert (type_, user_id in (7, 8, 9)) == ("PARK", True)
+        assert (area_id, lon, lat) in areas
+        assert datetime(2026, 2, 19) <= start_time < end_time
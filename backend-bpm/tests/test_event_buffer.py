@@ -0,0 +1,90 @@
+import threading
+from sqlalchemy.exc import IntegrityError, OperationalError
+from flaskr.services.event_buffer import EventBuffer
+
+
+def make_buffer(flush, max_pending=10):
+    buffer = EventBuffer()
+    buffer._slots = threading.BoundedSemaphore(max_pending)
+    buffer.retry_delay = buffer.max_retry_delay = 0.0
+    buffer.flush = flush
+    buffer.dropped_rows = []
+    buffer._drop = buffer.dropped_rows.extend
+    return buffer
+
+
+def row(i):
+    return {"user_id": i, "parking_area_id": 1, "type": "park", "start_time": i}
+
+
+def run(buffer, rows):
+    for r in rows:
+        assert buffer.acquire_slot()
+        buffer.put(r)
+    buffer.close(timeout=5.0)
+    assert not buffer._flusher.is_alive()
+
+
+def slots_free(buffer):
+    free = 0
+    while buffer._slots.acquire(blocking=False):
+        free += 1
+    return free
+
+
+def lost_connection():
+    return OperationalError("INSERT", {}, Exception("server closed the connection unexpectedly"))
+
+
+def test_transient_failures_are_retried():
+    flushed, failures = [], [lost_connection(), lost_connection()]
+
+    def flush(batch):
+        if failures:
+            raise failures.pop()
+        flushed.extend(batch)
+
+    buffer = make_buffer(flush)
+    run(buffer, [row(i) for i in range(3)])
+    assert flushed == [row(i) for i in range(3)]
+    assert buffer.flush_errors._values[()] == 2
+    assert slots_free(buffer) == 10
+
+
+def test_transient_failure_while_flushing_row_by_row():
+    flushed, failures = [], [lost_connection()]
+
+    def flush(batch):
+        if len(batch) > 1 or batch[0]["user_id"] == 2:
+            raise IntegrityError("INSERT", {}, Exception("foreign key violation"))
+        # The first row-by-row flush loses the connection, and is retried
+        if failures:
+            raise failures.pop()
+        flushed.extend(batch)
+
+    buffer = make_buffer(flush)
+    buffer.batch_size = 3
+    buffer.flush_interval = 1.0
+    run(buffer, [row(i) for i in range(3)])
+    assert flushed == [row(0), row(1)]
+    assert buffer.dropped_rows == [row(2)]
+    assert slots_free(buffer) == 10
+
+
+def test_flusher_survives_unexpected_errors():
+    flushed = []
+
+    def flush(batch):
+        if batch[0]["user_id"] == 0:
+            raise RuntimeError("bug")
+        flushed.extend(batch)
+
+    buffer = make_buffer(flush, max_pending=1)
+    for i in range(2):
+        assert buffer.acquire_slot()
+        buffer.put(row(i))
+        # The slot of the failed batch is given back too
+        assert buffer._slots.acquire(timeout=5.0)
+        buffer._slots.release()
+    run(buffer, [])
+    assert flushed == [row(1)]
@@ -0,0 +1,93 @@
+from datetime import datetime
+import pytest
+from flaskr.api.events_routes import parse_event_payload
+from flaskr.models.events import EventType
+
+
+@pytest.mark.parametrize("payload, error", [
+    ([], "Invalid event payload"),
+    ({"longitude": 9.19, "latitude": 45.46, "type": "park"}, "Missing required field: user_id"),
+    ({"user_id": 1, "longitude": 9.19, "latitude": 45.46, "type": "stop"},
+     "Invalid event type. Must be 'park' or 'leave'"),
+    ({"user_id": True, "longitude": 9.19, "latitude": 45.46, "type": "park"},
+     "Invalid user_id. Must be an integer"),
+    ({"user_id": "1", "longitude": 9.19, "latitude": 45.46, "type": "park"},
+     "Invalid user_id. Must be an integer"),
+    ({"user_id": 1, "longitude": "east", "latitude": 45.46, "type": "park"},
+     "Invalid coordinates. Longitude and latitude must be numbers"),
+    ({"user_id": 0, "longitude": 9.19, "latitude": 45.46, "type": "park"},
+     "Invalid user_id. Must be between 1 and 2147483647"),
+    ({"user_id": 2 ** 31, "longitude": 9.19, "latitude": 45.46, "type": "park"},
+     "Invalid user_id. Must be between 1 and 2147483647"),
+    ({"user_id": 1, "longitude": "nan", "latitude": 45.46, "type": "park"}, "Coordinates out of range"),
+    ({"user_id": 1, "longitude": 9.19, "latitude": "-inf", "type": "park"}, "Coordinates out of range"),
+    ({"user_id": 1, "longitude": 180.5, "latitude": 45.46, "type": "park"}, "Coordinates out of range"),
+    ({"user_id": 1, "longitude": 9.19, "latitude": 90.01, "type": "park"}, "Coordinates out of range"),
+    ({"user_id": 1, "longitude": 9.19, "latitude": 45.46, "type": "park", "start_time": "yesterday"},
+     "Invalid start_time. Must be an ISO 8601 timestamp"),
+])
+def test_parse_event_payload_rejects(payload, error):
+    assert parse_event_payload(payload) == (None, error)
+
+
+def test_parse_event_payload_accepts():
+    fields, error = parse_event_payload({
+        "user_id": 1, "longitude": "9.19", "latitude": 45.46, "type": "leave",
+        "start_time": "2026-03-01T08:30:00"
+    })
+    assert error is None
+    assert fields == {
+        "type": EventType.LEAVE, "user_id": 1, "longitude": 9.19, "latitude": 45.46,
+        "start_time": datetime(2026, 3, 1, 8, 30)
+    }
+
+
+def event(user_id, type="park", lon=9.1905, lat=45.4605, **extra):
+    return {"user_id": user_id, "longitude": lon, "latitude": lat, "type": type, **extra}
+
+
+def test_batch_rejects_bad_payloads(client):
+    assert client.post("/events/parking/batch", json={"events": []}).status_code == 400
+    assert client.post("/events/parking/batch", json={"events": "nope"}).status_code == 400
+
+
+def test_batch_too_large(client, app):
+    max_size = app.config["EVENTS_BATCH_MAX_SIZE"]
+    response = client.post("/events/parking/batch", json=[event(1)] * (max_size + 1))
+    assert response.status_code == 413
+
+
+def test_batch_reports_each_event(client, make_area, make_user):
+    area = make_area(max_capacity=1)
+    user = make_user()
+    response = client.post("/events/parking/batch", json={"events": [
+        event(user.id, start_time="2026-03-01T08:00:00"),
+        event(user.id, start_time="2026-03-01T08:05:00"),   # area full
+        event(user.id + 1000),                              # unknown user
+        event(user.id, lon=0.0, lat=0.0),                   # outside every area
+        event(user.id, type="fly"),                         # invalid payload
+    ]})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert (body["accepted"], body["rejected"]) == (1, 4)
+    assert [result["status"] for result in body["results"]] == [201, 400, 400, 400, 400]
+    assert [result.get("error") for result in body["results"][1:]] == [
+        "Parking area is full",
+        "User not found",
+        "Location is not within any parking area",
+        "Invalid event type. Must be 'park' or 'leave'",
+    ]
+    assert body["parking_areas"] == [{"id": area.id, "residual_capacity": 0}]
+
+
+@pytest.mark.parametrize("payload", [
+    event(1, lon="nan"),
+    event(1, lat="inf"),
+    event(2 ** 40),
+])
+def test_out_of_range_values_rejected(client, payload):
+    # Refused before reaching the database
+    response = client.post("/events/parking", json=payload)
+    assert response.status_code == 400
+    batch = client.post("/events/parking/batch", json={"events": [payload]}).get_json()
+    assert batch["results"][0]["status"] == 400
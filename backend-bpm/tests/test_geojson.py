@@ -0,0 +1,43 @@
+import json
+from datetime import datetime
+from flaskr.models.events import EventType
+from flaskr.models.parking_areas import ParkingArea
+
+
+def as_json(document):
+    return json.loads(json.dumps(document))
+
+
+def test_areas_collection_matches_the_orm_features(client, make_area):
+    make_area("a", max_capacity=10, residual_capacity=4)
+    make_area("b", lon=9.2, max_capacity=0)
+    response = client.get("/areas/geojson")
+    assert response.status_code == 200
+    assert response.get_json() == {
+        "type": "FeatureCollection",
+        "features": as_json([area.to_geojson_feature() for area in ParkingArea.query.order_by(ParkingArea.id)])
+    }
+
+
+def test_area_listing_keeps_full_precision(client, make_area):
+    # square() writes coordinates such as 9.190999999999999, which PostGIS
+    # rounds to 9.191 at its default 9 decimals
+    area = make_area()
+    body = client.get("/areas/?bbox=-180,-90,180,90").get_json()
+    assert [item["location_area"] for item in body] == [as_json(area.to_dict()["location_area"])]
+
+
+def test_empty_areas_collection(client):
+    assert client.get("/areas/geojson").get_json() == {"type": "FeatureCollection", "features": []}
+
+
+def test_events_collection_matches_the_orm_features(client, make_area, make_user, make_event):
+    area = make_area()
+    user = make_user()
+    events = [
+        make_event(user.id, area.id, datetime(2026, 3, 1, 8)),
+        make_event(user.id, area.id, datetime(2026, 3, 1, 9), EventType.LEAVE),
+    ]
+    body = client.get("/events/geojson?limit=10").get_json()
+    assert body["features"] == as_json([event.to_geojson_feature() for event in events])
+    assert body["next_cursor"] is None
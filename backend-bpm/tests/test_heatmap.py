@@ -0,0 +1,34 @@
+import json
+import random
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import text
+
+
+@pytest.mark.parametrize("shape, size", [("hex", 250), ("hex", 37.5), ("square", 100)])
+def test_events_binned_in_their_cell(client, db_session, make_area, make_user, make_event, shape, size):
+    area = make_area()
+    user = make_user()
+    rng = random.Random(7)
+    start = datetime(2026, 3, 1)
+    for n in range(200):
+        make_event(user.id, area.id, start + timedelta(minutes=n),
+                   lon=9.18 + rng.random() * 0.02, lat=45.45 + rng.random() * 0.02)
+
+    response = client.get(f"/events/heatmap?shape={shape}&size={size}")
+    assert response.status_code == 200
+    features = response.get_json()["features"]
+    assert sum(feature["properties"]["count"] for feature in features) == 200
+
+    # Every cell, as built by ST_Hexagon / ST_Square, holds as many events
+    # as counted in it
+    function = "ST_Hexagon" if shape == "hex" else "ST_Square"
+    rows = db_session.execute(text(f"""
+        SELECT c.count, (
+            SELECT count(*) FROM parking_events e
+            WHERE ST_Intersects({function}(CAST(:size AS float8), c.i, c.j, ST_SetSRID(ST_MakePoint(0, 0), 3857)),
+                                ST_Transform(e.location_point, 3857))
+        )
+        FROM json_to_recordset(CAST(:cells AS json)) AS c(i int, j int, count int)
+    """), {"size": size, "cells": json.dumps([feature["properties"] for feature in features])}).all()
+    assert all(counted == inside for counted, inside in rows)
@@ -0,0 +1,61 @@
+import io
+import json
+import pytest
+from flaskr.services.json_stream import iter_json_array
+
+COLLECTION = {
+    "type": "FeatureCollection",
+    "name": "areas",
+    "features": [{"id": 1, "tags": ["a", "b"]}, {"id": 2, "value": 12345.678}, {"id": 3, "nested": {"x": []}}],
+    "crs": {"type": "name"}
+}
+
+
+@pytest.mark.parametrize("read_size", [1, 2, 7, 1 << 20])
+def test_items_of_a_top_level_key(read_size):
+    text = json.dumps(COLLECTION, indent=2)
+    assert list(iter_json_array(io.StringIO(text), "features", read_size)) == COLLECTION["features"]
+
+
+@pytest.mark.parametrize("read_size", [1, 3, 1 << 20])
+def test_items_of_a_bare_array(read_size):
+    # Numbers split across reads are not cut short
+    items = [1, 23456, -7.5e10, "x", None, [1, [2]]]
+    assert list(iter_json_array(io.StringIO(json.dumps(items)), read_size=read_size)) == items
+
+
+@pytest.mark.parametrize("text, key", [
+    ("[]", None),
+    ("  [ ]  ", None),
+    ("{}", "features"),
+    ('{"type": "FeatureCollection"}', "features"),
+    ('{"features": []}', "features"),
+])
+def test_empty(text, key):
+    assert list(iter_json_array(io.StringIO(text), key, read_size=2)) == []
+
+
+@pytest.mark.parametrize("text, key", [
+    ('{"a": 1}', None),
+    ('[1, 2', None),
+    ('[1 2]', None),
+    ('{"features": [1,]}', "features"),
+])
+def test_malformed(text, key):
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO(text), key, read_size=2))
+
+
+def test_reads_one_item_ahead_only():
+    reads = []
+
+    class Recorder(io.StringIO):
+        def read(self, size=-1):
+            data = super().read(size)
+            reads.append(len(data))
+            return data
+
+    text = json.dumps([{"id": i, "pad": "x" * 100} for i in range(100)])
+    items = iter_json_array(Recorder(text), read_size=64)
+    assert next(items)["id"] == 0
+    assert sum(reads) < 400
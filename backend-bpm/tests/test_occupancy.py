@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import text
+from flaskr.models.events import EventType
+from flaskr.services.occupancy import refresh_occupancy_rollups, sweep_hourly
+
+
+def at(hour, minute=0):
+    return datetime(2026, 3, 1) + timedelta(hours=hour, minutes=minute)
+
+
+def test_sweep_levels_and_partial_hour():
+    rows = sweep_hourly([
+        (at(8, 15), at(9, 15)),
+        (at(7), None),             # parked before the first hour, still there
+        (at(9, 45), at(10, 5)),
+        (at(11), None),            # after now
+        (at(6), at(7, 30)),        # left before the first hour
+    ], at(8), at(10, 30))
+    assert rows == [
+        {"bucket_start": at(8), "avg_occupied": 1.75, "peak_occupied": 2, "arrivals": 1, "departures": 0},
+        {"bucket_start": at(9), "avg_occupied": 1.5, "peak_occupied": 2, "arrivals": 1, "departures": 1},
+        # Averaged over the elapsed half hour only
+        {"bucket_start": at(10), "avg_occupied": pytest.approx(35 / 30), "peak_occupied": 2, "arrivals": 0,
+         "departures": 1},
+    ]
+
+
+def test_sweep_skips_idle_hours():
+    rows = sweep_hourly([(at(3, 10), at(3, 40)), (at(1), at(1))], at(0), at(5))
+    assert rows == [
+        {"bucket_start": at(3), "avg_occupied": 0.5, "peak_occupied": 1, "arrivals": 1, "departures": 1},
+    ]
+
+
+def test_sweep_swap_does_not_inflate_the_peak():
+    rows = sweep_hourly([(at(8), at(8, 30)), (at(8, 30), at(9))], at(8), at(9))
+    assert rows[0]["peak_occupied"] == 1
+
+
+def test_sweep_without_intervals():
+    assert sweep_hourly([], at(0), at(5)) == []
+
+
+def series(client, area_id, start, end):
+    body = client.get(f"/areas/{area_id}/occupancy?from={start.isoformat()}&to={end.isoformat()}").get_json()
+    return [(row["bucket_start"][11:16], row["avg_occupied"]) for row in body["series"] if row["avg_occupied"]]
+
+
+def test_incremental_refresh(client, db_session, make_area, make_user, make_event):
+    area = make_area()
+    user = make_user()
+    now = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    old = make_event(user.id, area.id, now - timedelta(days=40))   # still parked
+    make_event(user.id, area.id, now - timedelta(hours=3), lat=45.4606)
+    assert refresh_occupancy_rollups(now)
+    db_session.commit()
+    assert series(client, area.id, now - timedelta(hours=4), now) == [
+        ((now - timedelta(hours=4)).strftime("%H:%M"), 1.0),
+        ((now - timedelta(hours=3)).strftime("%H:%M"), 2.0),
+        ((now - timedelta(hours=2)).strftime("%H:%M"), 2.0),
+        ((now - timedelta(hours=1)).strftime("%H:%M"), 2.0),
+    ]
+
+    # The old session closes two hours ago: the refresh reads it through the
+    # end_time index and recomputes its hours
+    db_session.execute(text("UPDATE parking_events SET end_time = :end WHERE id = :id"),
+                       {"end": now - timedelta(hours=2), "id": old.id})
+    db_session.commit()
+    assert refresh_occupancy_rollups(now + timedelta(minutes=30))
+    db_session.commit()
+    assert series(client, area.id, now - timedelta(hours=4), now) == [
+        ((now - timedelta(hours=4)).strftime("%H:%M"), 1.0),
+        ((now - timedelta(hours=3)).strftime("%H:%M"), 2.0),
+        ((now - timedelta(hours=2)).strftime("%H:%M"), 1.0),
+        ((now - timedelta(hours=1)).strftime("%H:%M"), 1.0),
+    ]
+
+
+def test_occupancy_does_not_refresh_inline(client, make_area):
+    area = make_area()
+    body = client.get(f"/areas/{area.id}/occupancy").get_json()
+    assert body["refreshed_at"] is None
+
+
+@pytest.mark.parametrize("query", ["?bucket=week", "?from=nope", "?from=2026-03-02T00:00:00&to=2026-03-01T00:00:00"])
+def test_occupancy_bad_arguments(client, make_area, query):
+    area = make_area()
+    assert client.get(f"/areas/{area.id}/occupancy{query}").status_code == 400
+
+
+def test_occupancy_unknown_area(client):
+    assert client.get("/areas/12345/occupancy").status_code == 404
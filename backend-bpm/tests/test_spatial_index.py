@@ -0,0 +1,66 @@
+from shapely.geometry import box
+from sqlalchemy.exc import OperationalError
+from flaskr.extensions import db
+from flaskr.models.parking_areas import ParkingArea, ParkingAreasState
+from flaskr.services.spatial_index import AreaSpatialIndex, _Snapshot
+
+
+def snapshot():
+    # Area 7 overlaps area 3 on [1, 2] x [0, 1]
+    return _Snapshot(1, [7, 3, 9], [box(1, 0, 3, 1), box(0, 0, 2, 1), box(10, 10, 11, 11)])
+
+
+def test_lookup():
+    index = snapshot()
+    assert index.lookup(0.5, 0.5) == 3
+    assert index.lookup(2.5, 0.5) == 7
+    assert index.lookup(10.5, 10.5) == 9
+    assert index.lookup(5, 5) is None
+
+
+def test_lookup_overlap_takes_the_lowest_id():
+    assert snapshot().lookup(1.5, 0.5) == 3
+
+
+def test_lookup_boundary_is_outside():
+    # As ST_Contains: a point on the boundary is not contained
+    index = snapshot()
+    assert index.lookup(0, 0.5) is None
+    assert index.lookup(10, 10) is None
+    # On the edge of one area, inside the other
+    assert index.lookup(2, 0.5) == 7
+
+
+def test_lookup_many():
+    index = snapshot()
+    assert index.lookup_many([(0.5, 0.5), (1.5, 0.5), (2.5, 0.5), (5, 5), (0, 0.5)]) == [3, 3, 7, None, None]
+
+
+def test_lookup_many_without_points():
+    assert snapshot().lookup_many([]) == []
+
+
+def test_failed_refresh_rolls_back_before_the_fallback(monkeypatch, request_context):
+    calls = []
+
+    def version():
+        calls.append("version")
+        raise OperationalError("SELECT", {}, Exception("connection lost"))
+
+    monkeypatch.setattr(ParkingAreasState, "get_geometry_version", version)
+    monkeypatch.setattr(db.session, "rollback", lambda: calls.append("rollback"))
+    monkeypatch.setattr(ParkingArea, "get_id_containing", lambda point: calls.append("fallback") or 5)
+    with request_context("/"):
+        assert AreaSpatialIndex().lookup(0.5, 0.5, None) == 5
+    assert calls == ["version", "rollback", "fallback"]
+
+
+def test_misses_are_checked_against_the_database(monkeypatch):
+    index = AreaSpatialIndex()
+    monkeypatch.setattr(index, "_fresh_snapshot", snapshot)
+    # Added after the snapshot was built
+    monkeypatch.setattr(ParkingArea, "get_id_containing", lambda point: 12)
+    monkeypatch.setattr(ParkingArea, "get_ids_containing", lambda coordinates: [12] * len(coordinates))
+    assert index.lookup(0.5, 0.5, None) == 3
+    assert index.lookup(5, 5, None) == 12
+    assert index.lookup_many([(0.5, 0.5), (5, 5), (2.5, 0.5)]) == [3, 12, 7]
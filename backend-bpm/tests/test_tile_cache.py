@@ -0,0 +1,45 @@
+from flaskr.services.tile_cache import TileCache
+
+
+def test_tag_recomputed_only_when_the_version_changes():
+    cache = TileCache()
+    computed = []
+
+    def compute(tag):
+        def run():
+            computed.append(tag)
+            return tag
+        return run
+
+    key = ("areas", 14, 8000, 5000)
+    assert cache.tag(key, "1-10", compute("a")) == "a"
+    assert cache.tag(key, "1-10", compute("b")) == "a"
+    # Some capacity changed: the tag is recomputed, maybe unchanged
+    assert cache.tag(key, "1-11", compute("a")) == "a"
+    assert cache.tag(key, "2-11", compute("c")) == "c"
+    assert computed == ["a", "a", "c"]
+
+
+def test_tile_rebuilt_when_its_tag_changes():
+    cache = TileCache()
+    built = []
+
+    def build(tile):
+        def run():
+            built.append(tile)
+            return tile
+        return run
+
+    key = ("areas", 0, 0, 0)
+    assert cache.get(key, "a", build(b"1")) == b"1"
+    assert cache.get(key, "a", build(b"2")) == b"1"
+    assert cache.get(key, "b", build(b"3")) == b"3"
+    assert built == [b"1", b"3"]
+
+
+def test_least_recently_used_evicted():
+    cache = TileCache(max_size=2)
+    for i in range(3):
+        cache.get(("areas", i), "t", lambda: b"")
+        cache.tag(("areas", i), "v", lambda: "t")
+    assert list(cache._tiles) == list(cache._tags) == [("areas", 1), ("areas", 2)]
@@ -0,0 +1,21 @@
+import pytest
+
+
+def test_signup(client):
+    response = client.post("/users/signup", json={"username": "alice"})
+    assert response.status_code == 201
+    assert response.get_json()["username"] == "alice"
+    # The route commits: the new user is listed
+    assert [user["username"] for user in client.get("/users/?limit=10").get_json()["users"]] == ["alice"]
+
+
+def test_signup_taken_username(client, make_user):
+    make_user("alice")
+    response = client.post("/users/signup", json={"username": "alice"})
+    assert response.status_code == 409
+    assert response.get_json() == {"error": "User already exists"}
+
+
+@pytest.mark.parametrize("payload", [{}, [], {"name": "alice"}])
+def test_signup_without_username(client, payload):
+    assert client.post("/users/signup", json=payload).status_code == 400
@@ -0,0 +1,65 @@
+import math
+import pytest
+from sqlalchemy import text
+from flaskr.api.viewport import get_viewport_args
+from flaskr.models.parking_areas import ParkingAreaSimplified
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("", (None, None)),
+    ("?bbox=9.1,45.4,9.3,45.5", ((9.1, 45.4, 9.3, 45.5), None)),
+    ("?bbox=-180,-90,180,90&zoom=0", ((-180.0, -90.0, 180.0, 90.0), 0)),
+    ("?zoom=24", (None, 24)),
+])
+def test_viewport_args(request_context, query, expected):
+    with request_context(f"/{query}"):
+        assert get_viewport_args() == expected
+
+
+@pytest.mark.parametrize("query, error", [
+    ("?bbox=9.1,45.4,9.3", "Invalid bbox"),
+    ("?bbox=a,b,c,d", "Invalid bbox"),
+    ("?bbox=9.3,45.4,9.1,45.5", "Invalid bbox"),
+    ("?bbox=9.1,45.4,190,45.5", "Invalid bbox"),
+    ("?zoom=1.5", "Invalid zoom"),
+    ("?zoom=25", "Invalid zoom"),
+    ("?zoom=-1", "Invalid zoom"),
+])
+def test_invalid_viewport_args(request_context, query, error):
+    with request_context(f"/{query}"):
+        with pytest.raises(ValueError, match=error):
+            get_viewport_args()
+
+
+def circle(lon, lat, radius=0.001, points=200):
+    ring = [(lon + radius * math.cos(2 * math.pi * i / points), lat + radius * math.sin(2 * math.pi * i / points))
+            for i in range(points)]
+    return "POLYGON((" + ", ".join(f"{x} {y}" for x, y in ring + ring[:1]) + "))"
+
+
+def vertices(client, zoom):
+    body = client.get(f"/areas/geojson?zoom={zoom}").get_json()
+    return len(body["features"][0]["geometry"]["coordinates"][0])
+
+
+def test_simplified_at_the_configured_zooms(client, db_session):
+    db_session.execute(text("""
+        INSERT INTO parking_areas (name, location_area, max_capacity, residual_capacity)
+        VALUES ('round', ST_GeomFromText(:wkt, 4326), 10, 10)
+    """), {"wkt": circle(9.19, 45.46)})
+    db_session.commit()
+    # Coarser at the lower zooms, full resolution beyond the last level
+    assert vertices(client, 8) < vertices(client, 16) < vertices(client, 20) == 201
+
+    # The levels are read from the table by the trigger and the queries alike
+    db_session.execute(text("DELETE FROM parking_areas_simplified_zooms WHERE zoom > 8"))
+    ParkingAreaSimplified.rebuild()
+    db_session.commit()
+    try:
+        assert vertices(client, 8) < vertices(client, 10) == 201
+    finally:
+        db_session.execute(text("""
+            INSERT INTO parking_areas_simplified_zooms (zoom, tolerance)
+            SELECT z, 360.0 / (256 * 2 ^ z) FROM unnest(ARRAY[10, 12, 14, 16]) AS z
+        """))
+        db_session.commit()